@@ -0,0 +1,177 @@
+"""adaptive sampling that stops a target once its slo verdict is statistically settled"""
+import math
+from statistics import NormalDist
+
+
+# fewest samples before a verdict may settle, a couple of lucky probes prove nothing
+DEFAULT_MIN_SAMPLES = 5
+
+# most samples a borderline target gets before it is evaluated as is
+DEFAULT_MAX_SAMPLES = 100
+
+# share of samples allowed above a percentile threshold, p95 <= T means at most 5% of samples exceed T
+_PERCENTILE_SHARES = (('latency_p95_ms', 0.05), ('latency_p99_ms', 0.01))
+
+# latencies are floored here before taking logs, a 0ms sample would have no log
+_MIN_LATENCY_MS = 1e-3
+
+
+"""confidence and sample bounds of an adaptive run, hands out one tracker per target"""
+class AdaptivePolicy:
+    
+    def __init__(self, slo_config, confidence=0.95, min_samples=DEFAULT_MIN_SAMPLES,
+                 max_samples=DEFAULT_MAX_SAMPLES):
+        if not 0.5 <= confidence < 1:
+            raise ValueError(f"Confidence must be in [0.5, 1): {confidence}")
+        if not 1 <= min_samples <= max_samples:
+            raise ValueError(f"Need 1 <= min samples <= max samples: {min_samples}, {max_samples}")
+        self.slo_config = slo_config
+        self.confidence = confidence
+        self.min_samples = min_samples
+        self.max_samples = max_samples
+        # every decision is one-sided (above or below a limit), so the bound uses a one-sided z
+        self.z = NormalDist().inv_cdf(confidence)
+    
+    """tracker for one target, checks come from that target's slo thresholds"""
+    def tracker(self, host, port):
+        return VerdictTracker(self, self.slo_config.get_slo(host, port))
+
+
+"""one slo check: share of samples over a limit vs the share allowed, plus a log-normal fit for latencies"""
+class _Check:
+    
+    __slots__ = ('phase', 'threshold_ms', 'allowed', 'hits', 'n', 'z_share', 'log_sum', 'log_sq')
+    
+    def __init__(self, phase, threshold_ms, allowed):
+        self.phase = phase                # None for the whole probe, else a phase name
+        self.threshold_ms = threshold_ms  # None for the loss check
+        self.allowed = allowed
+        self.hits = 0  # samples over the threshold, or failed probes for loss
+        self.n = 0
+        # standard normal quantile of the percentile checked, 1.645 for p95
+        self.z_share = NormalDist().inv_cdf(1 - allowed) if threshold_ms is not None else None
+        self.log_sum = 0.0  # sum and sum of squares of log latencies
+        self.log_sq = 0.0
+    
+    def add(self, latency_ms):
+        self.n += 1
+        if latency_ms > self.threshold_ms:
+            self.hits += 1
+        log_ms = math.log(max(latency_ms, _MIN_LATENCY_MS))
+        self.log_sum += log_ms
+        self.log_sq += log_ms * log_ms
+    
+    """confidence bounds in ms on the checked percentile from a log-normal fit of the samples"""
+    def quantile_bounds(self, z):
+        n = self.n
+        if n < 2:
+            return 0.0, math.inf
+        mean = self.log_sum / n
+        sd = math.sqrt(max(0.0, (self.log_sq - n * mean * mean) / (n - 1)))
+        estimate = mean + self.z_share * sd
+        # standard error of mean + z * sd for normal data
+        error = sd * math.sqrt(1 / n + self.z_share ** 2 / (2 * (n - 1)))
+        return math.exp(estimate - z * error), math.exp(estimate + z * error)
+
+
+"""counts every slo check of a target as samples land and decides when the verdict is settled"""
+class VerdictTracker:
+    
+    def __init__(self, policy, slo):
+        self.policy = policy
+        self.attempts = 0
+        self.successes = 0
+        self.verdict = None  # 'pass' or 'fail' once settled
+        
+        self._latency_checks = []  # checks fed by the overall latency
+        self._phase_checks = {}    # phase name -> checks fed by that phase's latency
+        self._loss = None
+        
+        for key, allowed in _PERCENTILE_SHARES:
+            if slo.get(key) is not None:
+                self._latency_checks.append(_Check(None, slo[key], allowed))
+        for phase, thresholds in (slo.get('phases') or {}).items():
+            for key, allowed in _PERCENTILE_SHARES:
+                if thresholds.get(key) is not None:
+                    self._phase_checks.setdefault(phase, []).append(_Check(phase, thresholds[key], allowed))
+        if slo.get('max_loss_pct') is not None:
+            self._loss = _Check(None, None, slo['max_loss_pct'] / 100)
+    
+    """count one sample (result None for a failed probe), returns the verdict once settled"""
+    def add(self, result, phases):
+        self.attempts += 1
+        if self._loss is not None:
+            self._loss.n += 1
+            if result is None:
+                self._loss.hits += 1
+        
+        if result is not None:
+            self.successes += 1
+            for check in self._latency_checks:
+                check.add(result)
+            for phase, phase_ms in phases.items():
+                for check in self._phase_checks.get(phase, ()):
+                    check.add(phase_ms)
+        
+        if self.verdict is None and self.attempts >= self.policy.min_samples:
+            self.verdict = self._decide()
+        return self.verdict
+    
+    """True once the target needs no more samples, settled or at the cap"""
+    def done(self):
+        return self.verdict is not None or self.attempts >= self.policy.max_samples
+    
+    def _decide(self):
+        z = self.policy.z
+        
+        # without one successful probe the evaluation has no data, so it cant pass yet
+        settled_pass = self.successes > 0
+        for check in [*self._latency_checks, *(c for cs in self._phase_checks.values() for c in cs)]:
+            if check.n == 0:
+                # phase not measured (e.g. tls on plain tcp), evaluation skips it too
+                continue
+            low, high = wilson_bounds(check.hits, check.n, z)
+            quantile_low, quantile_high = check.quantile_bounds(z)
+            # any check surely over its limit fails the target, by count or by how slow the samples are
+            if low > check.allowed or (quantile_low > check.threshold_ms and check.hits / check.n > check.allowed):
+                return 'fail'
+            if check.hits == 0:
+                # a count alone needs ~50 clean samples for p95 and ~270 for p99,
+                # latencies well under the limit settle it as soon as the fitted percentile is surely below
+                if quantile_high > check.threshold_ms:
+                    settled_pass = False
+            elif high > check.allowed:
+                # samples over the limit mean a tail the fit cant be trusted with, only the count decides
+                settled_pass = False
+        
+        loss = self._loss
+        if loss is not None:
+            low, high = wilson_bounds(loss.hits, loss.n, z)
+            if low > loss.allowed:
+                return 'fail'
+            # a failure has no size to fit, and ruling out 5% loss from zero failures takes ~50 probes,
+            # so without failures loss is judged on the samples like a fixed --samples run
+            if loss.hits and high > loss.allowed:
+                settled_pass = False
+        return 'pass' if settled_pass else None
+    
+    """sample count, confidence and verdict for the report, verdict None means the cap was hit"""
+    def summary(self):
+        return {
+            'samples': self.attempts,
+            'confidence': self.policy.confidence,
+            'min_samples': self.policy.min_samples,
+            'max_samples': self.policy.max_samples,
+            'verdict': self.verdict,
+        }
+
+
+"""wilson score bounds on a binomial proportion, z picks the confidence"""
+def wilson_bounds(hits, n, z):
+    # stays inside [0, 1] and behaves at 0 or n hits, unlike the normal approximation
+    share = hits / n
+    z2 = z * z
+    center = share + z2 / (2 * n)
+    spread = z * math.sqrt(share * (1 - share) / n + z2 / (4 * n * n))
+    scale = 1 + z2 / n
+    return max(0.0, (center - spread) / scale), min(1.0, (center + spread) / scale)
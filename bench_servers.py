@@ -0,0 +1,163 @@
+"""local stand-in tcp/http/tls servers for offline benchmarks and tests"""
+import asyncio
+import multiprocessing
+import os
+import random
+import shutil
+import socket
+import ssl
+import subprocess
+import tempfile
+import traceback
+
+
+"""what one stand-in server should do"""
+class ServerSpec:
+    
+    """kind is tcp, http or https, delay in seconds before the response, drop_rate in 0-1"""
+    def __init__(self, name, kind='http', delay=0.0, drop_rate=0.0, reject_head=False):
+        self.name = name
+        self.kind = kind
+        self.delay = delay            # server think time before the status line
+        self.drop_rate = drop_rate    # fraction of requests answered with a reset
+        self.reject_head = reject_head  # reset HEAD requests so probes fall back to GET
+
+
+"""run a set of stand-in servers in a child process on loopback"""
+class BenchServers:
+    
+    """ports are picked by the os, read them from .ports once started"""
+    def __init__(self, specs, seed=0):
+        self.specs = specs
+        self.seed = seed  # drops are random but repeatable run to run
+        self.ports = {}   # spec name -> port
+        self._process = None
+        self._cert_dir = None
+    
+    """start the server process and wait until every server is listening"""
+    def start(self, timeout=10.0):
+        cert = None
+        if any(spec.kind == 'https' for spec in self.specs):
+            self._cert_dir = tempfile.mkdtemp(prefix='quickprobe-bench-')
+            cert = make_self_signed_cert(self._cert_dir)
+        
+        # separate process so server cpu never shows up in the prober's numbers
+        mp = multiprocessing.get_context('spawn')
+        ready = mp.Queue()
+        self._process = mp.Process(target=_server_main, args=(self.specs, cert, self.seed, ready), daemon=True)
+        self._process.start()
+        
+        message = ready.get(timeout=timeout)
+        if message[0] == 'error':
+            self.stop()
+            raise RuntimeError(f"Bench servers failed to start:\n{message[1]}")
+        self.ports = message[1]
+        return self
+    
+    """stop the server process and remove the temporary certificate"""
+    def stop(self):
+        if self._process is not None:
+            self._process.terminate()
+            self._process.join(timeout=5)
+            self._process = None
+        if self._cert_dir is not None:
+            shutil.rmtree(self._cert_dir, ignore_errors=True)
+            self._cert_dir = None
+    
+    def __enter__(self):
+        return self.start()
+    
+    def __exit__(self, exc_type, exc, tb):
+        self.stop()
+
+
+"""a loopback port with nothing listening, connects to it are refused"""
+def closed_port():
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.bind(('127.0.0.1', 0))
+    port = sock.getsockname()[1]
+    sock.close()
+    return port
+
+
+"""write a throwaway self-signed cert and key with the openssl cli, returns (cert, key) paths"""
+def make_self_signed_cert(directory):
+    # stdlib ssl cant create certificates, openssl ships with git and most python installs
+    if shutil.which('openssl') is None:
+        raise RuntimeError("openssl not found, cannot create a certificate for the TLS server")
+    
+    cert = os.path.join(directory, 'cert.pem')
+    key = os.path.join(directory, 'key.pem')
+    subprocess.run(
+        ['openssl', 'req', '-x509', '-newkey', 'rsa:2048', '-nodes', '-keyout', key, '-out', cert,
+         '-days', '1', '-subj', '/CN=localhost'],
+        check=True, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    return cert, key
+
+
+"""server process entry point, must stay top level so spawn can import it"""
+def _server_main(specs, cert, seed, ready):
+    try:
+        asyncio.run(_serve(specs, cert, seed, ready))
+    except Exception:
+        ready.put(('error', traceback.format_exc()))
+
+
+async def _serve(specs, cert, seed, ready):
+    rng = random.Random(seed)
+    servers = []
+    ports = {}
+    
+    for spec in specs:
+        ssl_context = None
+        if spec.kind == 'https':
+            ssl_context = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+            ssl_context.load_cert_chain(*cert)
+        
+        if spec.kind == 'tcp':
+            handler = _handle_tcp
+        else:
+            handler = _http_handler(spec, rng)
+        
+        # large backlog so bursts of cold connects dont hit syn retries
+        server = await asyncio.start_server(handler, '127.0.0.1', 0, ssl=ssl_context, backlog=4096)
+        servers.append(server)
+        ports[spec.name] = server.sockets[0].getsockname()[1]
+    
+    ready.put(('ready', ports))
+    
+    # runs until the parent terminates us
+    await asyncio.gather(*(server.serve_forever() for server in servers))
+
+
+"""plain tcp server, the handshake is all a tcp probe needs"""
+async def _handle_tcp(reader, writer):
+    writer.close()
+
+
+"""build a minimal http/1.1 handler with keep-alive for one spec"""
+def _http_handler(spec, rng):
+    async def handle(reader, writer):
+        try:
+            while True:
+                head = await reader.readuntil(b'\r\n\r\n')
+                method = head.split(b' ', 1)[0]
+                
+                # the probe only falls back on errors, a 405 would count as a good sample
+                if (spec.reject_head and method == b'HEAD') or rng.random() < spec.drop_rate:
+                    writer.transport.abort()
+                    return
+                
+                if spec.delay:
+                    await asyncio.sleep(spec.delay)
+                
+                body = b'' if method == b'HEAD' else b'ok'
+                writer.write(b'HTTP/1.1 200 OK\r\nContent-Type: text/plain\r\nContent-Length: 2\r\n\r\n' + body)
+                await writer.drain()
+        except (asyncio.IncompleteReadError, asyncio.LimitOverrunError, ConnectionError, ssl.SSLError):
+            pass
+        finally:
+            writer.close()
+    
+    return handle
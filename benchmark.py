@@ -0,0 +1,426 @@
+"""offline benchmark suite against local stand-in servers"""
+import argparse
+import asyncio
+import contextlib
+import json
+import math
+import multiprocessing
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import time
+import traceback
+from datetime import datetime
+from bench_servers import BenchServers, ServerSpec, closed_port
+from http_probe import HTTPClient, http_probe_with_fallback
+from report import NDJSONReportWriter, generate_json_report
+from resolver import DNSCache
+from runner import TargetSamples, build_results, run_probes
+from slo import SLOConfig, evaluate_slo_batch
+from stats import compute_stats, compute_stats_many
+from tcp_probe import tcp_probe, tcp_probe_socket
+
+try:
+    import resource
+except ImportError:
+    # no resource module on windows, peak rss is reported as None there
+    resource = None
+
+
+# injected server delay the http benchmarks measure against
+INJECTED_DELAY = 0.020
+
+# sizes per scale, targets are probed through run_probes, stats targets are synthetic
+SCALES = {
+    'quick': {'probes': 500, 'concurrency': 50, 'tcp_targets': 1000, 'http_targets': 1000,
+              'stats_targets': 10000, 'stats_samples': 20, 'startup_runs': 5, 'startup_lines': 10000},
+    'full': {'probes': 5000, 'concurrency': 200, 'tcp_targets': 100000, 'http_targets': 10000,
+             'stats_targets': 100000, 'stats_samples': 20, 'startup_runs': 20, 'startup_lines': 100000},
+}
+
+# servers every run starts, benchmarks look them up by name
+SERVER_SPECS = [
+    ServerSpec('tcp', 'tcp'),
+    ServerSpec('http', 'http'),
+    ServerSpec('http_delay', 'http', delay=INJECTED_DELAY),
+    ServerSpec('https_delay', 'https', delay=INJECTED_DELAY),
+    ServerSpec('http_head_reject', 'http', reject_head=True),
+    ServerSpec('http_drops', 'http', drop_rate=0.01),
+]
+
+# metrics compared by --compare, True means higher is better
+_COMPARE_METRICS = {'probes_per_sec': True, 'cpu_us_per_probe': False, 'seconds': False, 'peak_rss_mb': False}
+
+
+"""run many probes with a concurrency cap, returns per-probe results and wall/cpu time"""
+async def _drive(probe, count, concurrency):
+    semaphore = asyncio.Semaphore(concurrency)
+    
+    async def one():
+        async with semaphore:
+            return await probe()
+    
+    wall_start = time.perf_counter()
+    cpu_start = time.process_time()
+    results = await asyncio.gather(*(one() for _ in range(count)))
+    wall = time.perf_counter() - wall_start
+    cpu = time.process_time() - cpu_start
+    return results, wall, cpu
+
+
+"""throughput and overhead numbers shared by every probe benchmark"""
+def _throughput(probes, wall, cpu):
+    return {
+        'probes': probes,
+        'seconds': wall,
+        'probes_per_sec': probes / wall if wall else None,
+        'cpu_us_per_probe': cpu / probes * 1e6 if probes else None,
+    }
+
+
+"""how far measured latencies sit above the injected server delay"""
+def _delay_error(latencies, delay):
+    if not latencies:
+        return {'median_error_ms': None, 'p99_error_ms': None}
+    ordered = sorted(latencies)
+    delay_ms = delay * 1000
+    return {
+        'injected_delay_ms': delay_ms,
+        'median_error_ms': ordered[len(ordered) // 2] - delay_ms,
+        'p99_error_ms': ordered[min(math.ceil((len(ordered) - 1) * 0.99), len(ordered) - 1)] - delay_ms,
+    }
+
+
+"""tcp_probe throughput against a server that accepts and closes"""
+async def bench_tcp_probe(scale, ports, engine='stream'):
+    probe_fn = tcp_probe_socket if engine == 'socket' else tcp_probe
+    resolver = DNSCache()
+    port = ports['tcp']
+    try:
+        results, wall, cpu = await _drive(lambda: probe_fn('127.0.0.1', port, 5.0, None, resolver),
+                                          scale['probes'], scale['concurrency'])
+    finally:
+        await resolver.close()
+    
+    failures = sum(1 for result in results if result is None)
+    return {**_throughput(len(results), wall, cpu), 'failures': failures}
+
+
+"""http_probe_with_fallback throughput and error against the injected server delay"""
+async def bench_http_probe(scale, ports, server='http_delay', connection='cold', delay=INJECTED_DELAY,
+                           tls_resume=False):
+    scheme = 'https' if server.startswith('https') else 'http'
+    url = f"{scheme}://127.0.0.1:{ports[server]}"
+    resolver = DNSCache()
+    async with HTTPClient(pool_size=scale['concurrency'], resolver=resolver, tls_resume=tls_resume) as client:
+        results, wall, cpu = await _drive(lambda: http_probe_with_fallback(url, 5.0, client, connection),
+                                          scale['probes'], scale['concurrency'])
+        tls_stats = client.tls_stats()
+    await resolver.close()
+    
+    latencies = [ms for ms, method in results if ms is not None]
+    methods = {}
+    for _, method in results:
+        methods[method] = methods.get(method, 0) + 1
+    
+    result = {**_throughput(len(results), wall, cpu), **_delay_error(latencies, delay), 'methods': methods}
+    if tls_resume:
+        result['tls_handshakes'] = tls_stats
+    return result
+
+
+"""full run_probes path with scheduler, dns cache and batched stats"""
+async def bench_run_probes(scale, ports, mode='tcp'):
+    if mode == 'tcp':
+        # every hundredth target points at a closed port to exercise the failure path
+        count = scale['tcp_targets']
+        dead_port = closed_port()
+        targets = [('127.0.0.1', dead_port if i % 100 == 99 else ports['tcp']) for i in range(count)]
+    else:
+        # http failures come from the server dropping about 1% of requests
+        count = scale['http_targets']
+        targets = [('127.0.0.1', ports['http_drops'])] * count
+    
+    num_probes = 2
+    wall_start = time.perf_counter()
+    cpu_start = time.process_time()
+    results = await run_probes(targets, num_probes=num_probes, timeout=5.0, interval=0.0,
+                               max_concurrent=scale['concurrency'], mode=mode, pool_size=scale['concurrency'])
+    wall = time.perf_counter() - wall_start
+    cpu = time.process_time() - cpu_start
+    
+    loss = sum(result['loss_pct'] for result in results) / len(results)
+    return {**_throughput(count * num_probes, wall, cpu), 'targets': count, 'avg_loss_pct': loss}
+
+
+"""repeatable lognormal latencies around 20ms"""
+def _synthetic_latencies(targets, samples):
+    rng = random.Random(0)
+    return [[rng.lognormvariate(3, 0.5) for _ in range(samples)] for _ in range(targets)]
+
+
+"""batched stats over many synthetic targets"""
+async def bench_compute_stats(scale, ports):
+    lists = _synthetic_latencies(scale['stats_targets'], scale['stats_samples'])
+    
+    start = time.perf_counter()
+    compute_stats_many(lists)
+    batch_seconds = time.perf_counter() - start
+    
+    # per-target calls are what the old code path did, kept for comparison
+    start = time.perf_counter()
+    for latencies in lists[:1000]:
+        compute_stats(latencies)
+    single_seconds = (time.perf_counter() - start) / min(len(lists), 1000) * len(lists)
+    
+    return {
+        'targets': len(lists),
+        'seconds': batch_seconds,
+        'targets_per_sec': len(lists) / batch_seconds,
+        'single_call_seconds_estimate': single_seconds,
+    }
+
+
+"""build_results, slo evaluation and json report for many synthetic targets"""
+async def bench_json_report(scale, ports):
+    targets = []
+    for i, latencies in enumerate(_synthetic_latencies(scale['stats_targets'], scale['stats_samples'])):
+        target = TargetSamples(f"host{i}.example", 443)
+        target.latencies = latencies
+        target.phase_latencies = {'connect': latencies}
+        targets.append(target)
+    
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'report.json')
+        start = time.perf_counter()
+        results = build_results(targets)
+        evaluations = evaluate_slo_batch(results, SLOConfig())
+        generate_json_report(results, evaluations, {'benchmark': True}, path)
+        seconds = time.perf_counter() - start
+        size = os.path.getsize(path)
+    
+    return {'targets': len(targets), 'seconds': seconds, 'targets_per_sec': len(targets) / seconds,
+            'report_bytes': size}
+
+
+"""streaming ndjson report, targets evaluated and written in batches as a run would"""
+async def bench_ndjson_report(scale, ports):
+    config = SLOConfig()
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'report.ndjson')
+        start = time.perf_counter()
+        with NDJSONReportWriter(path, {'benchmark': True}) as writer:
+            pending = []
+            for i, latencies in enumerate(_synthetic_latencies(scale['stats_targets'], scale['stats_samples'])):
+                target = TargetSamples(f"host{i}.example", 443)
+                target.latencies = latencies
+                target.phase_latencies = {'connect': latencies}
+                pending.append(target)
+                if len(pending) == 256 or i == scale['stats_targets'] - 1:
+                    results = build_results(pending)
+                    writer.write_targets(results, evaluate_slo_batch(results, config))
+                    pending = []
+        seconds = time.perf_counter() - start
+        size = os.path.getsize(path)
+    
+    return {'targets': scale['stats_targets'], 'seconds': seconds,
+            'targets_per_sec': scale['stats_targets'] / seconds, 'report_bytes': size}
+
+
+"""wall time of cli invocations in fresh interpreters, ci gates pay it on every call"""
+async def bench_cli_startup(scale, ports):
+    main_py = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'main.py')
+    
+    with tempfile.TemporaryDirectory() as directory:
+        # a big targets file that dedups to one target, so parsing shows and probing does not
+        targets_path = os.path.join(directory, 'targets.txt')
+        with open(targets_path, 'w') as f:
+            f.write(f"127.0.0.1:{ports['tcp']}\n" * scale['startup_lines'])
+        config_path = os.path.join(directory, 'config.yaml')
+        with open(config_path, 'w') as f:
+            f.write("default_slo:\n  latency_p95_ms: 100\n  max_loss_pct: 5\n")
+        plan_path = os.path.join(directory, 'plan.pickle')
+        
+        run = ['run', '--targets', targets_path, '--config', config_path, '--samples', '1']
+        commands = {
+            'help': ['--help'],
+            'sample_tcp': ['sample', '--url', f"127.0.0.1:{ports['tcp']}", '--samples', '1'],
+            'run_tcp': run,
+            'run_tcp_plan_cached': run + ['--plan-cache', plan_path],
+        }
+        # the first cached run builds the plan, only reuse is timed
+        subprocess.run([sys.executable, main_py, *commands['run_tcp_plan_cached']], capture_output=True)
+        
+        result = {}
+        for name, args in commands.items():
+            times = []
+            for _ in range(scale['startup_runs']):
+                start = time.perf_counter()
+                subprocess.run([sys.executable, main_py, *args], capture_output=True, cwd=directory)
+                times.append(time.perf_counter() - start)
+            result[f'{name}_seconds'] = sorted(times)[len(times) // 2]
+    
+    result['seconds'] = result['sample_tcp_seconds']
+    return result
+
+
+# name -> (benchmark coroutine function, extra keyword arguments)
+BENCHMARKS = {
+    'tcp_probe_stream': (bench_tcp_probe, {'engine': 'stream'}),
+    'tcp_probe_socket': (bench_tcp_probe, {'engine': 'socket'}),
+    'http_probe_cold': (bench_http_probe, {'connection': 'cold'}),
+    'http_probe_warm': (bench_http_probe, {'connection': 'warm'}),
+    'https_probe_cold': (bench_http_probe, {'server': 'https_delay', 'connection': 'cold'}),
+    'https_probe_resumed': (bench_http_probe, {'server': 'https_delay', 'connection': 'cold', 'tls_resume': True}),
+    'http_head_fallback': (bench_http_probe, {'server': 'http_head_reject', 'delay': 0.0}),
+    'run_probes_tcp': (bench_run_probes, {'mode': 'tcp'}),
+    'run_probes_http': (bench_run_probes, {'mode': 'http'}),
+    'compute_stats': (bench_compute_stats, {}),
+    'json_report': (bench_json_report, {}),
+    'ndjson_report': (bench_ndjson_report, {}),
+    'cli_startup': (bench_cli_startup, {}),
+}
+
+
+"""peak resident memory of this process in megabytes"""
+def peak_rss_mb():
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # linux reports kilobytes, macos bytes
+    return peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
+
+
+"""benchmark process entry point, must stay top level so spawn can import it"""
+def _benchmark_main(name, scale, ports, results_queue):
+    try:
+        function, kwargs = BENCHMARKS[name]
+        # probes print progress and errors, keep that cost in but not the noise
+        with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+            result = asyncio.run(function(scale, ports, **kwargs))
+        result['peak_rss_mb'] = peak_rss_mb()
+        results_queue.put(('result', result))
+    except Exception:
+        results_queue.put(('error', traceback.format_exc()))
+
+
+"""run one benchmark in a fresh process so peak rss and cpu are its own"""
+def run_isolated(name, scale, ports, timeout=600):
+    mp = multiprocessing.get_context('spawn')
+    results_queue = mp.Queue()
+    process = mp.Process(target=_benchmark_main, args=(name, scale, ports, results_queue))
+    process.start()
+    try:
+        kind, payload = results_queue.get(timeout=timeout)
+    finally:
+        process.join(timeout=5)
+        if process.is_alive():
+            process.terminate()
+    
+    if kind == 'error':
+        return {'error': payload}
+    return payload
+
+
+"""short hash of the checked out commit, None outside a git tree"""
+def _git_commit():
+    try:
+        output = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                                cwd=os.path.dirname(os.path.abspath(__file__)))
+    except OSError:
+        return None
+    return output.stdout.strip() or None
+
+
+"""run the selected benchmarks and return the json-ready document"""
+def run_benchmarks(names, scale_name='quick'):
+    scale = SCALES[scale_name]
+    results = {}
+    
+    with BenchServers(SERVER_SPECS) as servers:
+        for name in names:
+            print(f"  Running {name}...")
+            results[name] = run_isolated(name, scale, servers.ports)
+    
+    return {
+        'metadata': {
+            'timestamp': datetime.utcnow().isoformat() + 'Z',
+            'commit': _git_commit(),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'scale': scale_name,
+            'scale_settings': scale,
+        },
+        'benchmarks': results,
+    }
+
+
+"""print one line per benchmark with the headline numbers"""
+def print_benchmarks(document):
+    print(f"\n{'Benchmark':<22} {'Probes/s':<12} {'CPU us/probe':<14} {'Median err ms':<15} "
+          f"{'Seconds':<10} {'Peak RSS MB':<12}")
+    print("-"*90)
+    
+    for name, result in document['benchmarks'].items():
+        if 'error' in result:
+            print(f"{name:<22} ERROR")
+            print(result['error'])
+            continue
+        
+        def cell(key, fmt='.1f'):
+            value = result.get(key)
+            return format(value, fmt) if value is not None else '-'
+        
+        print(f"{name:<22} {cell('probes_per_sec'):<12} {cell('cpu_us_per_probe'):<14} "
+              f"{cell('median_error_ms', '.3f'):<15} {cell('seconds', '.3f'):<10} {cell('peak_rss_mb'):<12}")
+
+
+"""print relative change of each headline metric against a baseline document"""
+def print_comparison(document, baseline):
+    print(f"\nCompared with {baseline['metadata'].get('commit') or 'baseline'}:")
+    for name, result in document['benchmarks'].items():
+        before = baseline['benchmarks'].get(name)
+        if before is None or 'error' in result or 'error' in before:
+            continue
+        
+        changes = []
+        for metric, higher_is_better in _COMPARE_METRICS.items():
+            old, new = before.get(metric), result.get(metric)
+            if not old or new is None:
+                continue
+            change = (new - old) / old * 100
+            better = change > 0 if higher_is_better else change < 0
+            changes.append(f"{metric} {change:+.1f}%{'' if better else ' (worse)'}")
+        
+        if changes:
+            print(f"  {name:<22} {', '.join(changes)}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='QuickProbe offline benchmarks against local servers')
+    parser.add_argument('--scale', choices=sorted(SCALES), default='quick',
+                        help='quick (1k targets) or full (up to 100k targets)')
+    parser.add_argument('--only', nargs='+', choices=list(BENCHMARKS), help='Run only these benchmarks')
+    parser.add_argument('-o', '--output', default='benchmark.json', help='Where to write the JSON results')
+    parser.add_argument('--compare', help='Baseline JSON from an earlier run to compare against')
+    args = parser.parse_args()
+    
+    print(f"Running {args.scale} benchmarks on loopback...")
+    document = run_benchmarks(args.only or list(BENCHMARKS), args.scale)
+    
+    with open(args.output, 'w') as f:
+        json.dump(document, f, indent=2)
+    
+    print_benchmarks(document)
+    print(f"\nResults saved: {args.output}")
+    
+    if args.compare:
+        with open(args.compare) as f:
+            print_comparison(document, json.load(f))
+
+
+if __name__ == '__main__':
+    main()
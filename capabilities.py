@@ -0,0 +1,103 @@
+"""per-target http capability cache: working method, scheme, redirect target and http version"""
+import json
+import os
+import time
+from pathlib import Path
+
+
+# learned capabilities are trusted for a day unless told otherwise
+DEFAULT_CAPABILITY_TTL = 86400.0
+
+
+"""cache key of a target, an explicit scheme is part of what the user asked for"""
+def capability_key(host, port, scheme=None):
+    netloc = f"[{host}]:{port}" if ':' in host else f"{host}:{port}"
+    return f"{scheme}://{netloc}" if scheme else netloc
+
+
+"""learned capabilities keyed by target, optionally loaded from and saved to a json file"""
+class CapabilityCache:
+    
+    """path None keeps the cache in memory for one run, ttl in seconds"""
+    def __init__(self, path=None, ttl=DEFAULT_CAPABILITY_TTL):
+        self.path = Path(path) if path else None
+        self.ttl = ttl
+        self._entries = {}  # key -> {'method', 'url', 'scheme', 'http_version', 'redirected', 'learned_at'}
+        
+        # counters for the run summary and report
+        self.hits = 0
+        self.misses = 0
+        self.learned = 0
+        self.invalidations = 0
+        
+        if self.path is not None and self.path.exists():
+            self._load()
+    
+    def _load(self):
+        try:
+            with self.path.open('r') as f:
+                entries = json.load(f).get('targets', {})
+        except (OSError, ValueError, AttributeError) as e:
+            # a broken cache only costs a rediscovery, never the run
+            print(f"Warning: Ignoring HTTP capability cache {self.path} - {e}")
+            return
+        now = time.time()
+        self._entries = {key: entry for key, entry in entries.items() if not self._expired(entry, now)}
+    
+    def _expired(self, entry, now):
+        return now - entry.get('learned_at', 0) > self.ttl
+    
+    """capabilities of a target or None when unknown or expired"""
+    def get(self, key):
+        entry = self._entries.get(key)
+        if entry is not None and self._expired(entry, time.time()):
+            del self._entries[key]
+            entry = None
+        if entry is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return entry
+    
+    """remember what worked for a target, info is filled in by http_probe"""
+    def learn(self, key, info):
+        entry = {
+            'method': info['method'],
+            'url': info['url'],
+            'scheme': info['scheme'],
+            'http_version': info['http_version'],
+            'redirected': info['redirected'],
+            'learned_at': info.get('learned_at', time.time()),
+        }
+        self._entries[key] = entry
+        self.learned += 1
+        return entry
+    
+    """take an entry another cache already holds, e.g. the coordinator's, without counting it as learned"""
+    def seed(self, key, entry):
+        self._entries[key] = entry
+    
+    """forget a target whose learned capabilities stopped working"""
+    def invalidate(self, key):
+        if self._entries.pop(key, None) is not None:
+            self.invalidations += 1
+    
+    """counters for reporting"""
+    def stats(self):
+        return {
+            'entries': len(self._entries),
+            'hits': self.hits,
+            'misses': self.misses,
+            'learned': self.learned,
+            'invalidations': self.invalidations,
+        }
+    
+    """write the cache file, no-op for an in-memory cache"""
+    def save(self):
+        if self.path is None:
+            return
+        # write then rename so a crash never leaves half a file behind
+        tmp_path = self.path.with_name(self.path.name + '.tmp')
+        with tmp_path.open('w') as f:
+            json.dump({'version': 1, 'targets': self._entries}, f, separators=(',', ':'))
+        os.replace(tmp_path, self.path)
@@ -0,0 +1,112 @@
+"""aimd concurrency controller: more probes in flight while the event loop keeps up, fewer when it lags"""
+import asyncio
+
+
+# seconds between loop lag checks, short enough that a congested window is narrow
+DEFAULT_TICK = 0.05
+
+# loop lag a sample may sit in before it counts as congested, 5ms is about the noise floor we report
+DEFAULT_LAG_BUDGET = 0.005
+
+# share of the limit kept after a congested tick
+BACKOFF = 0.5
+
+
+"""adjusts a scheduler's in-flight limit from loop lag and probe start delay, like tcp congestion control"""
+class ConcurrencyController:
+    
+    """ceiling is the most probes ever in flight, exclude drops congested samples from the stats"""
+    def __init__(self, ceiling=1000, floor=1, lag_budget=DEFAULT_LAG_BUDGET, tick=DEFAULT_TICK, exclude=False):
+        if floor > ceiling:
+            raise ValueError(f"Concurrency floor {floor} is above the ceiling {ceiling}")
+        self.ceiling = ceiling
+        self.floor = floor
+        self.lag_budget = lag_budget
+        self.tick = tick
+        self.exclude = exclude
+        self.scheduler = None
+        
+        self.limit = None
+        self.threshold = ceiling  # slow start doubles the limit up to here, then it grows by one
+        self.congested = False    # the last tick was over budget
+        self.epoch = 0            # congested ticks so far, a sample spanning a change was measured under lag
+        self.lag = 0.0            # lag of the last tick in seconds
+        self._start_delay = 0.0   # worst dispatch to start delay of a probe since the last tick
+        self._slot_waits = 0
+        self._draining = False    # backed off, wait for in flight to fall to the new limit before cutting again
+        
+        # run summary
+        self.peak = 0
+        self.backoffs = 0
+        self.congested_ticks = 0
+        self.ticks = 0
+    
+    """take over the scheduler's limit, initial is where the ramp starts"""
+    def attach(self, scheduler, initial=None):
+        self.scheduler = scheduler
+        self.limit = min(self.ceiling, max(self.floor, initial or self.floor))
+        self.peak = self.limit
+        scheduler.set_limit(self.limit)
+        scheduler.delay_observer = self.observe_start_delay
+    
+    """a probe started delay seconds after the scheduler dispatched it"""
+    def observe_start_delay(self, delay):
+        if delay > self._start_delay:
+            self._start_delay = delay
+    
+    """whether a sample that started at epoch was measured while the loop was congested"""
+    def congested_since(self, epoch):
+        return self.congested or self.epoch != epoch
+    
+    """check the loop every tick until cancelled"""
+    async def run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            started = loop.time()
+            await asyncio.sleep(self.tick)
+            # a timer that fires late means every probe callback waited just as long
+            self.update(max(0.0, loop.time() - started - self.tick))
+    
+    """one control step from the lag of the last tick"""
+    def update(self, lag):
+        scheduler = self.scheduler
+        self.ticks += 1
+        self.lag = lag
+        noise = max(lag, self._start_delay)
+        self._start_delay = 0.0
+        waited = scheduler.slot_waits != self._slot_waits
+        self._slot_waits = scheduler.slot_waits
+        
+        if self._draining and scheduler.in_flight <= self.limit:
+            self._draining = False
+        
+        if noise > self.lag_budget:
+            self.congested = True
+            self.epoch += 1
+            self.congested_ticks += 1
+            # probes started before the last backoff are still adding lag, one cut per drain like one per rtt
+            if not self._draining:
+                self.limit = max(self.floor, int(self.limit * BACKOFF))
+                self.threshold = self.limit
+                self.backoffs += 1
+                self._draining = True
+        else:
+            self.congested = False
+            # only grow while probes are actually waiting for a slot
+            if waited and not self._draining:
+                if self.limit < self.threshold:
+                    grown = min(self.threshold, self.limit * 2)
+                else:
+                    grown = self.limit + 1
+                self.limit = min(self.ceiling, grown)
+                self.peak = max(self.peak, self.limit)
+        scheduler.set_limit(self.limit)
+    
+    """limits and congestion over the run, for the console summary"""
+    def summary(self):
+        return {
+            'limit': self.limit,
+            'peak': self.peak,
+            'backoffs': self.backoffs,
+            'congested_pct': self.congested_ticks / self.ticks * 100 if self.ticks else 0.0,
+        }
@@ -0,0 +1,442 @@
+"""distributed probing: agents probe their share of targets, a coordinator merges the summaries"""
+import asyncio
+import bisect
+import hashlib
+import hmac
+import ipaddress
+import json
+import secrets
+import socket
+import struct
+from adaptive import AdaptivePolicy
+from capabilities import CapabilityCache, capability_key
+from runner import run_probes
+from stats import LatencySketch, compute_stats
+from targets import split_target, target_key
+from timeouts import TimeoutPolicy
+
+
+# ring points per agent, more points spread targets more evenly
+RING_POINTS = 64
+
+# frames above this are refused, a summary message is a few kilobytes
+MAX_FRAME = 64 * 1024 * 1024
+
+# seconds a coordinator has to answer an agent's token challenge
+AUTH_TIMEOUT = 10.0
+
+# plain probe settings a coordinator passes on to its agents as is
+AGENT_SETTINGS = ('num_probes', 'timeout', 'interval', 'max_concurrent', 'mode', 'pool_size', 'connection',
+                  'dns_ttl', 'include_dns', 'rate', 'tcp_engine', 'destination_limit', 'destination_rate', 'coalesce',
+                  'tls_resume')
+
+# TimeoutPolicy fields, the policy is rebuilt on the agent from these
+_TIMEOUT_FIELDS = ('ceiling', 'floor', 'adaptive', 'failures', 'cooldown', 'max_cooldown')
+
+# frame header: json length, binary payload length
+_FRAME_HEADER = '>II'
+
+
+"""consistent hash ring, adding or removing an agent only moves the targets next to its points"""
+class HashRing:
+    
+    def __init__(self, nodes=(), points=RING_POINTS):
+        self.points = points
+        self._hashes = []  # sorted point hashes
+        self._owners = {}  # point hash -> node
+        for node in nodes:
+            self.add(node)
+    
+    def add(self, node):
+        for i in range(self.points):
+            point = _hash(f"{node}#{i}")
+            self._owners[point] = node
+            bisect.insort(self._hashes, point)
+    
+    def remove(self, node):
+        self._hashes = [point for point in self._hashes if self._owners[point] != node]
+        self._owners = {point: self._owners[point] for point in self._hashes}
+    
+    """up to count distinct nodes for a key, walking clockwise from its hash"""
+    def nodes_for(self, key, count=1):
+        if not self._hashes:
+            return []
+        nodes = []
+        start = bisect.bisect(self._hashes, _hash(key))
+        for i in range(len(self._hashes)):
+            node = self._owners[self._hashes[(start + i) % len(self._hashes)]]
+            if node not in nodes:
+                nodes.append(node)
+                if len(nodes) == count:
+                    break
+        return nodes
+
+
+def _hash(text):
+    return int.from_bytes(hashlib.blake2b(text.encode('utf-8'), digest_size=8).digest(), 'big')
+
+
+"""write one frame: a json header and an optional binary payload"""
+async def write_message(writer, header, payload=b''):
+    body = json.dumps(header, separators=(',', ':')).encode('utf-8')
+    writer.write(struct.pack(_FRAME_HEADER, len(body), len(payload)) + body + payload)
+    await writer.drain()
+
+
+"""read one frame, returns (header, payload)"""
+async def read_message(reader):
+    body_size, payload_size = struct.unpack(_FRAME_HEADER, await reader.readexactly(struct.calcsize(_FRAME_HEADER)))
+    if body_size + payload_size > MAX_FRAME:
+        raise ValueError(f"Frame of {body_size + payload_size} bytes is over the {MAX_FRAME} byte limit")
+    header = json.loads(await reader.readexactly(body_size))
+    payload = await reader.readexactly(payload_size) if payload_size else b''
+    return header, payload
+
+
+"""one finished target as sketches: overall latency first, then each phase, concatenated"""
+def pack_summary(target):
+    parts = [('latency', LatencySketch.from_values(target.latencies).to_bytes())]
+    for phase, values in target.phase_latencies.items():
+        parts.append((phase, LatencySketch.from_values(values).to_bytes()))
+    layout = [[name, len(data)] for name, data in parts]
+    return layout, b''.join(data for _, data in parts)
+
+
+"""rebuild name -> LatencySketch from pack_summary output"""
+def unpack_summary(layout, payload):
+    sketches = {}
+    offset = 0
+    for name, size in layout:
+        sketches[name] = LatencySketch.from_bytes(payload[offset:offset + size])
+        offset += size
+    return sketches
+
+
+"""hmac a coordinator answers an agent's hello nonce with, proves it holds the shared token"""
+def auth_mac(token, nonce):
+    return hmac.new(token.encode('utf-8'), nonce.encode('ascii'), hashlib.sha256).hexdigest()
+
+
+"""whether host only accepts connections from this machine"""
+def is_loopback(host):
+    if host == 'localhost':
+        return True
+    try:
+        return ipaddress.ip_address(host).is_loopback
+    except ValueError:
+        return False
+
+
+"""run an agent that probes whatever a coordinator sends it until cancelled"""
+async def serve_agent(host='127.0.0.1', port=7700, name=None, on_ready=None, token=None):
+    # on_ready(port) is called once listening, port 0 picks a free one
+    if not token and not is_loopback(host):
+        # anyone who can connect could make the agent probe any host and port
+        raise ValueError(f"An agent listening on {host or 'all interfaces'} needs a token, "
+                         f"only loopback addresses may go without one")
+    name = name or socket.gethostname()
+    server = await asyncio.start_server(lambda r, w: _agent_session(r, w, name, token), host, port)
+    bound_port = server.sockets[0].getsockname()[1]
+    print(f"Agent {name} listening on {host}:{bound_port}")
+    if on_ready is not None:
+        on_ready(bound_port)
+    async with server:
+        await server.serve_forever()
+
+
+"""one coordinator connection: hello, the token check, then probe jobs until the coordinator hangs up"""
+async def _agent_session(reader, writer, name, token=None):
+    try:
+        if token:
+            nonce = secrets.token_hex(16)
+            await write_message(writer, {'type': 'hello', 'agent': name, 'nonce': nonce})
+            try:
+                message, _ = await asyncio.wait_for(read_message(reader), AUTH_TIMEOUT)
+            except (asyncio.IncompleteReadError, asyncio.TimeoutError):
+                message = {}
+            mac = message.get('mac') if message.get('type') == 'auth' else None
+            if not isinstance(mac, str) or not hmac.compare_digest(mac, auth_mac(token, nonce)):
+                peer = writer.get_extra_info('peername')
+                print(f"Agent {name}: refused coordinator {peer[0] if peer else 'unknown'} - bad or missing token")
+                return
+            await write_message(writer, {'type': 'ready'})
+        else:
+            await write_message(writer, {'type': 'hello', 'agent': name})
+        while True:
+            try:
+                message, _ = await read_message(reader)
+            except asyncio.IncompleteReadError:
+                return
+            if message.get('type') != 'probe':
+                continue
+            
+            targets = [tuple(entry) for entry in message['targets']]
+            indices = message['indices']
+            settings = agent_probe_options(message)
+            
+            # summaries stream back as targets finish, frames go out in order on one writer
+            sent = []
+            
+            def on_target(index, target):
+                layout, payload = pack_summary(target)
+                header = {'type': 'result', 'index': indices[index], 'failures': target.failures,
+                          'sketches': layout, 'sampling': target.sampling,
+                          'short_circuited': target.short_circuited}
+                if target.capability_source is not None:
+                    header['capability'] = [target.capability, target.capability_source,
+                                            target.capability_invalidations]
+                sent.append(asyncio.ensure_future(write_message(writer, header, payload)))
+            
+            await run_probes(targets, on_target=on_target, **settings)
+            await asyncio.gather(*sent)
+            await write_message(writer, {'type': 'done'})
+    except (ConnectionError, ValueError) as e:
+        print(f"Agent {name}: coordinator connection lost - {e}")
+    finally:
+        writer.close()
+
+
+"""json-safe probe settings for agents: plain settings as is, policies as their parameters"""
+def encode_settings(probe_options):
+    settings = {key: probe_options[key] for key in AGENT_SETTINGS if key in probe_options}
+    adaptive = probe_options.get('adaptive')
+    if adaptive is not None:
+        # thresholds travel with each job, they are looked up per target
+        settings['adaptive'] = {'confidence': adaptive.confidence, 'min_samples': adaptive.min_samples,
+                                'max_samples': adaptive.max_samples}
+    timeouts = probe_options.get('timeouts')
+    if timeouts is not None:
+        settings['timeouts'] = {field: getattr(timeouts, field) for field in _TIMEOUT_FIELDS}
+    return settings
+
+
+"""run_probes keyword arguments from a coordinator's probe message"""
+def agent_probe_options(message):
+    settings = message['settings']
+    options = {key: settings[key] for key in AGENT_SETTINGS if key in settings}
+    targets = message['targets']
+    
+    if 'adaptive' in settings:
+        slo_config = _SentThresholds(targets, message['thresholds'], message['slo'])
+        options['adaptive'] = AdaptivePolicy(slo_config, **settings['adaptive'])
+    if 'timeouts' in settings:
+        options['timeouts'] = TimeoutPolicy(**settings['timeouts'])
+    if 'capabilities' in message:
+        # what the coordinator's cache knows about these targets, learned entries go back with the results
+        cache = CapabilityCache()
+        for (host, port, scheme), entry in zip(targets, message['capabilities']):
+            if entry is not None:
+                cache.seed(capability_key(host, port, scheme), entry)
+        options['capabilities'] = cache
+    return options
+
+
+"""slo thresholds the coordinator resolved for each target of a job, looked up like SLOConfig.get_slo"""
+class _SentThresholds:
+    
+    def __init__(self, targets, table, picks):
+        self._slos = {(host, port): table[pick] for (host, port, _), pick in zip(targets, picks)}
+    
+    def get_slo(self, host, port=None):
+        return self._slos[(host, port)]
+
+
+"""a connected agent as the coordinator sees it"""
+class AgentConnection:
+    
+    def __init__(self, name, address, reader, writer):
+        self.name = name
+        self.address = address
+        self.reader = reader
+        self.writer = writer
+    
+    """connect, read the agent's hello and answer its token challenge if it sent one"""
+    @classmethod
+    async def connect(cls, address, timeout=10.0, token=None):
+        host, _, port = address.rpartition(':')
+        reader, writer = await asyncio.wait_for(asyncio.open_connection(host.strip('[]'), int(port)), timeout)
+        try:
+            hello, _ = await asyncio.wait_for(read_message(reader), timeout)
+            if hello.get('type') != 'hello':
+                raise ConnectionError(f"Agent at {address} did not say hello")
+            if 'nonce' in hello:
+                if not token:
+                    raise ConnectionError(f"Agent at {address} needs a token")
+                await write_message(writer, {'type': 'auth', 'mac': auth_mac(token, hello['nonce'])})
+                try:
+                    ready, _ = await asyncio.wait_for(read_message(reader), timeout)
+                except asyncio.IncompleteReadError:
+                    ready = {}
+                if ready.get('type') != 'ready':
+                    raise ConnectionError(f"Agent at {address} refused the token")
+        except BaseException:
+            writer.close()
+            raise
+        return cls(hello['agent'], address, reader, writer)
+    
+    def close(self):
+        self.writer.close()
+
+
+"""merged sketches and failure counts of one target, overall and per agent"""
+class _TargetSummary:
+    
+    def __init__(self, host, port):
+        self.host = host
+        self.port = port
+        self.sketches = {}  # name -> merged LatencySketch
+        self.failures = 0
+        self.short_circuited = 0
+        self.agents = {}    # agent -> (sketches, failures, short circuited, sampling)
+    
+    def add(self, agent, sketches, failures, sampling=None, short_circuited=0):
+        self.agents[agent] = (sketches, failures, short_circuited, sampling)
+        self.failures += failures
+        self.short_circuited += short_circuited
+        for name, sketch in sketches.items():
+            # merge into a fresh sketch so the per-agent one stays as the agent measured it
+            self.sketches.setdefault(name, LatencySketch()).merge(sketch)
+    
+    def to_result(self):
+        result = _summary_result(self.host, self.port, self.sketches, self.failures, self.short_circuited,
+                                 _merge_sampling([sampling for *_, sampling in self.agents.values()]))
+        result['agents'] = {
+            agent: _summary_result(self.host, self.port, *summary)
+            for agent, summary in self.agents.items()
+        }
+        return result
+
+
+"""result dict in the run_probes shape from sketches and a failure count"""
+def _summary_result(host, port, sketches, failures, short_circuited=0, sampling=None):
+    latency = sketches.get('latency') or LatencySketch()
+    attempts = latency.count + failures
+    return {
+        'host': host,
+        'port': port,
+        'stats': compute_stats(latency),
+        'loss_pct': (failures / attempts) * 100 if attempts else 0.0,
+        'phases': {name: compute_stats(sketch) for name, sketch in sketches.items() if name != 'latency'},
+        'samples': attempts,
+        'short_circuited': short_circuited,
+        'sampling': sampling,
+    }
+
+
+"""one adaptive sampling summary from every vantage point's, settled only when all of them agree"""
+def _merge_sampling(summaries):
+    summaries = [summary for summary in summaries if summary is not None]
+    if not summaries:
+        return None
+    verdicts = {summary['verdict'] for summary in summaries}
+    return {**summaries[0], 'samples': sum(summary['samples'] for summary in summaries),
+            'verdict': verdicts.pop() if len(verdicts) == 1 else None}
+
+
+"""probe targets on remote agents and merge their summaries, results come back in targets order"""
+async def run_distributed(targets, agents, replicas=1, token=None, **probe_options):
+    # agents is a list of host:port addresses, replicas probes each target from that many agents
+    # token answers the challenge of agents started with one
+    settings = encode_settings(probe_options)
+    adaptive = probe_options.get('adaptive')
+    capabilities = probe_options.get('capabilities')
+    
+    connections = {}
+    for address in agents:
+        try:
+            agent = await AgentConnection.connect(address, token=token)
+        except (OSError, asyncio.TimeoutError, ConnectionError, ValueError, asyncio.IncompleteReadError) as e:
+            print(f"Warning: Could not reach agent {address} - {e}")
+            continue
+        if agent.name in connections:
+            # two agents on one host keep their vantage points apart by address
+            agent.name = f"{agent.name}@{address}"
+        connections[agent.name] = agent
+    if not connections:
+        raise ConnectionError("No agents reachable")
+    
+    print(f"Distributing {len(targets)} target(s) across {len(connections)} agent(s) "
+          f"({replicas} vantage point(s) per target)...\n")
+    
+    entries = [split_target(target) for target in targets]
+    keys = ['|'.join(map(str, target_key(entry))) for entry in entries]
+    summaries = [_TargetSummary(host, port) for host, port, _ in entries]
+    ring = HashRing(connections)
+    
+    # every target starts unassigned, agents that drop out hand theirs back to the ring
+    pending = set(range(len(targets)))
+    try:
+        while pending and connections:
+            assignments = {name: [] for name in connections}
+            for index in sorted(pending):
+                wanted = min(replicas, len(connections))
+                owners = [node for node in ring.nodes_for(keys[index], len(connections))
+                          if node not in summaries[index].agents][:wanted - len(summaries[index].agents)]
+                for node in owners:
+                    assignments[node].append(index)
+            pending = set()
+            
+            runs = [_run_on_agent(connections[name], indices, entries, settings, summaries, adaptive, capabilities)
+                    for name, indices in assignments.items() if indices]
+            for name, unfinished in await asyncio.gather(*runs):
+                if unfinished is None:
+                    continue
+                print(f"Warning: Agent {name} dropped out, reassigning {len(unfinished)} target(s)")
+                connections.pop(name).close()
+                ring.remove(name)
+                pending.update(unfinished)
+    finally:
+        for agent in connections.values():
+            agent.close()
+    
+    if pending:
+        print(f"Warning: {len(pending)} target(s) were not probed, no agents left")
+    
+    return [summary.to_result() for summary in summaries]
+
+
+"""fold what an agent learned about a target into the coordinator's capability cache"""
+def _merge_capability(capabilities, key, capability, source, invalidations):
+    if capability is not None and source == 'discovered':
+        capabilities.learn(key, capability)
+    elif capability is None and invalidations:
+        capabilities.invalidate(key)
+
+
+"""send one agent its targets and collect summaries, returns (name, unfinished indices or None)"""
+async def _run_on_agent(agent, indices, entries, settings, summaries, adaptive=None, capabilities=None):
+    unfinished = set(indices)
+    message = {
+        'type': 'probe',
+        'indices': indices,
+        'targets': [list(entries[index]) for index in indices],
+        'settings': settings,
+    }
+    if adaptive is not None:
+        # targets on one rule share its thresholds, each distinct set is sent once
+        table = {}
+        picks = []
+        for index in indices:
+            host, port, _ = entries[index]
+            slo = adaptive.slo_config.get_slo(host, port)
+            picks.append(table.setdefault(id(slo), (len(table), dict(slo)))[0])
+        message['thresholds'] = [slo for _, slo in table.values()]
+        message['slo'] = picks
+    if capabilities is not None:
+        message['capabilities'] = [capabilities.get(capability_key(*entries[index])) for index in indices]
+    
+    try:
+        await write_message(agent.writer, message)
+        while True:
+            message, payload = await read_message(agent.reader)
+            if message['type'] == 'done':
+                return agent.name, None
+            if message['type'] == 'result':
+                index = message['index']
+                summaries[index].add(agent.name, unpack_summary(message['sketches'], payload), message['failures'],
+                                     message.get('sampling'), message.get('short_circuited', 0))
+                if capabilities is not None and 'capability' in message:
+                    _merge_capability(capabilities, capability_key(*entries[index]), *message['capability'])
+                unfinished.discard(index)
+    except (OSError, asyncio.IncompleteReadError, ValueError):
+        return agent.name, unfinished
@@ -0,0 +1,222 @@
+"""non-blocking probe events: probes queue compact records, batching sinks write them off the hot path"""
+import asyncio
+import json
+import sys
+import time
+from collections import deque, namedtuple
+from contextlib import asynccontextmanager
+from pathlib import Path
+
+
+# events held between drains, past this new events are counted and dropped instead of blocking a probe
+DEFAULT_QUEUE_SIZE = 10000
+
+# seconds between drains
+DEFAULT_FLUSH_INTERVAL = 0.25
+
+# per flush, more targets than this with the same error print as one summary line
+DEFAULT_DETAIL_LIMIT = 5
+
+
+# kind is 'start', 'error' or 'timeout', phase says where ('connect', 'http'), error is the exception class
+Event = namedtuple('Event', ['ts', 'kind', 'target', 'phase', 'error', 'detail'])
+
+
+"""bounded in-memory queue of events, emit never blocks and never does io"""
+class EventBus:
+    
+    def __init__(self, maxsize=DEFAULT_QUEUE_SIZE):
+        self.maxsize = maxsize
+        self.sinks = []
+        self.dropped = 0  # events lost to a full queue since the last drain
+        self._queue = deque()
+        self._writing = asyncio.Lock()  # one batch in the worker thread at a time, in order
+        self._stopping = asyncio.Event()
+    
+    def add_sink(self, sink):
+        self.sinks.append(sink)
+    
+    """queue one event, dropped and counted when the queue is full"""
+    def emit(self, kind, target, phase=None, error=None, detail=None):
+        if len(self._queue) >= self.maxsize:
+            self.dropped += 1
+            return
+        self._queue.append(Event(time.time(), kind, target, phase, error, detail))
+    
+    """hand everything queued so far to the sinks, blocking writes run in a worker thread"""
+    async def drain(self):
+        if not self._queue and not self.dropped:
+            return
+        batch = list(self._queue)
+        self._queue.clear()
+        dropped, self.dropped = self.dropped, 0
+        
+        blocking = [sink for sink in self.sinks if sink.blocking]
+        for sink in self.sinks:
+            if not sink.blocking:
+                sink.write(batch, dropped)
+        if blocking:
+            async with self._writing:
+                await asyncio.get_running_loop().run_in_executor(None, _write_all, blocking, batch, dropped)
+    
+    """drain every interval until stop is called"""
+    async def run(self, interval=DEFAULT_FLUSH_INTERVAL):
+        while not self._stopping.is_set():
+            try:
+                await asyncio.wait_for(self._stopping.wait(), timeout=interval)
+            except asyncio.TimeoutError:
+                pass
+            await self.drain()
+    
+    """let run finish the write it is in and return, cancelling it would leave the worker thread writing"""
+    def stop(self):
+        self._stopping.set()
+    
+    def close(self):
+        for sink in self.sinks:
+            sink.close()
+
+
+def _write_all(sinks, batch, dropped):
+    for sink in sinks:
+        sink.write(batch, dropped)
+
+
+"""human readable console output, errors grouped by class once a flush has many of them"""
+class ConsoleSink:
+    
+    blocking = True
+    
+    def __init__(self, stream=None, detail_limit=DEFAULT_DETAIL_LIMIT):
+        self.stream = stream
+        self.detail_limit = detail_limit
+    
+    def write(self, batch, dropped=0):
+        groups = {}  # (kind, phase, error, detail for starts) -> events, in first seen order
+        for event in batch:
+            if event.kind == 'timeout':
+                # timeouts show up as loss in the results, no line each
+                continue
+            key = (event.kind, event.phase, event.error, event.detail if event.kind == 'start' else None)
+            groups.setdefault(key, []).append(event)
+        
+        lines = []
+        for (kind, phase, error, detail), events in groups.items():
+            targets = {event.target for event in events}
+            if len(targets) <= self.detail_limit:
+                lines.extend(format_event(event) for event in events)
+            elif kind == 'start':
+                lines.append(f"  Probing {len(targets)} targets ({detail})...")
+            else:
+                first = events[0]
+                lines.append(f"  {len(targets)} targets: {error} {_verb(phase)} "
+                             f"(e.g. {first.target} - {first.detail})")
+        if dropped:
+            lines.append(f"  ({dropped} events dropped, event queue full)")
+        
+        if lines:
+            stream = self.stream or sys.stdout
+            stream.write('\n'.join(lines) + '\n')
+            stream.flush()
+    
+    def close(self):
+        pass
+
+
+"""one json object per event appended to a file"""
+class NDJSONEventSink:
+    
+    blocking = True
+    
+    def __init__(self, path):
+        self.path = Path(path)
+        self._file = self.path.open('a')
+    
+    def write(self, batch, dropped=0):
+        lines = [json.dumps(event._asdict(), separators=(',', ':')) for event in batch]
+        if dropped:
+            lines.append(json.dumps({'ts': time.time(), 'kind': 'dropped', 'count': dropped}))
+        if lines:
+            self._file.write('\n'.join(lines) + '\n')
+            self._file.flush()
+    
+    def close(self):
+        self._file.close()
+
+
+"""error counts by class for the metrics endpoint, cheap enough to run on the loop"""
+class MetricsEventSink:
+    
+    blocking = False
+    
+    def __init__(self, metrics):
+        self.metrics = metrics
+    
+    def write(self, batch, dropped=0):
+        for event in batch:
+            if event.kind in ('error', 'timeout'):
+                self.metrics.count_error(event.error)
+    
+    def close(self):
+        pass
+
+
+"""console text of one event, None for events the console skips"""
+def format_event(event):
+    if event.kind == 'start':
+        return f"  Probing {event.target} ({event.detail})..."
+    if event.kind == 'error':
+        return f"  Error {_verb(event.phase)} {event.target} - {event.error}: {event.detail}"
+    return None
+
+
+def _verb(phase):
+    return 'connecting to' if phase == 'connect' else 'probing'
+
+
+# bus of the running pipeline, None prints events straight away like before there was a pipeline
+_active = None
+
+
+"""record a probe event on the running pipeline"""
+def emit(kind, target, phase=None, error=None, detail=None):
+    bus = _active
+    if bus is not None:
+        bus.emit(kind, target, phase, error, detail)
+        return
+    line = format_event(Event(None, kind, target, phase, error, detail))
+    if line is not None:
+        print(line)
+
+
+"""run an event pipeline for the block, an already running pipeline is reused as is"""
+@asynccontextmanager
+async def open_event_pipeline(console=True, path=None, metrics=None, interval=DEFAULT_FLUSH_INTERVAL,
+                              maxsize=DEFAULT_QUEUE_SIZE):
+    global _active
+    if _active is not None:
+        bus = _active
+        yield bus
+        # flush this block's events so they print ahead of anything the caller prints next
+        await bus.drain()
+        return
+    
+    bus = EventBus(maxsize)
+    if console:
+        bus.add_sink(ConsoleSink())
+    if path is not None:
+        bus.add_sink(NDJSONEventSink(path))
+    if metrics is not None:
+        bus.add_sink(MetricsEventSink(metrics))
+    
+    _active = bus
+    task = asyncio.ensure_future(bus.run(interval))
+    try:
+        yield bus
+    finally:
+        bus.stop()
+        await asyncio.gather(task, return_exceptions=True)
+        _active = None
+        # whatever is still queued goes out before the caller prints its summary
+        await bus.drain()
+        bus.close()
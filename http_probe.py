@@ -1,63 +1,387 @@
 """http ttfb time to first byte probing"""
 import asyncio
+import contextvars
+import socket
 import time
 import aiohttp
 import ssl
+from urllib.parse import urlsplit
+from aiohttp.abc import AbstractResolver
+from events import emit
 
 
-"""measure http ttfb in milliseconds"""
-async def http_probe(url, timeout=5.0, method='HEAD'):
-    # start timer before http request
-    start = time.perf_counter()
+# timestamps of the probe running in the current task
+# trace hooks and the ssl context write into it
+_current_marks = contextvars.ContextVar('current_marks', default=None)
+
+
+"""ssl context that notes when the tls handshake starts and can resume a saved session"""
+class _PhaseSSLContext(ssl.SSLContext):
     
+    """asyncio wraps the socket right after tcp connect, so this marks the tls start"""
+    def wrap_bio(self, *args, **kwargs):
+        marks = _current_marks.get()
+        if marks is None:
+            return super().wrap_bio(*args, **kwargs)
+        
+        marks['tls_start'] = time.perf_counter()
+        # asyncio has no way to pass a session, so the probe hands it over through the marks
+        if marks.get('tls_session') is not None:
+            kwargs['session'] = marks['tls_session']
+        ssl_object = super().wrap_bio(*args, **kwargs)
+        marks['ssl_object'] = ssl_object
+        return ssl_object
+
+
+"""build the ssl context shared by every probe in a run"""
+def create_ssl_context():
     # disable ssl verification because we only care about timing not security
     # in production monitoring you might want real certs
-    ssl_context = ssl.create_default_context()
+    ssl_context = _PhaseSSLContext(ssl.PROTOCOL_TLS_CLIENT)
     ssl_context.check_hostname = False
     ssl_context.verify_mode = ssl.CERT_NONE
+    return ssl_context
+
+
+"""build trace config that records connection phase timestamps"""
+def create_trace_config():
+    # each hook writes a timestamp into the marks dict passed as trace_request_ctx
+    def mark(name):
+        async def hook(session, trace_config_ctx, params):
+            marks = trace_config_ctx.trace_request_ctx
+            if marks is not None:
+                marks[name] = time.perf_counter()
+        return hook
+    
+    trace_config = aiohttp.TraceConfig()
+    trace_config.on_connection_create_start.append(mark('conn_start'))
+    trace_config.on_connection_create_end.append(mark('conn_end'))
+    trace_config.on_dns_resolvehost_start.append(mark('dns_start'))
+    trace_config.on_dns_resolvehost_end.append(mark('dns_end'))
+    return trace_config
+
+
+"""turn raw timestamps into dns, connect, tls and ttfb phases in milliseconds"""
+def _marks_to_phases(marks, start, first_byte):
+    phases = {}
+    
+    # reused connections skip straight to ttfb
+    if 'conn_end' in marks:
+        connect_start = marks['conn_start']
+        if 'dns_end' in marks:
+            phases['dns'] = (marks['dns_end'] - marks['dns_start']) * 1000
+            connect_start = marks['dns_end']
+        else:
+            # ip literal or resolver cache hit
+            phases['dns'] = 0.0
+        
+        if 'tls_start' in marks:
+            phases['connect'] = (marks['tls_start'] - connect_start) * 1000
+            phases['tls'] = (marks['conn_end'] - marks['tls_start']) * 1000
+        else:
+            phases['connect'] = (marks['conn_end'] - connect_start) * 1000
+        
+        ready = marks['conn_end']
+    else:
+        ready = start
+    
+    # request send plus server processing up to the first byte
+    phases['ttfb'] = (first_byte - ready) * 1000
+    return phases
+
+
+"""aiohttp resolver backed by the shared dns cache"""
+class _CachedResolver(AbstractResolver):
+    
+    def __init__(self, dns_cache):
+        self._dns_cache = dns_cache
+    
+    """answer aiohttp lookups from the cache in the format it expects"""
+    async def resolve(self, host, port=0, family=socket.AF_INET):
+        addr_infos = await self._dns_cache.resolve(host, port, family)
+        
+        hosts = []
+        for addr_family, _, proto, _, address in addr_infos:
+            hosts.append({
+                'hostname': host,
+                'host': address[0],
+                'port': address[1],
+                'family': addr_family,
+                'proto': proto,
+                'flags': socket.AI_NUMERICHOST | socket.AI_NUMERICSERV,
+            })
+        return hosts
+    
+    """cache is owned by the runner, nothing to close here"""
+    async def close(self):
+        pass
+
+
+"""long-lived pooled http client shared by all probes in a run"""
+class HTTPClient:
+    
+    """set up shared ssl context, sessions are created lazily inside the event loop"""
+    def __init__(self, pool_size=100, resolver=None, tls_resume=False):
+        self.pool_size = pool_size
+        self.resolver = resolver  # shared DNSCache, None means aiohttp resolves on its own
+        self.ssl_context = create_ssl_context()
+        self._sessions = {}  # connection mode -> ClientSession
+        
+        # with tls_resume each target's last tls session is offered on its next handshake
+        self.tls_resume = tls_resume
+        self.tls_sessions = {}  # (host, port) -> ssl.SSLSession
+        self.tls_full = 0
+        self.tls_resumed = 0
+        
+        # requests that reused a pooled connection vs opened a new one
+        self.pool_hits = 0
+        self.pool_misses = 0
+    
+    """get the session for cold (new connection) or warm (reused connection) probes"""
+    def session(self, connection='cold'):
+        if connection not in ('cold', 'warm'):
+            raise ValueError(f"Unknown connection mode: {connection}")
+        
+        if connection not in self._sessions:
+            # cold connector closes every connection after the response
+            # so each sample pays for a full tcp (and tls) setup
+            # warm connector keeps connections alive for reuse
+            connector_options = {}
+            if self.resolver is not None:
+                # our cache replaces aiohttp's own so every mode shares one set of answers
+                connector_options['resolver'] = _CachedResolver(self.resolver)
+                connector_options['use_dns_cache'] = False
+            
+            connector = aiohttp.TCPConnector(
+                limit=self.pool_size,
+                ssl=self.ssl_context,
+                force_close=(connection == 'cold'),
+                **connector_options,
+            )
+            self._sessions[connection] = aiohttp.ClientSession(
+                connector=connector,
+                trace_configs=[create_trace_config(), self._pool_trace_config()],
+            )
+        
+        return self._sessions[connection]
     
-    timeout_config = aiohttp.ClientTimeout(total=timeout)
+    """trace config counting pooled connection reuse"""
+    def _pool_trace_config(self):
+        async def on_reuse(session, trace_config_ctx, params):
+            self.pool_hits += 1
+        
+        async def on_create(session, trace_config_ctx, params):
+            self.pool_misses += 1
+        
+        trace_config = aiohttp.TraceConfig()
+        trace_config.on_connection_reuseconn.append(on_reuse)
+        trace_config.on_connection_create_end.append(on_create)
+        return trace_config
+    
+    """pool hit/miss counters for reporting"""
+    def pool_stats(self):
+        requests = self.pool_hits + self.pool_misses
+        return {
+            'hits': self.pool_hits,
+            'misses': self.pool_misses,
+            'hit_rate': self.pool_hits / requests if requests else None,
+        }
+    
+    """full vs resumed handshake counters for reporting"""
+    def tls_stats(self):
+        handshakes = self.tls_full + self.tls_resumed
+        return {
+            'full': self.tls_full,
+            'resumed': self.tls_resumed,
+            'resume_rate': self.tls_resumed / handshakes if handshakes else None,
+        }
+    
+    """keep the session of a finished handshake and split its time into tls_full or tls_resumed"""
+    def record_tls_session(self, key, marks, phases):
+        ssl_object = marks.get('ssl_object')
+        # a reused pooled connection had no handshake this time
+        if ssl_object is None or 'tls' not in phases:
+            return
+        
+        if ssl_object.session_reused:
+            self.tls_resumed += 1
+            phases['tls_resumed'] = phases['tls']
+        else:
+            self.tls_full += 1
+            phases['tls_full'] = phases['tls']
+        
+        # tls 1.3 tickets arrive after the handshake, by the first response byte they are in
+        session = ssl_object.session
+        if session is not None:
+            self.tls_sessions[key] = session
+    
+    """close all sessions and their pooled connections"""
+    async def close(self):
+        for session in self._sessions.values():
+            await session.close()
+        self._sessions = {}
+    
+    async def __aenter__(self):
+        return self
+    
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.close()
+
+
+"""measure http ttfb in milliseconds"""
+async def http_probe(url, timeout=5.0, method='HEAD', client=None, connection='cold', phases=None,
+                     include_dns=False, info=None):
+    # info, when given, gets what answered: method, final url, scheme and http version, or the error
+    # one-off probe without a shared client gets its own short-lived one
+    if client is None:
+        async with HTTPClient(pool_size=1) as own_client:
+            return await http_probe(url, timeout, method, own_client, connection, phases, include_dns, info)
+    
+    # phases gets dns, connect, tls and ttfb times filled in separately
+    if phases is None:
+        phases = {}
+    phases.clear()
+    
+    session = client.session(connection)
+    # one deadline for the lookup and the request, a slow lookup leaves the request less time
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + timeout
+    marks = {}
+    _current_marks.set(marks)
+    
+    parts = urlsplit(url)
+    port = parts.port or (443 if parts.scheme == 'https' else 80)
+    
+    tls_key = None
+    if client.tls_resume and parts.scheme == 'https':
+        tls_key = (parts.hostname, port)
+        marks['tls_session'] = client.tls_sessions.get(tls_key)
     
     try:
-        async with aiohttp.ClientSession(timeout=timeout_config) as session:
-            async with session.request(method, url, ssl=ssl_context) as response:
-                # read just 1 byte to measure time to first byte
-                # dont download whole response body
-                await response.content.read(1)
-                
-                # stop timer once first byte arrives
-                elapsed = time.perf_counter() - start
-                elapsed_ms = elapsed * 1000
-                
-                return elapsed_ms
+        # with include_dns the name lookup counts toward the measured time
+        if include_dns:
+            start = time.perf_counter()
+        
+        resolve_ms = 0.0
+        if client.resolver is not None:
+            # resolve up front so the request connects to a cached address
+            resolve_start = time.perf_counter()
+            await asyncio.wait_for(client.resolver.resolve(parts.hostname, port), timeout=timeout)
+            resolve_ms = (time.perf_counter() - resolve_start) * 1000
+        
+        remaining = deadline - loop.time()
+        if remaining <= 0:
+            raise asyncio.TimeoutError()
+        timeout_config = aiohttp.ClientTimeout(total=remaining)
+        
+        # start timer right before the request, session setup is not counted
+        if not include_dns:
+            start = time.perf_counter()
+        
+        async with session.request(method, url, timeout=timeout_config, trace_request_ctx=marks) as response:
+            # read just 1 byte to measure time to first byte
+            # dont download whole response body
+            await response.content.read(1)
+            
+            # stop timer once first byte arrives
+            first_byte = time.perf_counter()
+            elapsed = first_byte - start
+            elapsed_ms = elapsed * 1000
+            phases.update(_marks_to_phases(marks, start, first_byte))
+            if 'dns' in phases:
+                phases['dns'] += resolve_ms
+            if tls_key is not None:
+                client.record_tls_session(tls_key, marks, phases)
+            
+            if info is not None:
+                info.update(_response_info(method, response))
+            
+            if connection == 'warm':
+                # drain the body so the connection goes back to the pool
+                await response.read()
+            
+            return elapsed_ms
     
     except asyncio.TimeoutError:
         # server too slow or network issue
+        emit('timeout', url, 'http', 'TimeoutError')
+        if info is not None:
+            info['error'] = 'timeout'
         return None
-    except aiohttp.ClientError as e:
+    except (aiohttp.ClientError, OSError) as e:
         # http errors like 404, connection refused, dns failure
-        print(f"  Error probing {url} - {type(e).__name__}: {e}")
+        emit('error', url, 'http', type(e).__name__, str(e))
+        if info is not None:
+            info['error'] = type(e).__name__
         return None
     except Exception as e:
         # catch anything else unexpected
-        print(f"  Unexpected error probing {url} - {type(e).__name__}: {e}")
+        emit('error', url, 'http', type(e).__name__, f"unexpected - {e}")
+        if info is not None:
+            info['error'] = type(e).__name__
         return None
 
 
-"""try head request first then fallback to get if needed"""
-async def http_probe_with_fallback(url, timeout=5.0):
+"""what answered a successful probe, after any redirects"""
+def _response_info(method, response):
+    version = response.version
+    return {
+        'method': method,
+        'url': str(response.url),
+        'scheme': response.url.scheme,
+        'http_version': f"{version.major}.{version.minor}" if version else None,
+        'redirected': bool(response.history),
+    }
+
+
+"""try head request first then fallback to get if needed, both share one timeout"""
+async def http_probe_with_fallback(url, timeout=5.0, client=None, connection='cold', phases=None,
+                                   include_dns=False, info=None):
     # head is faster and uses less bandwith (no body)
     # but some servers dont support it
-    result = await http_probe(url, timeout, method='HEAD')
+    if info is None:
+        info = {}
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + timeout
+    result = await http_probe(url, timeout, 'HEAD', client, connection, phases, include_dns, info)
     
     if result is not None:
         return result, 'HEAD'
     
+    # a head that timed out got no answer at all, a get would only wait out another timeout
+    remaining = deadline - loop.time()
+    if info.get('error') == 'timeout' or remaining <= 0:
+        return None, 'FAILED'
+    
     # some servers reject head requests so try get as fallback
-    result = await http_probe(url, timeout, method='GET')
+    info.pop('error', None)
+    result = await http_probe(url, remaining, 'GET', client, connection, phases, include_dns, info)
     
     if result is not None:
         return result, 'GET'
     
     # both failed
     return None, 'FAILED'
+
+
+"""first contact with a target: head then get, then the other scheme if the guessed one doesnt speak http"""
+async def discover_http(url, timeout=5.0, client=None, connection='cold', phases=None, include_dns=False,
+                        info=None, try_other_scheme=False):
+    # info gets what worked, see http_probe, so later samples can go straight to it
+    if info is None:
+        info = {}
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + timeout
+    result, method = await http_probe_with_fallback(url, timeout, client, connection, phases, include_dns, info)
+    
+    # a timeout means nothing answered, only a protocol level failure hints at the wrong scheme
+    # the other scheme gets what is left of the timeout, a sample never holds its slot for longer
+    remaining = deadline - loop.time()
+    if result is None and try_other_scheme and info.get('error') != 'timeout' and remaining > 0:
+        scheme, rest = url.split('://', 1)
+        other_url = f"{'http' if scheme == 'https' else 'https'}://{rest}"
+        info.pop('error', None)
+        result, method = await http_probe_with_fallback(other_url, remaining, client, connection, phases,
+                                                        include_dns, info)
+    
+    return result, method
@@ -3,111 +3,69 @@ import argparse
 import asyncio
 import sys
 from pathlib import Path
-from runner import run_probes, print_results_table
-from slo import SLOConfig, evaluate_slo
-from report import generate_json_report, format_json_summary
+from events import open_event_pipeline
+from metrics import serve_metrics
+from plan import PlanCache
+from targets import TargetLoader, parse_target
+from adaptive import DEFAULT_MAX_SAMPLES, DEFAULT_MIN_SAMPLES, AdaptivePolicy
+from timeouts import TimeoutPolicy
+from capabilities import DEFAULT_CAPABILITY_TTL, CapabilityCache
 
 
-"""parse targets file, return list of (host, port) tuples"""
-def parse_targets_file(filepath):
-    targets = []
-    errors = []
-    path = Path(filepath)
+# finished targets buffered before a streamed report write
+REPORT_BATCH = 256
+
+# invalid target lines printed before only a count is shown
+MAX_TARGET_WARNINGS = 5
+
+
+"""load and dedup targets from files, directories or '-' for stdin, exits if none are valid"""
+def load_targets(sources):
+    loader = TargetLoader(sources)
     
-    if not path.exists():
-        print(f"Error: File not found: {filepath}")
+    try:
+        loader.load()
+    except FileNotFoundError as e:
+        print(f"Error: {e}")
         sys.exit(1)
     
-    with path.open('r') as f:
-        for line_num, line in enumerate(f, start=1):
-            line = line.strip()
-            
-            # skip empty lines and comments
-            if not line or line.startswith('#'):
-                continue
-            
-            try:
-                host, port = parse_target(line)
-                targets.append((host, port))
-            except ValueError as e:
-                error_msg = f"Line {line_num}: {e}"
-                errors.append(error_msg)
-                print(f"Warning: {error_msg}")
-                continue
-    
-    if not targets:
-        print(f"\nError: No valid targets found in {filepath}")
+    report_loaded_targets(loader, ', '.join(sources))
+    return loader
+
+
+"""print the invalid lines and skipped counts of a load, exits if no target is valid"""
+def report_loaded_targets(loader, source_names):
+    errors = loader.errors
+    # large inventories can have many bad lines, show a few not all of them
+    for error_msg in errors[:MAX_TARGET_WARNINGS]:
+        print(f"Warning: {error_msg}")
+    
+    if not loader.targets:
+        print(f"\nError: No valid targets found in {source_names}")
         if errors:
-            print(f"\nFound {len(errors)} error(s):")
-            for err in errors[:5]:  # show first 5 errors
-                print(f"  - {err}")
+            print(f"\nFound {len(errors)} error(s)")
         sys.exit(1)
     
     if errors:
         print(f"\nWarning: Skipped {len(errors)} invalid target(s)")
+    if loader.duplicates:
+        print(f"Skipped {loader.duplicates} duplicate target(s)")
     
-    return targets
-
-
-"""parse target string into (host, port)"""
-def parse_target(target_str):
-    # handle urls with protocol prefix
-    if target_str.startswith('https://'):
-        host = target_str[8:]  # strip https://
-        default_port = 443
-    elif target_str.startswith('http://'):
-        host = target_str[7:]  # strip http://
-        default_port = 80
-    else:
-        # no protocol, assume https
-        host = target_str
-        default_port = 443
-    
-    # remove trailing slashes and any path components
-    host = host.rstrip('/')
-    if '/' in host:
-        # keep only hostname:port part, drop /path
-        host = host.split('/')[0]
-    
-    # check if port is explicitly specified
-    if ':' in host:
-        parts = host.split(':')
-        if len(parts) != 2:
-            raise ValueError(f"Invalid target format: {target_str}")
-        host, port_str = parts
-        try:
-            port = int(port_str)
-            # valid tcp port range
-            if not (1 <= port <= 65535):
-                raise ValueError(f"Port must be 1-65535: {port}")
-        except ValueError:
-            raise ValueError(f"Invalid port number: {port_str}")
-    else:
-        # no port specified, use default based on protocol
-        port = default_port
-    
-    if not host:
-        raise ValueError(f"Empty hostname in: {target_str}")
-    
-    return host, port
+    print(f"Loaded {len(loader.targets)} target(s) from {source_names}")
 
 
-"""run command - probe multiple targets from file"""
-async def cmd_run(args):
-    # parse and validate targets file
-    targets = parse_targets_file(args.targets)
-    
-    print(f"Loaded {len(targets)} target(s) from {args.targets}")
+"""figure out which slo config to use"""
+def load_slo_config(config_path):
+    from slo import SLOConfig
     
-    # figure out which slo config to use
     slo_config = None
-    if args.config:
+    if config_path:
         # user specified config file explicitly
-        if Path(args.config).exists():
-            slo_config = SLOConfig(args.config)
-            print(f"Loaded SLO config from {args.config}")
+        if Path(config_path).exists():
+            slo_config = SLOConfig(config_path)
+            print(f"Loaded SLO config from {config_path}")
         else:
-            print(f"Warning: Config file not found: {args.config}, using defaults")
+            print(f"Warning: Config file not found: {config_path}, using defaults")
             slo_config = SLOConfig()
     else:
         # no --config flag, try default config.yaml in current dir
@@ -119,18 +77,220 @@ async def cmd_run(args):
             slo_config = SLOConfig()
             print(f"Using default SLO thresholds (p95<=100ms, loss<=5%)")
     
-    # run all probes concurrently
-    results = await run_probes(
-        targets,
+    return slo_config
+
+
+"""targets and slo config, from the --plan-cache plan while none of its input files changed"""
+def load_run_plan(args):
+    # same config file load_slo_config settles on
+    config_path = args.config or ('config.yaml' if Path('config.yaml').exists() else None)
+    plan = PlanCache(args.plan_cache) if args.plan_cache else None
+    
+    if plan is not None:
+        cached = plan.load(args.targets, config_path)
+        if cached is not None:
+            loader, slo_config = cached
+            # bad inventory lines are still reported, the plan kept them from when it was built
+            report_loaded_targets(loader, f"{', '.join(args.targets)} (plan {args.plan_cache})")
+            return loader, slo_config
+    
+    loader = load_targets(args.targets)
+    slo_config = load_slo_config(args.config)
+    if plan is not None:
+        plan.save(args.targets, config_path, loader, slo_config)
+    return loader, slo_config
+
+
+"""reject flag combinations a run cannot honor, exits before any report file is created"""
+def check_run_args(args):
+    if args.agents and args.raw_out:
+        print("Error: --raw-out needs local probes, agents only send back latency summaries")
+        sys.exit(1)
+    if args.per_destination is not None and args.per_destination < 1:
+        print("Error: --per-destination must be at least 1")
+        sys.exit(1)
+    if args.coalesce_tcp and args.mode != 'tcp':
+        print("Error: --coalesce-tcp only applies to --mode tcp, HTTP responses depend on the hostname")
+        sys.exit(1)
+    if args.workers > 1 and (args.per_destination or args.destination_rate or args.coalesce_tcp):
+        # shards split targets that share a destination, so no one process sees all of them
+        print("Error: --per-destination, --destination-rate and --coalesce-tcp need --workers 1")
+        sys.exit(1)
+    if args.exclude_congested and not args.adaptive_concurrency:
+        print("Error: --exclude-congested needs --adaptive-concurrency, nothing flags samples without it")
+        sys.exit(1)
+    if args.adaptive_concurrency and (args.agents or args.workers > 1):
+        # the controller measures this process's event loop, workers and agents run their own
+        print("Error: --adaptive-concurrency needs --workers 1 and local probes")
+        sys.exit(1)
+    if args.events and (args.agents or args.workers > 1):
+        print("Error: --events records probes of this process, it does not work with --workers or --agents")
+        sys.exit(1)
+
+
+"""aimd controller for the run's in-flight limit, its ramp starts at --concurrent"""
+def build_concurrency_controller(args):
+    from concurrency import ConcurrencyController
+    try:
+        return ConcurrencyController(ceiling=args.concurrency_ceiling, lag_budget=args.lag_budget / 1000,
+                                     exclude=args.exclude_congested)
+    except ValueError as e:
+        print(f"Error: {e}")
+        sys.exit(1)
+
+
+"""timeout policy from the cli flags, None keeps the plain fixed timeout"""
+def build_timeout_policy(args):
+    if not args.adaptive_timeout and not args.breaker_failures:
+        return None
+    # a floor above a short --timeout just means the timeout never adapts down
+    return TimeoutPolicy(ceiling=args.timeout, floor=min(args.timeout_floor, args.timeout),
+                         adaptive=args.adaptive_timeout, failures=args.breaker_failures,
+                         cooldown=args.breaker_cooldown)
+
+
+"""capability cache for http runs, backed by --http-cache when given"""
+def load_capability_cache(args):
+    if args.mode != 'http':
+        return None
+    return CapabilityCache(args.http_cache, args.http_cache_ttl)
+
+
+"""run command - probe multiple targets from file"""
+async def cmd_run(args):
+    # numpy backed modules load here rather than at startup so --help and sample stay quick
+    from runner import build_results, run_probes, print_results_table
+    from slo import evaluate_slo_batch
+    from report import (NDJSON_SUFFIXES, ColumnarSampleWriter, NDJSONReportWriter, format_json_summary,
+                        generate_json_report)
+    
+    # every flag check runs before anything is parsed, probed or written
+    check_run_args(args)
+    
+    # parse, validate and dedup targets, or take them ready made from the plan cache
+    loader, slo_config = load_run_plan(args)
+    targets = list(loader.targets.values())
+    
+    adaptive = None
+    if args.adaptive:
+        try:
+            adaptive = AdaptivePolicy(slo_config, args.confidence, args.min_samples, args.max_samples)
+        except ValueError as e:
+            print(f"Error: {e}")
+            sys.exit(1)
+    
+    probe_options = dict(
         num_probes=args.samples,
         timeout=args.timeout,
         interval=args.interval,
         max_concurrent=args.concurrent,
-        mode=args.mode
+        mode=args.mode,
+        pool_size=args.pool_size,
+        connection=args.connection,
+        dns_ttl=args.dns_ttl,
+        include_dns=args.include_dns,
+        rate=args.rate,
+        tcp_engine=args.tcp_engine,
+        adaptive=adaptive,
+        timeouts=build_timeout_policy(args),
+        capabilities=load_capability_cache(args),
+        tls_resume=args.tls_session == 'resume'
     )
+    if args.per_destination or args.destination_rate or args.coalesce_tcp:
+        probe_options.update(destination_limit=args.per_destination, destination_rate=args.destination_rate,
+                             coalesce=args.coalesce_tcp)
+    if args.adaptive_concurrency:
+        probe_options['concurrency'] = build_concurrency_controller(args)
+    
+    # include run configuration in report metadata
+    config_data = {
+        'mode': args.mode,
+        'samples': args.samples,
+        'timeout': args.timeout,
+        'interval': args.interval,
+        'max_concurrent': args.concurrent,
+        'rate': args.rate,
+        'workers': args.workers,
+        'agents': args.agents,
+        'replicas': args.replicas if args.agents else None,
+        'tcp_engine': args.tcp_engine,
+        'per_destination': args.per_destination,
+        'destination_rate': args.destination_rate,
+        'coalesce_tcp': args.coalesce_tcp,
+        'adaptive_concurrency': args.adaptive_concurrency,
+        'concurrency_ceiling': args.concurrency_ceiling if args.adaptive_concurrency else None,
+        'lag_budget_ms': args.lag_budget if args.adaptive_concurrency else None,
+        'exclude_congested': args.exclude_congested,
+        'pool_size': args.pool_size,
+        'connection': args.connection,
+        'tls_session': args.tls_session,
+        'dns_ttl': args.dns_ttl,
+        'include_dns': args.include_dns,
+        'adaptive_timeout': args.adaptive_timeout,
+        'timeout_floor': args.timeout_floor if args.adaptive_timeout else None,
+        'breaker_failures': args.breaker_failures,
+        'breaker_cooldown': args.breaker_cooldown if args.breaker_failures else None,
+        'adaptive': args.adaptive,
+        'confidence': args.confidence if args.adaptive else None,
+        'min_samples': args.min_samples if args.adaptive else None,
+        'max_samples': args.max_samples if args.adaptive else None,
+    }
+    
+    # ndjson reports and raw sample files are written target by target as they finish
+    # agent results arrive already summarized, their ndjson report is written in one go after the run
+    stream_report = args.out is not None and args.out.endswith(NDJSON_SUFFIXES)
+    report_writer = None
+    raw_writer = None
+    
+    # finished targets are written in small batches so stats stay vectorized
+    pending = []
+    
+    def flush_report():
+        results = build_results(pending)
+        report_writer.write_targets(results, evaluate_slo_batch(results, slo_config))
+        pending.clear()
+    
+    def on_target(index, target):
+        if report_writer is not None:
+            pending.append(target)
+            if len(pending) >= REPORT_BATCH:
+                flush_report()
+        if raw_writer is not None:
+            raw_writer.add(index, target)
+    
+    if stream_report and not args.agents:
+        report_writer = NDJSONReportWriter(args.out, config_data)
+    if args.raw_out:
+        raw_writer = ColumnarSampleWriter(args.raw_out)
+    if report_writer is not None or raw_writer is not None:
+        probe_options['on_target'] = on_target
+    
+    # metrics endpoint lives as long as the probes run
+    async with serve_metrics(args.metrics_port, args.metrics_host) as metrics, \
+            open_event_pipeline(path=args.events, metrics=metrics):
+        # run all probes concurrently, optionally sharded across processes
+        if args.agents:
+            from distributed import run_distributed
+            try:
+                results = await run_distributed(targets, args.agents, replicas=args.replicas,
+                                                token=args.agent_token, **probe_options)
+            except ConnectionError as e:
+                print(f"Error: {e}")
+                sys.exit(1)
+        elif args.workers > 1:
+            from sharding import run_probes_sharded
+            results = await run_probes_sharded(targets, workers=args.workers, metrics=metrics, **probe_options)
+        else:
+            results = await run_probes(targets, metrics=metrics, **probe_options)
+        
+        # check each result against slo thresholds
+        slo_evaluations = evaluate_slo_batch(results, slo_config)
+        if metrics is not None:
+            for index, evaluation in enumerate(slo_evaluations):
+                metrics.set_slo(index, evaluation['passed'])
     
-    # check each result against slo thresholds
-    slo_evaluations = [evaluate_slo(r, slo_config) for r in results]
+    if probe_options['capabilities'] is not None:
+        probe_options['capabilities'].save()
     
     # display results in nice table format
     print_results_table(results, slo_evaluations)
@@ -140,19 +300,25 @@ async def cmd_run(args):
     failed = len(slo_evaluations) - passed
     
     print(f"\nSLO Summary: {passed} passed, {failed} failed (out of {len(results)} targets)")
+    if adaptive is not None:
+        print_sampling_summary(results, args.samples)
     
     # optionally save results to json file
-    if args.out:
-        # include run configuration in report metadata
-        config_data = {
-            'mode': args.mode,
-            'samples': args.samples,
-            'timeout': args.timeout,
-            'interval': args.interval,
-            'max_concurrent': args.concurrent,
-        }
-        generate_json_report(results, slo_evaluations, config_data, args.out)
+    if report_writer is not None:
+        flush_report()
+        report_writer.close()
+        format_json_summary(args.out)
+    elif stream_report:
+        with NDJSONReportWriter(args.out, config_data) as writer:
+            writer.write_targets(results, slo_evaluations)
         format_json_summary(args.out)
+    elif args.out:
+        report = generate_json_report(results, slo_evaluations, config_data, args.out)
+        format_json_summary(args.out, report)
+    
+    if raw_writer is not None:
+        raw_writer.close()
+        print(f"Raw samples saved: {args.raw_out}")
     
     # exit code matters for ci/cd pipelines
     # non-zero exit = build failure
@@ -164,13 +330,69 @@ async def cmd_run(args):
         sys.exit(0)  # success exit code
 
 
+"""how many targets settled early under adaptive sampling and the samples it took vs a fixed count"""
+def print_sampling_summary(results, fixed_samples):
+    settled = sum(1 for r in results if (r.get('sampling') or {}).get('verdict') is not None)
+    total = sum(r['samples'] for r in results)
+    print(f"Adaptive sampling: {settled} settled early, {len(results) - settled} hit the sample cap, "
+          f"{total} samples taken ({fixed_samples * len(results)} at a fixed --samples {fixed_samples})")
+
+
+"""watch command - probe targets continuously and report slo state changes"""
+async def cmd_watch(args):
+    from watch import watch_targets, parse_duration
+    
+    # parse window list like 1m,5m,1h into label -> seconds
+    try:
+        windows = {label.strip(): parse_duration(label) for label in args.windows.split(',') if label.strip()}
+    except ValueError as e:
+        print(f"Error: {e}")
+        sys.exit(1)
+    
+    loader = load_targets(args.targets)
+    
+    slo_config = load_slo_config(args.config)
+    
+    capabilities = load_capability_cache(args)
+    
+    try:
+        async with serve_metrics(args.metrics_port, args.metrics_host) as metrics, \
+                open_event_pipeline(path=args.events, metrics=metrics):
+            await watch_targets(
+                list(loader.targets.values()),
+                slo_config,
+                windows,
+                interval=args.interval,
+                timeout=args.timeout,
+                max_concurrent=args.concurrent,
+                mode=args.mode,
+                pool_size=args.pool_size,
+                connection=args.connection,
+                dns_ttl=args.dns_ttl,
+                include_dns=args.include_dns,
+                rate=args.rate,
+                min_samples=args.min_samples,
+                tcp_engine=args.tcp_engine,
+                metrics=metrics,
+                loader=loader,
+                reload_interval=args.reload_interval,
+                timeouts=build_timeout_policy(args),
+                capabilities=capabilities,
+                tls_resume=args.tls_session == 'resume'
+            )
+    finally:
+        # watch only ends on ctrl+c, keep what it learned for the next run
+        if capabilities is not None:
+            capabilities.save()
+
+
 """sample command - quick test of single url"""
 async def cmd_sample(args):
-    from runner import probe_target
+    from runner import probe_target, print_results_table
     
     # validate url format
     try:
-        host, port = parse_target(args.url)
+        host, port, scheme = parse_target(args.url)
     except ValueError as e:
         print(f"Error: {e}")
         sys.exit(1)
@@ -182,12 +404,31 @@ async def cmd_sample(args):
         num_probes=args.samples,
         timeout=args.timeout,
         interval=args.interval,
-        mode=args.mode
+        mode=args.mode,
+        connection=args.connection,
+        include_dns=args.include_dns,
+        tcp_engine=args.tcp_engine,
+        scheme=scheme
     )
     
     print_results_table([result])
 
 
+"""agent command - probe targets for a coordinator and send back latency summaries"""
+async def cmd_agent(args):
+    from distributed import serve_agent
+    
+    host, _, port = args.listen.rpartition(':')
+    if not host or not port.isdigit():
+        print(f"Error: --listen needs host:port, got {args.listen}")
+        sys.exit(1)
+    try:
+        await serve_agent(host.strip('[]'), int(port), args.name, token=args.token)
+    except ValueError as e:
+        print(f"Error: {e}")
+        sys.exit(1)
+
+
 """cli entry point"""
 def main():
     parser = argparse.ArgumentParser(
@@ -198,12 +439,19 @@ def main():
 Examples:
   # Probe targets from file (TCP mode)
   python main.py run --targets urls.txt --samples 10
-
+  
   # Quick test of single URL
   python main.py sample --url google.com --samples 5
-
+  
   # Custom settings
   python main.py run --targets urls.txt --samples 20 --timeout 10 --concurrent 10
+  
+  # Continuous monitoring, print only SLO state changes
+  python main.py watch --targets urls.txt --windows 1m,5m,1h
+  
+  # Probe from two agents, each target from both (agents off loopback need a shared token)
+  python main.py agent --listen 10.0.0.5:7700 --token "$AGENT_TOKEN"
+  python main.py run --targets urls.txt --agents host1:7700 host2:7700 --replicas 2 --agent-token "$AGENT_TOKEN"
         """
     )
     
@@ -215,7 +463,8 @@ Examples:
     run_parser.add_argument(
         '--targets',
         required=True,
-        help='Path to targets file (one target per line)'
+        nargs='+',
+        help='Targets file(s) or directories (one target per line), - reads stdin'
     )
     run_parser.add_argument(
         '--config',
@@ -227,18 +476,70 @@ Examples:
         default='tcp',
         help='Probe mode: tcp (connection time) or http (TTFB). Default: tcp'
     )
+    run_parser.add_argument(
+        '--tcp-engine',
+        choices=['stream', 'socket'],
+        default='stream',
+        help='TCP mode engine: stream (asyncio streams) or socket (bare non-blocking connect, lower overhead). Default: stream'
+    )
     run_parser.add_argument(
         '--samples',
         type=int,
         default=10,
         help='Number of probes per target. Default: 10'
     )
+    run_parser.add_argument(
+        '--adaptive',
+        action='store_true',
+        help='Stop sampling a target once its SLO verdict is settled, borderline targets sample up to --max-samples'
+    )
+    run_parser.add_argument(
+        '--confidence',
+        type=float,
+        default=0.95,
+        help='Confidence a verdict needs before adaptive sampling stops. Default: 0.95'
+    )
+    run_parser.add_argument(
+        '--min-samples',
+        type=int,
+        default=DEFAULT_MIN_SAMPLES,
+        help=f'Adaptive mode: fewest probes per target. Default: {DEFAULT_MIN_SAMPLES}'
+    )
+    run_parser.add_argument(
+        '--max-samples',
+        type=int,
+        default=DEFAULT_MAX_SAMPLES,
+        help=f'Adaptive mode: most probes per target. Default: {DEFAULT_MAX_SAMPLES}'
+    )
     run_parser.add_argument(
         '--timeout',
         type=float,
         default=5.0,
         help='Timeout per probe in seconds. Default: 5.0'
     )
+    run_parser.add_argument(
+        '--adaptive-timeout',
+        action='store_true',
+        help='Per-target timeouts from smoothed latency and variance (like TCP RTO), capped at --timeout'
+    )
+    run_parser.add_argument(
+        '--timeout-floor',
+        type=float,
+        default=1.0,
+        help='Shortest adaptive timeout in seconds. Default: 1.0'
+    )
+    run_parser.add_argument(
+        '--breaker-failures',
+        type=int,
+        default=0,
+        help='Consecutive failures that mark a target down, its samples then fail without probing. Default: 0 (off)'
+    )
+    run_parser.add_argument(
+        '--breaker-cooldown',
+        type=float,
+        default=30.0,
+        help='Seconds between recovery probes of a down target, doubling while it stays down. Default: 30'
+    )
     run_parser.add_argument(
         '--interval',
         type=float,
@@ -249,11 +550,277 @@ Examples:
         '--concurrent',
         type=int,
         default=5,
-        help='Max concurrent targets to probe. Default: 5'
+        help='Max probes in flight across all targets. Default: 5'
+    )
+    run_parser.add_argument(
+        '--rate',
+        type=float,
+        help='Max probes started per second across all targets. Default: unlimited'
+    )
+    run_parser.add_argument(
+        '--adaptive-concurrency',
+        action='store_true',
+        help='Raise probes in flight from --concurrent while event loop lag stays under --lag-budget, back off when not'
+    )
+    run_parser.add_argument(
+        '--concurrency-ceiling',
+        type=int,
+        default=1000,
+        help='Most probes in flight --adaptive-concurrency may reach. Default: 1000'
+    )
+    run_parser.add_argument(
+        '--lag-budget',
+        type=float,
+        default=5.0,
+        help='Event loop lag in ms that samples may pick up before they are flagged as congested. Default: 5'
+    )
+    run_parser.add_argument(
+        '--exclude-congested',
+        action='store_true',
+        help='Leave samples flagged as congested out of the stats instead of only marking them'
+    )
+    run_parser.add_argument(
+        '--per-destination',
+        type=int,
+        help='Max probes in flight to one resolved ip:port, shared by every target behind it. Default: unlimited'
+    )
+    run_parser.add_argument(
+        '--destination-rate',
+        type=float,
+        help='Max probes started per second to one resolved ip:port. Default: unlimited'
+    )
+    run_parser.add_argument(
+        '--coalesce-tcp',
+        action='store_true',
+        help='TCP mode: one connect per ip:port per sample, shared by every hostname that resolves there'
+    )
+    run_parser.add_argument(
+        '--workers',
+        type=int,
+        default=1,
+        help='Worker processes to shard targets across, limits are split between them. Default: 1'
+    )
+    run_parser.add_argument(
+        '--agents',
+        nargs='+',
+        metavar='HOST:PORT',
+        help='Probe from remote agents (started with the agent command) instead of locally'
+    )
+    run_parser.add_argument(
+        '--replicas',
+        type=int,
+        default=1,
+        help='With --agents: number of agents that probe each target. Default: 1'
+    )
+    run_parser.add_argument(
+        '--agent-token',
+        help='With --agents: shared secret of agents started with --token'
+    )
+    run_parser.add_argument(
+        '--pool-size',
+        type=int,
+        default=100,
+        help='Max pooled HTTP connections shared by the whole run. Default: 100'
+    )
+    run_parser.add_argument(
+        '--connection',
+        choices=['cold', 'warm'],
+        default='cold',
+        help='HTTP measurement: cold (new connection per sample) or warm (reused connection). Default: cold'
+    )
+    run_parser.add_argument(
+        '--tls-session',
+        choices=['full', 'resume'],
+        default='full',
+        help='HTTPS handshakes: full every time, or resume each target\'s last TLS session. Default: full'
+    )
+    run_parser.add_argument(
+        '--http-cache',
+        help='File to keep learned HTTP method, scheme, redirect and version per target between runs. Default: off'
+    )
+    run_parser.add_argument(
+        '--http-cache-ttl',
+        type=float,
+        default=DEFAULT_CAPABILITY_TTL,
+        help=f'Seconds a learned HTTP capability is trusted. Default: {DEFAULT_CAPABILITY_TTL:.0f}'
+    )
+    run_parser.add_argument(
+        '--dns-ttl',
+        type=float,
+        default=60.0,
+        help='Seconds to cache DNS answers for the run. Default: 60'
+    )
+    run_parser.add_argument(
+        '--include-dns',
+        action='store_true',
+        help='Count DNS resolution time in the measured latency'
+    )
+    run_parser.add_argument(
+        '--metrics-port',
+        type=int,
+        help='Serve Prometheus/OpenMetrics metrics on this local port while probing. Default: off'
+    )
+    run_parser.add_argument(
+        '--metrics-host',
+        default='127.0.0.1',
+        help='Address the metrics endpoint binds to. Default: 127.0.0.1'
     )
     run_parser.add_argument(
         '--out',
-        help='Output JSON report file path (e.g., report.json)'
+        help='Output JSON report file path (e.g., report.json), .ndjson/.jsonl streams one line per target'
+    )
+    run_parser.add_argument(
+        '--raw-out',
+        help='Save every raw sample as NumPy columns in an .npz file (e.g., samples.npz)'
+    )
+    run_parser.add_argument(
+        '--plan-cache',
+        help='Cache parsed targets and SLO config in this file, reused while the input files are unchanged'
+    )
+    run_parser.add_argument(
+        '--events',
+        help='Append probe events (target starts, errors, timeouts) to an NDJSON file'
+    )
+    
+    # watch command
+    watch_parser = subparsers.add_parser('watch', help='Probe targets continuously and report SLO state changes')
+    watch_parser.add_argument(
+        '--targets',
+        required=True,
+        nargs='+',
+        help='Targets file(s) or directories (one target per line), - reads stdin'
+    )
+    watch_parser.add_argument(
+        '--config',
+        help='Path to config.yaml with SLO thresholds (default: config.yaml if exists)'
+    )
+    watch_parser.add_argument(
+        '--mode',
+        choices=['tcp', 'http'],
+        default='tcp',
+        help='Probe mode: tcp (connection time) or http (TTFB). Default: tcp'
+    )
+    watch_parser.add_argument(
+        '--tcp-engine',
+        choices=['stream', 'socket'],
+        default='stream',
+        help='TCP mode engine: stream (asyncio streams) or socket (bare non-blocking connect, lower overhead). Default: stream'
+    )
+    watch_parser.add_argument(
+        '--windows',
+        default='1m,5m,1h',
+        help='Comma separated sliding windows to evaluate SLOs over. Default: 1m,5m,1h'
+    )
+    watch_parser.add_argument(
+        '--reload-interval',
+        type=float,
+        default=10.0,
+        help='Seconds between checks of the targets files for changes, 0 disables. Default: 10'
+    )
+    watch_parser.add_argument(
+        '--min-samples',
+        type=int,
+        default=5,
+        help='Samples a window needs before it is evaluated. Default: 5'
+    )
+    watch_parser.add_argument(
+        '--timeout',
+        type=float,
+        default=5.0,
+        help='Timeout per probe in seconds. Default: 5.0'
+    )
+    watch_parser.add_argument(
+        '--adaptive-timeout',
+        action='store_true',
+        help='Per-target timeouts from smoothed latency and variance (like TCP RTO), capped at --timeout'
+    )
+    watch_parser.add_argument(
+        '--timeout-floor',
+        type=float,
+        default=1.0,
+        help='Shortest adaptive timeout in seconds. Default: 1.0'
+    )
+    watch_parser.add_argument(
+        '--breaker-failures',
+        type=int,
+        default=0,
+        help='Consecutive failures that mark a target down, its samples then fail without probing. Default: 0 (off)'
+    )
+    watch_parser.add_argument(
+        '--breaker-cooldown',
+        type=float,
+        default=30.0,
+        help='Seconds between recovery probes of a down target, doubling while it stays down. Default: 30'
+    )
+    watch_parser.add_argument(
+        '--interval',
+        type=float,
+        default=1.0,
+        help='Delay between probes of the same target in seconds. Default: 1.0'
+    )
+    watch_parser.add_argument(
+        '--concurrent',
+        type=int,
+        default=5,
+        help='Max probes in flight across all targets. Default: 5'
+    )
+    watch_parser.add_argument(
+        '--rate',
+        type=float,
+        help='Max probes started per second across all targets. Default: unlimited'
+    )
+    watch_parser.add_argument(
+        '--pool-size',
+        type=int,
+        default=100,
+        help='Max pooled HTTP connections shared by the whole run. Default: 100'
+    )
+    watch_parser.add_argument(
+        '--connection',
+        choices=['cold', 'warm'],
+        default='cold',
+        help='HTTP measurement: cold (new connection per sample) or warm (reused connection). Default: cold'
+    )
+    watch_parser.add_argument(
+        '--tls-session',
+        choices=['full', 'resume'],
+        default='full',
+        help='HTTPS handshakes: full every time, or resume each target\'s last TLS session. Default: full'
+    )
+    watch_parser.add_argument(
+        '--http-cache',
+        help='File to keep learned HTTP method, scheme, redirect and version per target between runs. Default: off'
+    )
+    watch_parser.add_argument(
+        '--http-cache-ttl',
+        type=float,
+        default=DEFAULT_CAPABILITY_TTL,
+        help=f'Seconds a learned HTTP capability is trusted. Default: {DEFAULT_CAPABILITY_TTL:.0f}'
+    )
+    watch_parser.add_argument(
+        '--dns-ttl',
+        type=float,
+        default=60.0,
+        help='Seconds to cache DNS answers. Default: 60'
+    )
+    watch_parser.add_argument(
+        '--include-dns',
+        action='store_true',
+        help='Count DNS resolution time in the measured latency'
+    )
+    watch_parser.add_argument(
+        '--metrics-port',
+        type=int,
+        help='Serve Prometheus/OpenMetrics metrics on this local port while probing. Default: off'
+    )
+    watch_parser.add_argument(
+        '--metrics-host',
+        default='127.0.0.1',
+        help='Address the metrics endpoint binds to. Default: 127.0.0.1'
+    )
+    watch_parser.add_argument(
+        '--events',
+        help='Append probe events (target starts, errors, timeouts) to an NDJSON file'
     )
     
     # sample command
@@ -269,6 +836,12 @@ Examples:
         default='tcp',
         help='Probe mode: tcp (connection time) or http (TTFB). Default: tcp'
     )
+    sample_parser.add_argument(
+        '--tcp-engine',
+        choices=['stream', 'socket'],
+        default='stream',
+        help='TCP mode engine: stream (asyncio streams) or socket (bare non-blocking connect, lower overhead). Default: stream'
+    )
     sample_parser.add_argument(
         '--samples',
         type=int,
@@ -287,14 +860,51 @@ Examples:
         default=0.5,
         help='Delay between probes in seconds. Default: 0.5'
     )
+    sample_parser.add_argument(
+        '--connection',
+        choices=['cold', 'warm'],
+        default='cold',
+        help='HTTP measurement: cold (new connection per sample) or warm (reused connection). Default: cold'
+    )
+    sample_parser.add_argument(
+        '--include-dns',
+        action='store_true',
+        help='Count DNS resolution time in the measured latency'
+    )
+    
+    # agent command
+    agent_parser = subparsers.add_parser('agent', help='Probe targets sent by a run --agents coordinator')
+    agent_parser.add_argument(
+        '--listen',
+        default='127.0.0.1:7700',
+        help='Address to accept coordinator connections on. Default: 127.0.0.1:7700'
+    )
+    agent_parser.add_argument(
+        '--name',
+        help='Agent name in per-agent results. Default: hostname'
+    )
+    agent_parser.add_argument(
+        '--token',
+        help='Shared secret a coordinator must prove it holds before sending jobs. Required unless --listen is loopback'
+    )
     
     args = parser.parse_args()
     
     # route to command handler
     if args.command == 'run':
         asyncio.run(cmd_run(args))
+    elif args.command == 'watch':
+        try:
+            asyncio.run(cmd_watch(args))
+        except KeyboardInterrupt:
+            print("\nStopped watching.")
     elif args.command == 'sample':
         asyncio.run(cmd_sample(args))
+    elif args.command == 'agent':
+        try:
+            asyncio.run(cmd_agent(args))
+        except KeyboardInterrupt:
+            print("\nAgent stopped.")
 
 
 if __name__ == '__main__':
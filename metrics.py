@@ -0,0 +1,279 @@
+"""prometheus / openmetrics exporter for probe results and probe engine health"""
+import asyncio
+import bisect
+from contextlib import asynccontextmanager
+
+
+# histogram bucket upper bounds in seconds, prometheus convention
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# how often the monitor task measures loop lag and probe rate
+MONITOR_INTERVAL = 1.0
+
+PROMETHEUS_CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+OPENMETRICS_CONTENT_TYPE = 'application/openmetrics-text; version=1.0.0; charset=utf-8'
+
+
+"""running histogram, loss and slo state for one target, updated per sample"""
+class TargetMetrics:
+    
+    def __init__(self, host, port):
+        # label string built once so scrapes only join precomputed text
+        self.labels = f'target="{_escape(f"{host}:{port}")}"'
+        self.buckets = [0] * (len(LATENCY_BUCKETS) + 1)  # per bucket, last one is +Inf
+        self.latency_sum = 0.0  # seconds
+        self.successes = 0
+        self.failures = 0
+        self.slo = {}  # window label (None for a whole run) -> passed
+    
+    """record one sample, latency in ms or None for a failed probe"""
+    def observe(self, latency_ms):
+        if latency_ms is None:
+            self.failures += 1
+            return
+        seconds = latency_ms / 1000
+        self.buckets[bisect.bisect_left(LATENCY_BUCKETS, seconds)] += 1
+        self.latency_sum += seconds
+        self.successes += 1
+
+
+"""pre-aggregated metric state shared by the runner and the metrics server"""
+class ProbeMetrics:
+    
+    def __init__(self):
+        self.targets = {}  # job key -> TargetMetrics
+        
+        # engine parts read at scrape time, attached once the run has built them
+        self.scheduler = None
+        self.resolver = None
+        self.client = None
+        
+        # updated by the monitor task
+        self.probes = 0
+        self.loop_lag = 0.0
+        self.probes_per_sec = 0.0
+        
+        # updated by the event pipeline
+        self.errors = {}  # exception class -> failed probes
+    
+    """register a target before its first sample"""
+    def add_target(self, key, host, port):
+        if key not in self.targets:
+            self.targets[key] = TargetMetrics(host, port)
+    
+    """drop a target's series, e.g. after it was removed from the targets file"""
+    def remove_target(self, key):
+        self.targets.pop(key, None)
+    
+    """point the engine gauges at the scheduler, dns cache and http client of a run"""
+    def attach(self, scheduler=None, resolver=None, client=None):
+        if scheduler is not None:
+            self.scheduler = scheduler
+        if resolver is not None:
+            self.resolver = resolver
+        if client is not None:
+            self.client = client
+    
+    """record one sample of a registered target"""
+    def observe(self, key, latency_ms):
+        self.probes += 1
+        target = self.targets.get(key)
+        # a sample still in flight when its target was removed has nowhere to go
+        if target is not None:
+            target.observe(latency_ms)
+    
+    """count one failed probe by its exception class"""
+    def count_error(self, error):
+        self.errors[error] = self.errors.get(error, 0) + 1
+    
+    """record the latest slo verdict of a target, window None means the whole run"""
+    def set_slo(self, key, passed, window=None):
+        target = self.targets.get(key)
+        if target is not None:
+            target.slo[window] = passed
+    
+    """render everything in prometheus text format, or openmetrics when asked"""
+    def render(self, openmetrics=False):
+        lines = []
+        
+        def family(name, kind, help_text):
+            # openmetrics names the counter family without the _total suffix
+            if openmetrics and kind == 'counter':
+                name = name[:-len('_total')]
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {kind}")
+        
+        bounds = [_format_value(bound) for bound in LATENCY_BUCKETS] + ['+Inf']
+        
+        family('quickprobe_probe_latency_seconds', 'histogram', 'Latency of successful probes.')
+        for target in self.targets.values():
+            cumulative = 0
+            for bound, count in zip(bounds, target.buckets):
+                cumulative += count
+                lines.append(f'quickprobe_probe_latency_seconds_bucket{{{target.labels},le="{bound}"}} {cumulative}')
+            lines.append(f'quickprobe_probe_latency_seconds_sum{{{target.labels}}} {_format_value(target.latency_sum)}')
+            lines.append(f'quickprobe_probe_latency_seconds_count{{{target.labels}}} {target.successes}')
+        
+        family('quickprobe_probe_failures_total', 'counter', 'Probes that timed out or errored.')
+        for target in self.targets.values():
+            lines.append(f'quickprobe_probe_failures_total{{{target.labels}}} {target.failures}')
+        
+        family('quickprobe_loss_ratio', 'gauge', 'Failed probes over all probes so far, 0-1.')
+        for target in self.targets.values():
+            attempts = target.successes + target.failures
+            loss = target.failures / attempts if attempts else 0.0
+            lines.append(f'quickprobe_loss_ratio{{{target.labels}}} {_format_value(loss)}')
+        
+        family('quickprobe_slo_passed', 'gauge', '1 if the target meets its SLO, 0 if not.')
+        for target in self.targets.values():
+            for window, passed in target.slo.items():
+                labels = target.labels if window is None else f'{target.labels},window="{_escape(window)}"'
+                lines.append(f'quickprobe_slo_passed{{{labels}}} {int(passed)}')
+        
+        self._render_engine(lines, family)
+        
+        if openmetrics:
+            lines.append('# EOF')
+        return '\n'.join(lines) + '\n'
+    
+    """engine health gauges, all O(1) reads of counters the engine keeps anyway"""
+    def _render_engine(self, lines, family):
+        family('quickprobe_probes_total', 'counter', 'Probes completed by this process.')
+        lines.append(f'quickprobe_probes_total {self.probes}')
+        
+        family('quickprobe_probes_per_second', 'gauge', 'Probes completed per second over the last interval.')
+        lines.append(f'quickprobe_probes_per_second {_format_value(self.probes_per_sec)}')
+        
+        family('quickprobe_event_loop_lag_seconds', 'gauge', 'How late the event loop ran a timer.')
+        lines.append(f'quickprobe_event_loop_lag_seconds {_format_value(self.loop_lag)}')
+        
+        if self.errors:
+            family('quickprobe_probe_errors_total', 'counter', 'Failed probes by error class.')
+            for error, count in self.errors.items():
+                lines.append(f'quickprobe_probe_errors_total{{error="{_escape(error)}"}} {count}')
+        
+        if self.scheduler is not None:
+            family('quickprobe_probes_in_flight', 'gauge', 'Probes currently running.')
+            lines.append(f'quickprobe_probes_in_flight {self.scheduler.in_flight}')
+            family('quickprobe_probes_in_flight_limit', 'gauge', 'Current cap on probes in flight.')
+            lines.append(f'quickprobe_probes_in_flight_limit {self.scheduler.max_in_flight}')
+            family('quickprobe_scheduler_queue_depth', 'gauge', 'Samples waiting for their due time.')
+            lines.append(f'quickprobe_scheduler_queue_depth {self.scheduler.queue_depth()}')
+        
+        if self.resolver is not None:
+            stats = self.resolver.stats()
+            family('quickprobe_dns_cache_lookups_total', 'counter', 'DNS cache lookups by outcome.')
+            for outcome in ('hits', 'stale_hits', 'misses', 'errors'):
+                lines.append(f'quickprobe_dns_cache_lookups_total{{outcome="{outcome}"}} {stats[outcome]}')
+            if stats['hit_rate'] is not None:
+                family('quickprobe_dns_cache_hit_ratio', 'gauge', 'Share of DNS lookups answered from cache.')
+                lines.append(f'quickprobe_dns_cache_hit_ratio {_format_value(stats["hit_rate"])}')
+        
+        if self.client is not None:
+            stats = self.client.pool_stats()
+            family('quickprobe_http_connections_total', 'counter', 'HTTP requests by pooled connection use.')
+            lines.append(f'quickprobe_http_connections_total{{outcome="reused"}} {stats["hits"]}')
+            lines.append(f'quickprobe_http_connections_total{{outcome="new"}} {stats["misses"]}')
+            if stats['hit_rate'] is not None:
+                family('quickprobe_http_pool_hit_ratio', 'gauge', 'Share of HTTP requests on a reused connection.')
+                lines.append(f'quickprobe_http_pool_hit_ratio {_format_value(stats["hit_rate"])}')
+
+
+"""local http endpoint serving ProbeMetrics, plus the loop lag and probe rate monitor"""
+class MetricsServer:
+    
+    def __init__(self, metrics, host='127.0.0.1', port=9108):
+        self.metrics = metrics
+        self.host = host
+        self.port = port
+        self._server = None
+        self._monitor = None
+    
+    """start listening and monitoring, port 0 picks a free port"""
+    async def start(self):
+        self._server = await asyncio.start_server(self._handle, self.host, self.port)
+        self.port = self._server.sockets[0].getsockname()[1]
+        self._monitor = asyncio.ensure_future(self._monitor_loop())
+        return self
+    
+    async def close(self):
+        if self._monitor is not None:
+            self._monitor.cancel()
+            await asyncio.gather(self._monitor, return_exceptions=True)
+            self._monitor = None
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+            self._server = None
+    
+    async def __aenter__(self):
+        return await self.start()
+    
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.close()
+    
+    """a timer that fires late means probes are waiting on the loop too"""
+    async def _monitor_loop(self):
+        loop = asyncio.get_running_loop()
+        last_probes = self.metrics.probes
+        while True:
+            started = loop.time()
+            await asyncio.sleep(MONITOR_INTERVAL)
+            elapsed = loop.time() - started
+            
+            self.metrics.loop_lag = max(0.0, elapsed - MONITOR_INTERVAL)
+            self.metrics.probes_per_sec = (self.metrics.probes - last_probes) / elapsed
+            last_probes = self.metrics.probes
+    
+    """answer GET /metrics, anything else is a 404"""
+    async def _handle(self, reader, writer):
+        try:
+            head = await asyncio.wait_for(reader.readuntil(b'\r\n\r\n'), timeout=5.0)
+            request_line, _, headers = head.decode('latin-1').partition('\r\n')
+            parts = request_line.split(' ')
+            
+            if len(parts) >= 2 and parts[0] == 'GET' and parts[1].split('?')[0] == '/metrics':
+                # prometheus asks for openmetrics in its accept header when it wants it
+                openmetrics = 'application/openmetrics-text' in headers.lower()
+                body = self.metrics.render(openmetrics).encode('utf-8')
+                content_type = OPENMETRICS_CONTENT_TYPE if openmetrics else PROMETHEUS_CONTENT_TYPE
+                status = '200 OK'
+            else:
+                body = b'Not Found\n'
+                content_type = 'text/plain; charset=utf-8'
+                status = '404 Not Found'
+            
+            writer.write(
+                f"HTTP/1.1 {status}\r\nContent-Type: {content_type}\r\n"
+                f"Content-Length: {len(body)}\r\nConnection: close\r\n\r\n".encode('latin-1') + body
+            )
+            await writer.drain()
+        except (asyncio.TimeoutError, asyncio.IncompleteReadError, asyncio.LimitOverrunError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+
+"""serve a fresh ProbeMetrics for the duration of the block, yields None when port is not set"""
+@asynccontextmanager
+async def serve_metrics(port, host='127.0.0.1'):
+    if not port:
+        yield None
+        return
+    
+    metrics = ProbeMetrics()
+    async with MetricsServer(metrics, host, port) as server:
+        print(f"Serving metrics on http://{host}:{server.port}/metrics")
+        yield metrics
+
+
+"""escape a label value for the text format"""
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+"""shortest float text that round trips, integers without a trailing .0"""
+def _format_value(value):
+    if value == int(value):
+        return str(int(value))
+    return repr(float(value))
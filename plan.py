@@ -0,0 +1,94 @@
+"""compiled run plan: parsed targets and resolved slo config cached between runs"""
+import hashlib
+import os
+import pickle
+from pathlib import Path
+from targets import expand_source
+
+
+# bump when TargetLoader or SLOConfig change shape, older plans are then rebuilt
+PLAN_VERSION = 1
+
+
+"""what a plan was built from: target sources, config path and a stamp per file behind them"""
+def plan_inputs(sources, config_path):
+    # stdin cannot be fingerprinted, runs reading it always parse
+    if '-' in sources:
+        return None
+    files = [str(path) for source in sources for path in expand_source(source)]
+    if config_path is not None and Path(config_path).exists():
+        files.append(str(config_path))
+    return {path: _stamp(path) for path in files}
+
+
+def _stamp(path):
+    stat = os.stat(path)
+    return stat.st_mtime_ns, stat.st_size
+
+
+def _digest(path):
+    with open(path, 'rb') as f:
+        return hashlib.sha256(f.read()).hexdigest()
+
+
+"""pickled plan file, valid while every input file has the same stamp or at least the same content"""
+class PlanCache:
+    
+    def __init__(self, path):
+        self.path = Path(path)
+    
+    """(loader, slo_config) from the plan, None when missing, stale or built from other inputs"""
+    def load(self, sources, config_path):
+        try:
+            inputs = plan_inputs(sources, config_path)
+        except FileNotFoundError:
+            return None
+        if inputs is None or not self.path.exists():
+            return None
+        
+        try:
+            with self.path.open('rb') as f:
+                plan = pickle.load(f)
+        except (OSError, pickle.UnpicklingError, EOFError, AttributeError, ImportError) as e:
+            # a broken plan only costs a parse, never the run
+            print(f"Warning: Ignoring run plan {self.path} - {e}")
+            return None
+        
+        if plan.get('version') != PLAN_VERSION or plan['sources'] != list(sources) \
+                or plan['config_path'] != config_path or set(plan['files']) != set(inputs):
+            return None
+        
+        # a touched file with the same content (e.g. a fresh ci checkout) keeps the plan
+        touched = [path for path, stamp in inputs.items() if plan['files'][path][0] != stamp]
+        for path in touched:
+            if _digest(path) != plan['files'][path][1]:
+                return None
+        if touched:
+            self._write(plan, inputs)
+        return plan['loader'], plan['slo_config']
+    
+    """compile a plan from a freshly parsed loader and slo config"""
+    def save(self, sources, config_path, loader, slo_config):
+        inputs = plan_inputs(sources, config_path)
+        if inputs is None:
+            return
+        # resolve every target's thresholds now so the next run skips the rule lookups too
+        for host, port, *_ in loader.targets.values():
+            slo_config.get_slo(host, port)
+        plan = {
+            'version': PLAN_VERSION,
+            'sources': list(sources),
+            'config_path': config_path,
+            'files': {path: (stamp, _digest(path)) for path, stamp in inputs.items()},
+            'loader': loader,
+            'slo_config': slo_config,
+        }
+        self._write(plan, inputs)
+    
+    def _write(self, plan, inputs):
+        plan['files'] = {path: (stamp, plan['files'][path][1]) for path, stamp in inputs.items()}
+        # write then rename so a crash never leaves half a file behind
+        tmp_path = self.path.with_name(self.path.name + '.tmp')
+        with tmp_path.open('wb') as f:
+            pickle.dump(plan, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, self.path)
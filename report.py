@@ -1,19 +1,22 @@
 """json report generation"""
 import json
+import os
+import zipfile
+from array import array
 from datetime import datetime
 from pathlib import Path
+import numpy as np
+
+
+# file extensions written as one json record per line
+NDJSON_SUFFIXES = ('.ndjson', '.jsonl')
 
 
 """generate json report from probe results"""
 def generate_json_report(results, slo_evaluations, config, output_path):
     # structured report with metadata, summary, and detailed results
     report = {
-        'metadata': {
-            'timestamp': datetime.utcnow().isoformat() + 'Z',  # iso 8601 format
-            'tool': 'PingSLO',
-            'version': '0.1.0',
-            'config': config,  # probe settings used
-        },
+        'metadata': _report_metadata(config),
         'summary': {
             'total_targets': len(results),
             'slo_passed': sum(1 for e in slo_evaluations if e['passed']),
@@ -24,19 +27,7 @@ def generate_json_report(results, slo_evaluations, config, output_path):
     
     # iterate through results and evaluations together
     for result, slo_eval in zip(results, slo_evaluations):
-        target_data = {
-            'host': result['host'],
-            'port': result['port'],
-            'target': f"{result['host']}:{result['port']}",
-            'statistics': result['stats'],  # avg, p95, p99, etc
-            'loss_pct': result['loss_pct'],
-            'slo': {
-                'passed': slo_eval['passed'],
-                'thresholds': slo_eval['thresholds'],
-                'failures': slo_eval['failures'],  # reasons for failure if any
-            }
-        }
-        report['targets'].append(target_data)
+        report['targets'].append(_target_record(result, slo_eval))
     
     # write json with nice indentation for readability
     output_path = Path(output_path)
@@ -46,13 +37,214 @@ def generate_json_report(results, slo_evaluations, config, output_path):
     return report
 
 
+def _report_metadata(config):
+    return {
+        'timestamp': datetime.utcnow().isoformat() + 'Z',  # iso 8601 format
+        'tool': 'PingSLO',
+        'version': '0.1.0',
+        'config': config,  # probe settings used
+    }
+
+
+"""one target's entry in the report"""
+def _target_record(result, slo_eval):
+    return {
+        'host': result['host'],
+        'port': result['port'],
+        'target': f"{result['host']}:{result['port']}",
+        'statistics': result['stats'],  # avg, p95, p99, etc
+        'phases': result.get('phases', {}),  # same stats per dns/connect/tls/ttfb phase
+        'loss_pct': result['loss_pct'],
+        'samples': result.get('samples'),
+        'short_circuited': result.get('short_circuited', 0),  # lost samples not probed while the target was down
+        'congested_samples': result.get('congested_samples', 0),  # measured while the event loop lagged
+        'http_capability': result.get('http_capability'),  # learned method/url/version, cache hit or discovered
+        'sampling': result.get('sampling'),  # adaptive sample bounds, confidence and verdict, None if fixed
+        'agents': result.get('agents'),  # per-agent stats, loss and samples when probed by agents, else None
+        'slo': {
+            'passed': slo_eval['passed'],
+            'thresholds': slo_eval['thresholds'],
+            'failures': slo_eval['failures'],  # reasons for failure if any
+        }
+    }
+
+
+"""streaming report: a header line, one line per target as it finishes, then a footer summary"""
+class NDJSONReportWriter:
+    
+    def __init__(self, output_path, config):
+        self.output_path = Path(output_path)
+        self.passed = 0
+        self.failed = 0
+        self._file = self.output_path.open('w')
+        self._write({'type': 'header', 'metadata': _report_metadata(config)})
+    
+    """write one target record straight to disk, nothing is kept in memory"""
+    def write_target(self, result, slo_eval):
+        if slo_eval['passed']:
+            self.passed += 1
+        else:
+            self.failed += 1
+        self._write({'type': 'target', **_target_record(result, slo_eval)})
+    
+    """write a batch of finished targets"""
+    def write_targets(self, results, slo_evaluations):
+        for result, slo_eval in zip(results, slo_evaluations):
+            self.write_target(result, slo_eval)
+    
+    """write the footer summary and close the file"""
+    def close(self):
+        if self._file is None:
+            return
+        self._write({'type': 'footer', 'summary': {
+            'total_targets': self.passed + self.failed,
+            'slo_passed': self.passed,
+            'slo_failed': self.failed,
+        }})
+        self._file.close()
+        self._file = None
+    
+    def _write(self, record):
+        self._file.write(json.dumps(record, separators=(',', ':')))
+        self._file.write('\n')
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+
+"""read metadata and summary of a report, ndjson reads only its first and last line"""
+def read_report_summary(report_path):
+    if not str(report_path).endswith(NDJSON_SUFFIXES):
+        with open(report_path, 'r') as f:
+            report = json.load(f)
+        return report['metadata'], report['summary']
+    
+    with open(report_path, 'rb') as f:
+        header = json.loads(f.readline())
+        
+        # walk back from the end until we have the whole footer line
+        f.seek(0, os.SEEK_END)
+        size = f.tell()
+        chunk = 4096
+        while True:
+            start = max(0, size - chunk)
+            f.seek(start)
+            tail = f.read(size - start).rstrip(b'\n')
+            if b'\n' in tail or start == 0:
+                break
+            chunk *= 2
+        footer = json.loads(tail.rsplit(b'\n', 1)[-1])
+    
+    if footer.get('type') != 'footer':
+        raise ValueError(f"Report has no footer, the run may not have finished: {report_path}")
+    return header['metadata'], footer['summary']
+
+
 """print summary of json report file"""
-def format_json_summary(report_path):
-    with open(report_path, 'r') as f:
-        report = json.load(f)
+def format_json_summary(report_path, report=None):
+    # summary of a report we just wrote doesnt need the file read back
+    if report is not None:
+        metadata, summary = report['metadata'], report['summary']
+    else:
+        metadata, summary = read_report_summary(report_path)
     
     print(f"\nReport saved: {report_path}")
-    print(f"   Timestamp: {report['metadata']['timestamp']}")
-    print(f"   Total targets: {report['summary']['total_targets']}")
-    print(f"   SLO passed: {report['summary']['slo_passed']}")
-    print(f"   SLO failed: {report['summary']['slo_failed']}")
+    print(f"   Timestamp: {metadata['timestamp']}")
+    print(f"   Total targets: {summary['total_targets']}")
+    print(f"   SLO passed: {summary['slo_passed']}")
+    print(f"   SLO failed: {summary['slo_failed']}")
+
+
+"""raw samples of every target as ragged numpy columns, saved as an uncompressed .npz"""
+class ColumnarSampleWriter:
+    
+    def __init__(self, output_path):
+        self.output_path = output_path
+        # compact typed buffers, 8 bytes a sample instead of a python float each
+        self.index = array('q')
+        self.hosts = []
+        self.ports = array('i')
+        self.failures = array('q')
+        self.latencies = array('d')
+        self.offsets = array('q', [0])  # target i owns latencies[offsets[i]:offsets[i + 1]]
+        self.phases = {}  # phase name -> (values, offsets)
+        # every sample including failures, target i owns sent_at[sample_offsets[i]:sample_offsets[i + 1]]
+        self.sent_at = array('d')
+        self.outcomes = array('b')
+        self.sample_offsets = array('q', [0])
+    
+    """append a finished target, index is its position in the targets list"""
+    def add(self, index, target):
+        self.index.append(index)
+        self.hosts.append(target.host)
+        self.ports.append(target.port)
+        self.failures.append(target.failures)
+        self.latencies.extend(target.latencies)
+        self.offsets.append(len(self.latencies))
+        self.sent_at.extend(target.sent_at)
+        self.outcomes.extend(target.outcomes)
+        self.sample_offsets.append(len(self.sent_at))
+        
+        for phase in target.phase_latencies:
+            if phase not in self.phases:
+                # targets before the first one with this phase get empty segments
+                self.phases[phase] = (array('d'), array('q', [0] * len(self.index)))
+        for phase, (values, offsets) in self.phases.items():
+            values.extend(target.phase_latencies.get(phase, ()))
+            offsets.append(len(values))
+    
+    """write the .npz, members are stored uncompressed so load_raw_samples can memory-map them"""
+    def close(self):
+        columns = {
+            'index': np.frombuffer(self.index, dtype=np.int64),
+            'host': np.array(self.hosts, dtype=str),
+            'port': np.frombuffer(self.ports, dtype=np.int32),
+            'failures': np.frombuffer(self.failures, dtype=np.int64),
+            'latency_ms': np.frombuffer(self.latencies, dtype=np.float64),
+            'offsets': np.frombuffer(self.offsets, dtype=np.int64),
+            'sent_at': np.frombuffer(self.sent_at, dtype=np.float64),
+            'outcome': np.frombuffer(self.outcomes, dtype=np.int8),
+            'sample_offsets': np.frombuffer(self.sample_offsets, dtype=np.int64),
+        }
+        for phase, (values, offsets) in self.phases.items():
+            columns[f'phase_{phase}_ms'] = np.frombuffer(values, dtype=np.float64)
+            columns[f'phase_{phase}_offsets'] = np.frombuffer(offsets, dtype=np.int64)
+        
+        np.savez(self.output_path, **columns)
+
+
+"""load a raw samples .npz as a dict of arrays, memory-mapped read-only by default"""
+def load_raw_samples(path, mmap=True):
+    if not mmap:
+        with np.load(path) as data:
+            return {name: data[name] for name in data.files}
+    
+    # np.load ignores mmap_mode for .npz, so map each stored member by its offset instead
+    columns = {}
+    with open(path, 'rb') as f, zipfile.ZipFile(f) as archive:
+        for info in archive.infolist():
+            if info.compress_type != zipfile.ZIP_STORED:
+                raise ValueError(f"Cannot memory-map compressed member {info.filename}")
+            
+            # local file header is 30 bytes plus name and extra field
+            f.seek(info.header_offset + 26)
+            name_length, extra_length = np.frombuffer(f.read(4), dtype='<u2')
+            f.seek(info.header_offset + 30 + int(name_length) + int(extra_length))
+            
+            version = np.lib.format.read_magic(f)
+            if version == (1, 0):
+                shape, fortran_order, dtype = np.lib.format.read_array_header_1_0(f)
+            else:
+                shape, fortran_order, dtype = np.lib.format.read_array_header_2_0(f)
+            
+            name = info.filename[:-len('.npy')]
+            if 0 in shape:
+                # mmap cant map zero bytes
+                columns[name] = np.empty(shape, dtype=dtype)
+                continue
+            columns[name] = np.memmap(path, dtype=dtype, mode='r', offset=f.tell(), shape=shape,
+                                      order='F' if fortran_order else 'C')
+    return columns
@@ -0,0 +1,105 @@
+"""caching async dns resolver shared by all probes"""
+import asyncio
+import socket
+import time
+
+
+"""dns cache with ttl, in-flight dedup and stale-while-revalidate"""
+class DNSCache:
+    
+    """ttl and stale window in seconds, getaddrinfo doesnt expose record ttls so ttl is fixed"""
+    def __init__(self, ttl=60.0, stale_ttl=300.0):
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl  # how long past expiry a stale answer may still be served
+        
+        self._entries = {}     # (host, port, family) -> (addr_infos, expires_at)
+        self._inflight = {}    # (host, port, family) -> lookup task
+        self._refreshing = set()  # background refresh tasks, kept so they dont get gc'd
+        
+        # counters so callers can see how much resolver traffic we saved
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+        self.errors = 0
+    
+    """resolve host to getaddrinfo tuples, from cache when possible"""
+    async def resolve(self, host, port, family=socket.AF_UNSPEC):
+        key = (host, port, family)
+        entry = self._entries.get(key)
+        
+        if entry is not None:
+            addr_infos, expires_at = entry
+            now = time.monotonic()
+            
+            if now < expires_at:
+                self.hits += 1
+                return addr_infos
+            
+            # expired but still usable, answer now and refresh behind the scenes
+            if now < expires_at + self.stale_ttl:
+                self.stale_hits += 1
+                self._refresh_in_background(key)
+                return addr_infos
+        
+        self.misses += 1
+        return await self._lookup(key)
+    
+    """run one lookup per key no matter how many probes ask at the same time"""
+    async def _lookup(self, key):
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(self._do_lookup(key))
+            self._inflight[key] = task
+            task.add_done_callback(lambda t: self._inflight.pop(key, None))
+        
+        # shield so one probe timing out doesnt cancel the lookup for everyone
+        return await asyncio.shield(task)
+    
+    """actual getaddrinfo call, stores the answer on success"""
+    async def _do_lookup(self, key):
+        host, port, family = key
+        loop = asyncio.get_running_loop()
+        
+        try:
+            addr_infos = await loop.getaddrinfo(host, port, family=family, type=socket.SOCK_STREAM)
+        except OSError:
+            self.errors += 1
+            raise
+        
+        self._entries[key] = (addr_infos, time.monotonic() + self.ttl)
+        return addr_infos
+    
+    """start a refresh for a stale entry unless one is already running"""
+    def _refresh_in_background(self, key):
+        if key in self._inflight:
+            return
+        
+        task = asyncio.ensure_future(self._lookup(key))
+        self._refreshing.add(task)
+        
+        # failed refresh keeps serving the stale answer until it ages out
+        def done(t):
+            self._refreshing.discard(t)
+            if not t.cancelled():
+                t.exception()
+        task.add_done_callback(done)
+    
+    """hit/miss counters for reporting"""
+    def stats(self):
+        lookups = self.hits + self.stale_hits + self.misses
+        return {
+            'hits': self.hits,
+            'stale_hits': self.stale_hits,
+            'misses': self.misses,
+            'errors': self.errors,
+            'entries': len(self._entries),
+            'hit_rate': (self.hits + self.stale_hits) / lookups if lookups else None,
+        }
+    
+    """cancel any background refreshes still running"""
+    async def close(self):
+        for task in list(self._refreshing):
+            task.cancel()
+        if self._refreshing:
+            await asyncio.gather(*self._refreshing, return_exceptions=True)
+        self._refreshing = set()
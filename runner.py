@@ -1,83 +1,524 @@
 """multi-target probe runner"""
 import asyncio
-from tcp_probe import tcp_probe
-from http_probe import http_probe_with_fallback
-from stats import compute_stats
+import time
+from array import array
+from contextlib import asynccontextmanager
+import numpy as np
+from tcp_probe import tcp_probe, tcp_probe_socket
+from capabilities import CapabilityCache, capability_key
+from events import emit, open_event_pipeline
+from resolver import DNSCache
+from scheduler import ProbeJob, ProbeScheduler
+from stats import compute_stats, compute_phase_stats
+from store import (MEASURED_OUTCOMES, OUTCOME_CONGESTED, OUTCOME_EXCLUDED, OUTCOME_FAILED, OUTCOME_OK,
+                   OUTCOME_SHORT_CIRCUITED, ResultView)
+from targets import effective_scheme, split_target
+
+
+"""probe settings and shared clients used by every sample in a run"""
+class ProbeContext:
+    
+    def __init__(self, mode='tcp', timeout=5.0, connection='cold', include_dns=False, client=None, resolver=None,
+                 tcp_engine='stream', metrics=None, timeouts=None, capabilities=None, concurrency=None):
+        self.mode = mode
+        self.timeout = timeout
+        self.connection = connection  # cold or warm http connections
+        self.include_dns = include_dns
+        self.client = client      # pooled HTTPClient for http mode
+        self.resolver = resolver  # shared DNSCache
+        self.tcp_engine = tcp_engine  # stream (asyncio streams) or socket (bare sock_connect)
+        self.metrics = metrics    # optional ProbeMetrics fed every sample
+        self.timeouts = timeouts  # optional TimeoutPolicy, None keeps the fixed timeout
+        self.capabilities = capabilities  # CapabilityCache of learned http method/scheme/redirect per target
+        self.concurrency = concurrency    # optional ConcurrencyController that flags samples taken under loop lag
+
+
+"""collects samples of one target and turns them into a result dict"""
+class TargetSamples:
+    
+    # one of these per target, at 100k targets an instance dict each adds up
+    __slots__ = ('host', 'port', 'scheme', 'latencies', 'failures', 'phase_latencies', 'sent_at', 'outcomes',
+                 'last_sent', 'last_outcome', 'primed', 'sampling', 'health', 'short_circuited', 'capability',
+                 'capability_source', 'capability_invalidations', 'url', 'capability_key')
+    
+    def __init__(self, host, port, mode='tcp', scheme=None):
+        self.host = host
+        self.port = port
+        self.scheme = scheme
+        # typed arrays hold 8 bytes a sample instead of a pointer and a float object
+        self.latencies = array('d')  # successful probe times
+        self.failures = 0            # count of timeouts and errors
+        self.phase_latencies = {}    # phase name -> successful phase times
+        self.sent_at = array('d')    # wall clock send time of every sample, successful or not
+        self.outcomes = array('b')   # OUTCOME_* code of every sample
+        
+        # set by probe_once for the sample add() records next, None outcome means plain ok or failed
+        self.last_sent = None
+        self.last_outcome = None
+        
+        self.primed = False        # warm http connection opened yet
+        self.sampling = None       # adaptive sampling summary, None for a fixed sample count
+        self.health = None         # TargetHealth with rto and breaker state when timeouts adapt
+        self.short_circuited = 0   # failed samples not probed because the target was down
+        
+        # http capabilities in use, 'cache' or 'discovered' source and how often they went stale
+        self.capability = None
+        self.capability_source = None
+        self.capability_invalidations = 0
+        
+        if mode == 'http':
+            # construct url from host and port, ipv6 literals need brackets
+            netloc = f"[{host}]" if ':' in host else host
+            self.url = f"{effective_scheme(port, scheme)}://{netloc}:{port}"
+            self.capability_key = capability_key(host, port, scheme)
+        else:
+            self.url = None
+            self.capability_key = None
+    
+    """record one sample, result is None for a failed probe"""
+    def add(self, result, phases):
+        self.sent_at.append(self.last_sent if self.last_sent is not None else time.time())
+        
+        # collect successful measurement or count failure
+        outcome = self.last_outcome
+        if result is None:
+            self.outcomes.append(OUTCOME_FAILED if outcome is None else outcome)
+            self.failures += 1
+        else:
+            self.outcomes.append(OUTCOME_OK if outcome is None else outcome)
+            # an excluded sample keeps its send time and flag but counts neither as latency nor as loss
+            if outcome != OUTCOME_EXCLUDED:
+                self.latencies.append(result)
+                for phase, phase_ms in phases.items():
+                    if phase not in self.phase_latencies:
+                        self.phase_latencies[phase] = array('d')
+                    self.phase_latencies[phase].append(phase_ms)
+        
+        self.last_sent = None
+        self.last_outcome = None
+    
+    """number of samples taken so far, successful or not, excluded ones left out"""
+    def attempts(self):
+        return len(self.latencies) + self.failures
+    
+    """number of samples measured while the event loop lagged, excluded or not"""
+    def congested(self):
+        return self.outcomes.count(OUTCOME_CONGESTED) + self.outcomes.count(OUTCOME_EXCLUDED)
+    
+    """every sample as numpy columns: send time, outcome code and latency, nan where not measured"""
+    def samples(self):
+        outcome = np.array(self.outcomes, dtype=np.int8)
+        latency_ms = np.full(len(outcome), np.nan)
+        # successes are stored in order, so they fill the measured positions one to one
+        latency_ms[np.isin(outcome, MEASURED_OUTCOMES)] = self.latencies
+        return {'sent_at': np.array(self.sent_at, dtype=np.float64), 'outcome': outcome, 'latency_ms': latency_ms}
+    
+    """build the result dict used by the table, slo and report code"""
+    def to_result(self, stats=None, phase_stats=None):
+        # compute stats from successful measurements unless a batch pass already did
+        if stats is None:
+            stats = compute_stats(self.latencies)
+        if phase_stats is None:
+            phase_stats = compute_phase_stats(self.phase_latencies)
+        
+        attempts = self.attempts()
+        loss_pct = (self.failures / attempts) * 100 if attempts else 0.0
+        
+        result = {
+            'host': self.host,
+            'port': self.port,
+            'stats': stats,
+            'loss_pct': loss_pct,
+            'phases': phase_stats,
+            'samples': attempts,
+            'short_circuited': self.short_circuited,
+            'congested_samples': self.congested(),
+        }
+        if self.sampling is not None:
+            result['sampling'] = self.sampling
+        if self.capability_source is not None:
+            result['http_capability'] = self.capability_summary()
+        return result
+    
+    """learned http capabilities and where they came from, for the report"""
+    def capability_summary(self):
+        capability = self.capability or {}
+        return {
+            'source': self.capability_source,
+            'method': capability.get('method'),
+            'url': capability.get('url'),
+            'http_version': capability.get('http_version'),
+            'redirected': capability.get('redirected'),
+            'invalidations': self.capability_invalidations,
+        }
+
+
+"""result dicts for many targets with one batched stats pass per metric, built lazily on access"""
+def build_results(targets):
+    return ResultView(targets)
+
+
+"""take one sample of a target, returns latency in ms (None on failure) and its phases"""
+async def probe_once(ctx, target):
+    phases = {}
+    
+    timeout = ctx.timeout
+    health = target.health
+    target.last_sent = time.time()
+    if ctx.timeouts is not None:
+        if health is None:
+            health = target.health = ctx.timeouts.new_target()
+        if not health.allow():
+            # target is down, the sample is lost without a probe holding a slot for a whole timeout
+            target.short_circuited += 1
+            target.last_outcome = OUTCOME_SHORT_CIRCUITED
+            return None, phases
+        timeout = health.timeout()
+    
+    # congested ticks seen up to here, the loop lagging before the probe ends taints its timing
+    concurrency = ctx.concurrency
+    epoch = concurrency.epoch if concurrency is not None else None
+    
+    # pick tcp or http based on mode
+    if ctx.mode == 'http':
+        result = await _probe_http(ctx, target, timeout, phases)
+    else:
+        # default tcp mode, the socket engine skips the stream machinery
+        probe = tcp_probe_socket if ctx.tcp_engine == 'socket' else tcp_probe
+        result = await probe(target.host, target.port, timeout, phases, ctx.resolver, ctx.include_dns)
+    
+    if health is not None:
+        health.record(result)
+    if result is not None and concurrency is not None and concurrency.congested_since(epoch):
+        target.last_outcome = OUTCOME_EXCLUDED if concurrency.exclude else OUTCOME_CONGESTED
+    return result, phases
+
+
+"""one http sample, straight to the learned method and url when known, discovering them otherwise"""
+async def _probe_http(ctx, target, timeout, phases):
+    # aiohttp is only imported by runs that probe http, tcp runs start faster without it
+    from http_probe import discover_http, http_probe, http_probe_with_fallback
+    
+    cache = ctx.capabilities
+    if target.capability is None and cache is not None and target.capability_source is None:
+        # only the first sample asks the cache, later ones know whether they learned something
+        target.capability = cache.get(target.capability_key)
+        if target.capability is not None:
+            target.capability_source = 'cache'
+    
+    capability = target.capability
+    if capability is not None:
+        if ctx.connection == 'warm' and not target.primed:
+            # unmeasured request opens the connection so every sample reuses it
+            await http_probe(capability['url'], timeout, capability['method'], ctx.client, ctx.connection)
+            target.primed = True
+        
+        # one request, no head to get fallback and no redirect hop
+        result = await http_probe(capability['url'], timeout, capability['method'], ctx.client, ctx.connection,
+                                  phases, ctx.include_dns)
+        if result is None:
+            # what worked before may be what broke, rediscover on the next sample
+            target.capability = None
+            target.capability_invalidations += 1
+            if cache is not None:
+                cache.invalidate(target.capability_key)
+        return result
+    
+    if ctx.connection == 'warm' and not target.primed:
+        await http_probe_with_fallback(target.url, timeout, ctx.client, ctx.connection)
+        target.primed = True
+    
+    # an explicit scheme is kept, a scheme guessed from the port may be wrong
+    info = {}
+    result, method = await discover_http(target.url, timeout, ctx.client, ctx.connection, phases, ctx.include_dns,
+                                         info, try_other_scheme=target.scheme is None)
+    if result is not None:
+        target.capability = cache.learn(target.capability_key, info) if cache is not None else info
+        target.capability_source = 'discovered'
+    return result
 
 
 """probe a single target multiple times"""
-async def probe_target(host, port=443, num_probes=10, timeout=5.0, interval=0.5, semaphore=None, mode='tcp'):
+async def probe_target(host, port=443, num_probes=10, timeout=5.0, interval=0.5, semaphore=None, mode='tcp',
+                       client=None, connection='cold', resolver=None, include_dns=False, tcp_engine='stream',
+                       scheme=None):
+    # a single target run gets its own dns cache and http client
+    if resolver is None:
+        resolver = DNSCache()
+        try:
+            return await probe_target(host, port, num_probes, timeout, interval, semaphore, mode,
+                                      client, connection, resolver, include_dns, tcp_engine, scheme)
+        finally:
+            await resolver.close()
+    if mode == 'http' and client is None:
+        from http_probe import HTTPClient
+        async with HTTPClient(pool_size=1, resolver=resolver) as own_client:
+            return await probe_target(host, port, num_probes, timeout, interval, semaphore, mode,
+                                      own_client, connection, resolver, include_dns, tcp_engine, scheme)
+    
+    ctx = ProbeContext(mode, timeout, connection, include_dns, client, resolver, tcp_engine)
+    
     # semaphore limits how many targets probe simultaneously
     # prevents overwhelming network or target servers
     if semaphore:
         async with semaphore:
-            return await _probe_target_impl(host, port, num_probes, timeout, interval, mode)
+            return await _probe_target_impl(ctx, host, port, num_probes, interval, scheme)
     else:
         # no concurrency control
-        return await _probe_target_impl(host, port, num_probes, timeout, interval, mode)
+        return await _probe_target_impl(ctx, host, port, num_probes, interval, scheme)
 
 
 """internal probe implementation"""
-async def _probe_target_impl(host, port, num_probes, timeout, interval, mode):
-    print(f"  Probing {host}:{port} ({num_probes} samples, mode: {mode})...")
+async def _probe_target_impl(ctx, host, port, num_probes, interval, scheme=None):
+    emit('start', f"{host}:{port}", detail=f"{num_probes} samples, mode: {ctx.mode}")
     
-    latencies = []  # successful probe times
-    failures = 0    # count of timeouts and errors
+    target = TargetSamples(host, port, ctx.mode, scheme)
     
     # run num_probes measurements
     for i in range(num_probes):
-        # pick tcp or http based on mode
-        if mode == 'http':
-            # construct url from host and port
-            scheme = 'https' if port == 443 else 'http'
-            url = f"{scheme}://{host}:{port}"
-            result, method = await http_probe_with_fallback(url, timeout)
-        else:
-            # default tcp mode
-            result = await tcp_probe(host, port, timeout)
-        
-        # collect successful measurement or count failure
-        if result is not None:
-            latencies.append(result)
-        else:
-            failures += 1
+        result, phases = await probe_once(ctx, target)
+        target.add(result, phases)
         
         # pause between probes to avoid hammering target
         if i < num_probes - 1:
             await asyncio.sleep(interval)
     
-    # compute stats from successful measurements
-    stats = compute_stats(latencies)
-    loss_pct = (failures / num_probes) * 100
+    return target.to_result()
+
+
+"""open the shared dns cache and http client for a run, closes them afterwards"""
+@asynccontextmanager
+async def open_probe_context(mode='tcp', timeout=5.0, pool_size=100, connection='cold', dns_ttl=60.0,
+                             include_dns=False, tcp_engine='stream', metrics=None, timeouts=None,
+                             capabilities=None, tls_resume=False, concurrency=None):
+    # one dns cache for the whole run so each name is looked up once per ttl
+    resolver = DNSCache(ttl=dns_ttl)
     
-    return {
-        'host': host,
-        'port': port,
-        'stats': stats,
-        'loss_pct': loss_pct,
-    }
+    # one pooled http client for the whole run instead of a session per sample
+    client = None
+    if mode == 'http':
+        from http_probe import HTTPClient
+        client = HTTPClient(pool_size=pool_size, resolver=resolver, tls_resume=tls_resume)
+    
+    # capabilities are learned within a run even when no cache file is kept between runs
+    if mode == 'http' and capabilities is None:
+        capabilities = CapabilityCache()
+    
+    if metrics is not None:
+        metrics.attach(resolver=resolver, client=client)
+    
+    try:
+        # probe errors and target starts go through the event queue, the caller may already run a pipeline
+        async with open_event_pipeline(metrics=metrics):
+            yield ProbeContext(mode, timeout, connection, include_dns, client, resolver, tcp_engine, metrics,
+                               timeouts, capabilities, concurrency)
+    finally:
+        if client is not None:
+            await client.close()
+        await resolver.close()
 
 
-"""probe multiple targets concurrently with semaphore"""
-async def run_probes(targets, num_probes=10, timeout=5.0, interval=0.5, max_concurrent=5, mode='tcp'):
-    print(f"Starting {mode.upper()} probes for {len(targets)} target(s) "
-          f"(max {max_concurrent} concurrent)...\n")
+"""probe multiple targets with a probe-level scheduler"""
+async def run_probes(targets, num_probes=10, timeout=5.0, interval=0.5, max_concurrent=5, mode='tcp',
+                     pool_size=100, connection='cold', dns_ttl=60.0, include_dns=False, rate=None,
+                     tcp_engine='stream', metrics=None, on_target=None, adaptive=None, timeouts=None,
+                     capabilities=None, tls_resume=False, destination_limit=None, destination_rate=None,
+                     coalesce=False, concurrency=None):
+    # on_target(index, TargetSamples) is called as each target takes its last sample
+    # adaptive is an optional AdaptivePolicy, num_probes is then ignored in favour of its sample bounds
+    # timeouts is an optional TimeoutPolicy for per-target rto timeouts and the down-target breaker
+    # capabilities is an optional CapabilityCache, the caller saves it after the run
+    # tls_resume offers each target's last tls session so handshakes after the first are resumed
+    # destination_limit and destination_rate cap probes in flight and per second per resolved ip:port
+    # coalesce takes one tcp measurement per ip:port per sample and shares it across the targets there
+    # concurrency is an optional ConcurrencyController, max_concurrent is then where its ramp starts
+    if coalesce and mode != 'tcp':
+        raise ValueError("Only tcp probes can be coalesced, an http response depends on the hostname")
+    limit = f"adaptive, {max_concurrent} up to {concurrency.ceiling}" if concurrency is not None \
+        else f"max {max_concurrent}"
+    print(f"Starting {mode.upper()} probes for {len(targets)} target(s) ({limit} in flight)...\n")
     
-    # semaphore acts like a ticket system - only max_concurrent tasks get tickets
-    # prevents spawning 100+ simultaneous connections
-    semaphore = asyncio.Semaphore(max_concurrent)
+    # scheduler works on single probes not whole targets
+    # max_concurrent caps probes in flight, no slot is held while a target waits out its interval
+    scheduler = ProbeScheduler(max_in_flight=max_concurrent, rate=rate, group_limit=destination_limit,
+                               group_rate=destination_rate)
     
-    # create task for each target
-    tasks = [
-        probe_target(host, port, num_probes, timeout, interval, semaphore, mode)
-        for host, port in targets
-    ]
+    if concurrency is not None:
+        concurrency.attach(scheduler, max_concurrent)
+    if metrics is not None:
+        metrics.attach(scheduler=scheduler)
+    
+    async with open_probe_context(mode, timeout, pool_size, connection, dns_ttl, include_dns, tcp_engine,
+                                  metrics, timeouts, capabilities, tls_resume, concurrency) as ctx:
+        samples = []
+        detail = f"{describe_samples(num_probes, adaptive)} samples, mode: {mode}"
+        for index, entry in enumerate(targets):
+            host, port, scheme = split_target(entry)
+            emit('start', f"{host}:{port}", detail=detail)
+            samples.append(TargetSamples(host, port, mode, scheme))
+        
+        # vhosts behind one load balancer share an ip:port, group them so they dont all hit it at once
+        grouped = destination_limit is not None or destination_rate or coalesce
+        destinations = await resolve_destinations(ctx.resolver, samples) if grouped else [None] * len(samples)
+        
+        members = {}  # destination -> [(index, target)], only filled when coalescing
+        for index, (target, destination) in enumerate(zip(samples, destinations)):
+            if coalesce and destination is not None:
+                members.setdefault(destination, []).append((index, target))
+                continue
+            scheduler.add(make_target_job(index, ctx, target, num_probes, interval, on_target, adaptive,
+                                          destination))
+        for destination, group in members.items():
+            scheduler.add(make_coalesced_job(destination, ctx, group, num_probes, interval, on_target, adaptive))
+        if members:
+            print(f"Coalesced {sum(len(group) for group in members.values())} target(s) "
+                  f"onto {len(members)} ip:port destination(s)\n")
+        
+        controller = asyncio.ensure_future(concurrency.run()) if concurrency is not None else None
+        try:
+            await scheduler.run()
+        finally:
+            if controller is not None:
+                controller.cancel()
+                await asyncio.gather(controller, return_exceptions=True)
+    
+    dns_stats = ctx.resolver.stats()
+    print(f"\nDNS cache: {dns_stats['hits'] + dns_stats['stale_hits']} hits, "
+          f"{dns_stats['misses']} misses, {dns_stats['errors']} errors")
+    if ctx.capabilities is not None:
+        print_capability_stats(ctx.capabilities.stats())
+    if tls_resume and ctx.client is not None:
+        print_tls_stats(ctx.client.tls_stats())
+    if concurrency is not None:
+        print_concurrency_stats(concurrency.summary(), sum(target.congested() for target in samples))
+    
+    # results in same order as targets list
+    return build_results(samples)
+
+
+"""one line summary of the http capability cache"""
+def print_capability_stats(stats):
+    print(f"HTTP capability cache: {stats['hits']} hits, {stats['misses']} misses, "
+          f"{stats['learned']} learned, {stats['invalidations']} invalidations")
+
+
+"""one line summary of full vs resumed tls handshakes"""
+def print_tls_stats(stats):
+    print(f"TLS handshakes: {stats['full']} full, {stats['resumed']} resumed")
+
+
+"""one line summary of where the adaptive in-flight limit went"""
+def print_concurrency_stats(stats, congested):
+    print(f"Concurrency: peak {stats['peak']}, ended at {stats['limit']} in flight, {stats['backoffs']} backoffs, "
+          f"loop congested {stats['congested_pct']:.1f}% of the run, {congested} samples flagged")
+
+
+"""sample count shown in progress lines, a range when sampling adaptively"""
+def describe_samples(num_probes, adaptive=None):
+    if adaptive is None:
+        return str(num_probes)
+    return f"{adaptive.min_samples}-{adaptive.max_samples}"
+
+
+"""first resolved address and port of every target, None where the name does not resolve"""
+async def resolve_destinations(resolver, targets):
+    # the probes connect to the first address too, and their own lookups then hit the warm cache
+    async def resolve(target):
+        try:
+            addr_infos = await resolver.resolve(target.host, target.port)
+        except OSError:
+            return None
+        return (addr_infos[0][4][0], target.port) if addr_infos else None
+    
+    return await asyncio.gather(*(resolve(target) for target in targets))
+
+
+# what a job records for a sample whose probe raised, the same as a failed probe_once
+FAILED_SAMPLE = (None, {})
+
+
+"""wrap a target in a scheduler job that records each sample it takes"""
+def make_target_job(key, ctx, target, num_probes, interval, on_done=None, adaptive=None, group=None):
+    if ctx.metrics is not None:
+        ctx.metrics.add_target(key, target.host, target.port)
+    
+    # adaptive targets sample up to the cap and stop early once their verdict settles
+    tracker = adaptive.tracker(target.host, target.port) if adaptive is not None else None
+    
+    async def probe():
+        return await probe_once(ctx, target)
     
-    # asyncio.gather runs all tasks concurrently and waits for all to finish
-    # returns results in same order as targets list
-    results = await asyncio.gather(*tasks)
+    def on_result(sample):
+        result, phases = sample
+        target.add(result, phases)
+        if ctx.metrics is not None:
+            ctx.metrics.observe(key, result)
+        if tracker is not None:
+            tracker.add(result, phases)
+            if tracker.done():
+                job.remaining = 0
+                target.sampling = tracker.summary()
+        # let the caller stream out targets as soon as their last sample lands
+        if on_done is not None and job.remaining == 0:
+            on_done(key, target)
     
-    return results
+    job = ProbeJob(key, probe, adaptive.max_samples if adaptive is not None else num_probes, interval, on_result,
+                   group, FAILED_SAMPLE, f"{target.host}:{target.port}")
+    return job
+
+
+"""one job for every target on an ip:port, each sample is one tcp connect shared by all of them"""
+def make_coalesced_job(destination, ctx, members, num_probes, interval, on_done=None, adaptive=None):
+    # members is a list of (index, TargetSamples), indices are the metrics and on_done keys as usual
+    host, port = destination
+    # probe state (timeout estimate, breaker) belongs to the destination, not to any one hostname
+    probe_target = TargetSamples(host, port, ctx.mode)
+    
+    trackers = {}
+    for index, target in members:
+        if ctx.metrics is not None:
+            ctx.metrics.add_target(index, target.host, target.port)
+        if adaptive is not None:
+            trackers[index] = adaptive.tracker(target.host, target.port)
+    active = dict(members)  # targets still taking samples
+    
+    async def probe():
+        return await probe_once(ctx, probe_target)
+    
+    def on_result(sample):
+        result, phases = sample
+        sent, outcome = probe_target.last_sent, probe_target.last_outcome
+        probe_target.last_sent, probe_target.last_outcome = None, None
+        # the shared connect resolved an ip, its near zero lookup says nothing about any member's name
+        shared = {phase: value for phase, value in phases.items() if phase != 'dns'}
+        
+        for index, target in list(active.items()):
+            target.last_sent, target.last_outcome = sent, outcome
+            if outcome == OUTCOME_SHORT_CIRCUITED:
+                target.short_circuited += 1
+            target.add(result, shared)
+            if ctx.metrics is not None:
+                ctx.metrics.observe(index, result)
+            
+            finished = job.remaining == 0
+            tracker = trackers.get(index)
+            if tracker is not None:
+                tracker.add(result, shared)
+                if tracker.done():
+                    target.sampling = tracker.summary()
+                    finished = True
+            if finished:
+                del active[index]
+                if on_done is not None:
+                    on_done(index, target)
+        
+        # a settled target drops out, the destination keeps sampling for the rest
+        if not active:
+            job.remaining = 0
+    
+    job = ProbeJob(destination, probe, adaptive.max_samples if adaptive is not None else num_probes, interval,
+                   on_result, destination, FAILED_SAMPLE, f"{host}:{port}")
+    return job
 
 
 """print ascii table of results"""
@@ -117,6 +558,7 @@ def print_results_table(results, slo_evaluations=None):
             slo_str = "PASS" if slo_eval['passed'] else "FAIL"
             
             print(f"{target:<30} {avg_str:<12} {p95_str:<12} {p99_str:<12} {loss:.1f}%{'':<6} {slo_str}")
+            _print_phase_rows(r)
             
             # indent failure reasons under the row
             if not slo_eval['passed']:
@@ -125,10 +567,20 @@ def print_results_table(results, slo_evaluations=None):
         else:
             # no slo data, just print stats
             print(f"{target:<30} {avg_str:<12} {p95_str:<12} {p99_str:<12} {loss:.1f}%")
+            _print_phase_rows(r)
     
     print("="*90)
 
 
+"""print per-phase breakdown under a target row so slow phases stand out"""
+def _print_phase_rows(result):
+    for phase, phase_stats in result.get('phases', {}).items():
+        if phase_stats['avg_ms'] is None:
+            continue
+        print(f"  {phase:<28} {phase_stats['avg_ms']:<12.2f} "
+              f"{phase_stats['p95_ms']:<12.2f} {phase_stats['p99_ms']:.2f}")
+
+
 """test runner with known hosts"""
 async def test_multi_target():
     targets = [
@@ -0,0 +1,234 @@
+"""probe-level scheduler that interleaves samples from all targets"""
+import asyncio
+import heapq
+import itertools
+import time
+from collections import deque
+from events import emit
+
+
+"""token bucket limiting how many probes start per second across the run"""
+class TokenBucket:
+    
+    """rate in tokens per second, burst defaults to one second worth of tokens"""
+    def __init__(self, rate, burst=None):
+        self.rate = rate
+        self.capacity = burst if burst is not None else max(1.0, rate)
+        self._tokens = self.capacity
+        self._last = time.monotonic()
+    
+    """wait until a token is available then take it"""
+    async def acquire(self):
+        while True:
+            wait = self.try_take()
+            if wait == 0:
+                return
+            # sleep just long enough for the next token to drip in
+            await asyncio.sleep(wait)
+    
+    """take a token if one is available, returns 0 or the seconds until the next one"""
+    def try_take(self):
+        now = time.monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._last) * self.rate)
+        self._last = now
+        
+        if self._tokens >= 1:
+            self._tokens -= 1
+            return 0
+        return (1 - self._tokens) / self.rate
+
+
+"""one target's sampling plan inside the scheduler"""
+class ProbeJob:
+    
+    """probe is a coroutine function taking one sample, on_result gets whatever it returns"""
+    def __init__(self, key, probe, samples, interval, on_result=None, group=None, failed=None, name=None):
+        self.key = key
+        self.probe = probe
+        self.remaining = samples  # None keeps sampling until the job is removed
+        self.interval = interval  # pause between end of one sample and start of the next
+        self.on_result = on_result
+        self.group = group        # destination (e.g. ip, port) sharing the per-group caps, None for no caps
+        self.failed = failed      # what on_result gets when the probe raises, the sample counts as failed
+        self.name = name          # shown in error events, defaults to the key
+        self.cancelled = False
+
+
+"""runs single probes from all jobs under a global in-flight cap and rate limit, plus optional per-group caps"""
+class ProbeScheduler:
+    
+    """group_limit and group_rate cap probes in flight and started per second for each job group"""
+    def __init__(self, max_in_flight=5, rate=None, group_limit=None, group_rate=None):
+        self.max_in_flight = max_in_flight
+        # slots are counted rather than held in a semaphore so the limit can move during a run
+        self._slots_used = 0
+        self._slot_free = asyncio.Event()
+        self._bucket = TokenBucket(rate) if rate else None
+        
+        self.group_limit = group_limit
+        self.group_rate = group_rate
+        self._group_running = {}  # group -> probes in flight
+        self._group_buckets = {}  # group -> TokenBucket
+        self._parked = {}         # group -> jobs due but waiting for a probe of their group to finish
+        
+        self._queue = []          # heap of (due time, seq, job)
+        self._seq = itertools.count()  # tie breaker so jobs never get compared
+        self._tasks = set()       # probes currently running
+        self._running = 0         # samples dispatched but not yet rescheduled
+        self._wakeup = asyncio.Event()
+        self._jobs = {}           # key -> job
+        
+        # counters for progress and self-monitoring
+        self.in_flight = 0
+        self.completed = 0
+        self.slot_waits = 0           # times a due sample had to wait for a free slot
+        self.delay_observer = None    # optional callback(seconds) with each probe's dispatch to start delay
+    
+    """change the in-flight cap, probes already running above a lowered cap finish as usual"""
+    def set_limit(self, max_in_flight):
+        self.max_in_flight = max(1, max_in_flight)
+        self._slot_free.set()
+    
+    """add a job, its first sample runs after delay seconds"""
+    def add(self, job, delay=0.0):
+        self._jobs[job.key] = job
+        self._push(job, delay)
+    
+    """stop scheduling a job, a sample already in flight still finishes"""
+    def remove(self, key):
+        job = self._jobs.pop(key, None)
+        if job is not None:
+            job.cancelled = True
+        self._wakeup.set()
+    
+    """number of samples waiting for their due time or for their group"""
+    def queue_depth(self):
+        return len(self._queue) + sum(len(jobs) for jobs in self._parked.values())
+    
+    def _push(self, job, delay):
+        due = time.monotonic() + delay
+        heapq.heappush(self._queue, (due, next(self._seq), job))
+        self._wakeup.set()
+    
+    """dispatch samples as they come due until every job is finished"""
+    async def run(self, until_empty=True):
+        # until_empty=False keeps waiting for new jobs even after the last one is removed
+        try:
+            while self._queue or self._running or not until_empty:
+                self._wakeup.clear()
+                
+                if not self._queue:
+                    # nothing due, wait for a running probe to reschedule its job
+                    await self._wakeup.wait()
+                    continue
+                
+                due, _, job = self._queue[0]
+                if job.cancelled:
+                    heapq.heappop(self._queue)
+                    continue
+                
+                wait = due - time.monotonic()
+                if wait > 0:
+                    # wake early if a sooner job gets added meanwhile
+                    try:
+                        await asyncio.wait_for(self._wakeup.wait(), timeout=wait)
+                    except asyncio.TimeoutError:
+                        pass
+                    continue
+                
+                heapq.heappop(self._queue)
+                
+                # a busy group parks its job without holding a slot, other destinations go ahead
+                if job.group is not None and not self._group_ready(job):
+                    continue
+                
+                # slot is only held while the probe runs, never during the interval
+                if self._slots_used >= self.max_in_flight:
+                    self.slot_waits += 1
+                    while self._slots_used >= self.max_in_flight:
+                        self._slot_free.clear()
+                        await self._slot_free.wait()
+                self._slots_used += 1
+                if self._bucket is not None:
+                    await self._bucket.acquire()
+                
+                # removed while waiting for its slot or token, give the slot back unused
+                if job.cancelled:
+                    self._slots_used -= 1
+                    self._slot_free.set()
+                    continue
+                
+                if job.group is not None:
+                    self._group_running[job.group] = self._group_running.get(job.group, 0) + 1
+                self._running += 1
+                task = asyncio.ensure_future(self._run_one(job, time.monotonic()))
+                self._tasks.add(task)
+                task.add_done_callback(self._tasks.discard)
+        finally:
+            for task in list(self._tasks):
+                task.cancel()
+    
+    """whether a grouped job may start now, otherwise it is parked or pushed back to its next token"""
+    def _group_ready(self, job):
+        group = job.group
+        if self.group_limit is not None and self._group_running.get(group, 0) >= self.group_limit:
+            self._parked.setdefault(group, deque()).append(job)
+            return False
+        if self.group_rate:
+            bucket = self._group_buckets.get(group)
+            if bucket is None:
+                # one probe at a time, a per-destination burst is what this is meant to prevent
+                bucket = self._group_buckets[group] = TokenBucket(self.group_rate, burst=1)
+            wait = bucket.try_take()
+            if wait:
+                self._push(job, wait)
+                return False
+        return True
+    
+    """a probe of a group finished, let its next parked job go"""
+    def _release_group(self, group):
+        running = self._group_running[group] - 1
+        if running:
+            self._group_running[group] = running
+        else:
+            del self._group_running[group]
+        parked = self._parked.get(group)
+        if parked:
+            self._push(parked.popleft(), 0.0)
+            if not parked:
+                del self._parked[group]
+    
+    """take one sample of a job then put it back in the queue if it has more to do"""
+    async def _run_one(self, job, dispatched):
+        try:
+            if self.delay_observer is not None:
+                # a busy loop starts tasks late, the same wait lands inside the probe's own timing
+                self.delay_observer(time.monotonic() - dispatched)
+            self.in_flight += 1
+            try:
+                result = await job.probe()
+            except Exception as e:
+                # an unexpected error costs one sample, never the rest of the job
+                emit('error', job.name if job.name is not None else str(job.key), phase='probe',
+                     error=type(e).__name__, detail=str(e))
+                result = job.failed
+            finally:
+                self.in_flight -= 1
+                self._slots_used -= 1
+                self._slot_free.set()
+                if job.group is not None:
+                    self._release_group(job.group)
+            
+            self.completed += 1
+            if job.remaining is not None:
+                job.remaining -= 1
+            if job.on_result is not None:
+                job.on_result(result)
+            
+            if not job.cancelled and (job.remaining is None or job.remaining > 0):
+                self._push(job, job.interval)
+            elif self._jobs.get(job.key) is job:
+                del self._jobs[job.key]
+        finally:
+            self._running -= 1
+            self._wakeup.set()
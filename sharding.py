@@ -0,0 +1,216 @@
+"""multi-process sharded runner for very large target lists"""
+import asyncio
+import multiprocessing
+import queue
+import traceback
+from array import array
+from capabilities import CapabilityCache
+from runner import (TargetSamples, build_results, make_target_job, open_probe_context, print_capability_stats,
+                    print_tls_stats)
+from scheduler import ProbeScheduler
+from targets import split_target
+
+
+"""split a global limit across workers so the shares never add up to more than the total"""
+def split_limit(total, workers):
+    base, extra = divmod(total, workers)
+    return [base + (1 if i < extra else 0) for i in range(workers)]
+
+
+"""probe targets across worker processes, each with its own event loop and scheduler"""
+async def run_probes_sharded(targets, workers=2, num_probes=10, timeout=5.0, interval=0.5, max_concurrent=5,
+                             mode='tcp', pool_size=100, connection='cold', dns_ttl=60.0, include_dns=False,
+                             rate=None, tcp_engine='stream', metrics=None, on_target=None, adaptive=None,
+                             timeouts=None, capabilities=None, tls_resume=False):
+    # every worker needs at least one in-flight slot of the global cap
+    workers = max(1, min(workers, max_concurrent, len(targets)))
+    
+    print(f"Starting {mode.upper()} probes for {len(targets)} target(s) across {workers} worker(s) "
+          f"(max {max_concurrent} in flight)...\n")
+    
+    # static split of the global limits keeps them correct without any cross-process locking
+    concurrency_shares = split_limit(max_concurrent, workers)
+    pool_shares = split_limit(max(pool_size, workers), workers)
+    rate_share = rate / workers if rate else None
+    
+    # workers start from a copy of the capability cache, what they learn is merged back here
+    if mode == 'http' and capabilities is None:
+        capabilities = CapabilityCache()
+    
+    # round robin so slow and fast parts of the list spread evenly
+    shards = [[] for _ in range(workers)]
+    for index, target in enumerate(targets):
+        shards[index % workers].append((index, *split_target(target)))
+    
+    # spawn works the same on windows and doesnt fork a running event loop
+    mp = multiprocessing.get_context('spawn')
+    results_queue = mp.Queue()
+    processes = []
+    for worker_id, shard in enumerate(shards):
+        settings = {
+            'num_probes': num_probes,
+            'timeout': timeout,
+            'interval': interval,
+            'max_concurrent': concurrency_shares[worker_id],
+            'mode': mode,
+            'pool_size': pool_shares[worker_id],
+            'connection': connection,
+            'dns_ttl': dns_ttl,
+            'include_dns': include_dns,
+            'rate': rate_share,
+            'tcp_engine': tcp_engine,
+            'adaptive': adaptive,
+            'timeouts': timeouts,
+            'capabilities': capabilities,
+            'tls_resume': tls_resume,
+        }
+        process = mp.Process(target=_worker_main, args=(worker_id, shard, settings, results_queue), daemon=True)
+        process.start()
+        processes.append(process)
+    
+    samples = [None] * len(targets)
+    try:
+        await _collect(results_queue, processes, samples, mode, metrics, on_target, capabilities, tls_resume)
+    finally:
+        for process in processes:
+            process.join(timeout=5)
+            if process.is_alive():
+                process.terminate()
+    
+    # results in same order as targets list
+    return build_results(samples)
+
+
+"""read worker messages until every worker reports done"""
+async def _collect(results_queue, processes, samples, mode, metrics=None, on_target=None, capabilities=None,
+                   tls_resume=False):
+    loop = asyncio.get_running_loop()
+    running = set(range(len(processes)))
+    dns_totals = {'hits': 0, 'misses': 0, 'errors': 0}
+    tls_totals = {'full': 0, 'resumed': 0}
+    
+    while running:
+        try:
+            # blocking queue read stays off the event loop
+            message = await loop.run_in_executor(None, results_queue.get, True, 0.5)
+        except queue.Empty:
+            # a worker that died without reporting would otherwise hang us forever
+            for worker_id in list(running):
+                if not processes[worker_id].is_alive():
+                    raise RuntimeError(f"Worker {worker_id} exited unexpectedly "
+                                       f"(exit code {processes[worker_id].exitcode})")
+            continue
+        
+        kind = message[0]
+        if kind == 'result':
+            _, index, host, port, scheme, packed = message
+            samples[index] = _unpack_target(host, port, scheme, mode, packed)
+            if metrics is not None:
+                # workers have their own engines, only per-target series reach the parent
+                metrics.add_target(index, host, port)
+                for latency in samples[index].latencies:
+                    metrics.observe(index, latency)
+                for _ in range(samples[index].failures):
+                    metrics.observe(index, None)
+            if capabilities is not None:
+                _merge_capability(capabilities, samples[index])
+            if on_target is not None:
+                on_target(index, samples[index])
+        elif kind == 'done':
+            _, worker_id, dns_stats, capability_stats, tls_stats = message
+            running.discard(worker_id)
+            if tls_stats is not None:
+                tls_totals['full'] += tls_stats['full']
+                tls_totals['resumed'] += tls_stats['resumed']
+            if capabilities is not None and capability_stats is not None:
+                # learned and invalidated are counted by the merges, only lookups happen in the workers
+                capabilities.hits += capability_stats['hits']
+                capabilities.misses += capability_stats['misses']
+            dns_totals['hits'] += dns_stats['hits'] + dns_stats['stale_hits']
+            dns_totals['misses'] += dns_stats['misses']
+            dns_totals['errors'] += dns_stats['errors']
+        elif kind == 'error':
+            _, worker_id, details = message
+            raise RuntimeError(f"Worker {worker_id} failed:\n{details}")
+    
+    print(f"\nDNS cache: {dns_totals['hits']} hits, "
+          f"{dns_totals['misses']} misses, {dns_totals['errors']} errors")
+    if capabilities is not None:
+        print_capability_stats(capabilities.stats())
+    if tls_resume:
+        print_tls_stats(tls_totals)
+
+
+"""fold what a worker learned about a target into the parent's capability cache"""
+def _merge_capability(capabilities, target):
+    if target.capability is not None and target.capability_source == 'discovered':
+        capabilities.learn(target.capability_key, target.capability)
+    elif target.capability is None and target.capability_invalidations:
+        capabilities.invalidate(target.capability_key)
+
+
+"""worker process entry point, must stay top level so spawn can import it"""
+def _worker_main(worker_id, shard, settings, results_queue):
+    try:
+        asyncio.run(_worker_run(worker_id, shard, settings, results_queue))
+    except Exception:
+        results_queue.put(('error', worker_id, traceback.format_exc()))
+
+
+"""probe one shard and stream each target back as soon as it finishes"""
+async def _worker_run(worker_id, shard, settings, results_queue):
+    scheduler = ProbeScheduler(max_in_flight=settings['max_concurrent'], rate=settings['rate'])
+    
+    def on_done(index, target):
+        results_queue.put(('result', index, target.host, target.port, target.scheme, _pack_target(target)))
+    
+    async with open_probe_context(
+        settings['mode'], settings['timeout'], settings['pool_size'], settings['connection'],
+        settings['dns_ttl'], settings['include_dns'], settings['tcp_engine'], timeouts=settings['timeouts'],
+        capabilities=settings['capabilities'], tls_resume=settings['tls_resume']
+    ) as ctx:
+        for index, host, port, scheme in shard:
+            target = TargetSamples(host, port, settings['mode'], scheme)
+            scheduler.add(make_target_job(index, ctx, target, settings['num_probes'], settings['interval'], on_done,
+                                          settings['adaptive']))
+        
+        await scheduler.run()
+    
+    capability_stats = ctx.capabilities.stats() if ctx.capabilities is not None else None
+    tls_stats = ctx.client.tls_stats() if ctx.client is not None else None
+    results_queue.put(('done', worker_id, ctx.resolver.stats(), capability_stats, tls_stats))
+
+
+"""compact form of a finished target: raw sample arrays as bytes"""
+def _pack_target(target):
+    return (
+        array('d', target.latencies).tobytes(),
+        target.failures,
+        {phase: array('d', values).tobytes() for phase, values in target.phase_latencies.items()},
+        target.sent_at.tobytes(),
+        target.outcomes.tobytes(),
+        target.sampling,
+        target.short_circuited,
+        (target.capability, target.capability_source, target.capability_invalidations),
+    )
+
+
+"""rebuild TargetSamples from _pack_target output"""
+def _unpack_target(host, port, scheme, mode, packed):
+    latencies, failures, phases, sent_at, outcomes, sampling, short_circuited, capability = packed
+    target = TargetSamples(host, port, mode, scheme)
+    target.sampling = sampling
+    target.short_circuited = short_circuited
+    target.capability, target.capability_source, target.capability_invalidations = capability
+    target.latencies = _unpack_array(latencies)
+    target.failures = failures
+    target.phase_latencies = {phase: _unpack_array(values) for phase, values in phases.items()}
+    target.sent_at = _unpack_array(sent_at)
+    target.outcomes = _unpack_array(outcomes, 'b')
+    return target
+
+
+def _unpack_array(data, typecode='d'):
+    values = array(typecode)
+    values.frombytes(data)
+    return values
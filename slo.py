@@ -1,5 +1,8 @@
 """slo service level objective evaluation"""
-import yaml
+import ipaddress
+import math
+from array import array
+import numpy as np
 from pathlib import Path
 
 
@@ -10,88 +13,541 @@ class SLOConfig:
     def __init__(self, config_path=None):
         # sensible defaults for tcp probing
         # http probing needs higher thresholds
-        self.default_slo = {
+        self._default_slo = {
             'latency_p95_ms': 100.0,
             'latency_p99_ms': None,  # optional
             'max_loss_pct': 5.0,
+            'phases': {},  # optional per-phase thresholds, e.g. {'tls': {'latency_p95_ms': 50}}
+            'objective': None,  # optional error budget, e.g. {'target_pct': 99.9, 'period': '30d'}
+            # 'burn_alerts' may set multi-window burn-rate alerts for an objective, DEFAULT_BURN_ALERTS otherwise
         }
-        self.target_slos = {}  # per-target overrides
+        self._target_slos = {}  # per-target overrides, keys are rules (see SLORuleIndex)
+        self._index = None      # compiled on first lookup
+        self._cache = {}        # (host, port) -> SLOThresholds
         
         if config_path and Path(config_path).exists():
             self._load_config(config_path)
     
+    # reassigning either section recompiles the rules on next lookup
+    # changes made in place after the first lookup are not picked up
+    @property
+    def default_slo(self):
+        return self._default_slo
+    
+    @default_slo.setter
+    def default_slo(self, value):
+        self._default_slo = value
+        self._invalidate()
+    
+    @property
+    def target_slos(self):
+        return self._target_slos
+    
+    @target_slos.setter
+    def target_slos(self, value):
+        self._target_slos = value
+        self._invalidate()
+    
+    def _invalidate(self):
+        self._index = None
+        self._cache = {}
+    
     """load config from yaml file"""
     def _load_config(self, config_path):
+        # yaml is only needed when there is a config file to read
+        import yaml
         with open(config_path, 'r') as f:
-            config = yaml.safe_load(f)
+            config = yaml.safe_load(f) or {}
         
         # merge default_slo section if present
         if 'default_slo' in config:
-            self.default_slo.update(config['default_slo'])
+            self._default_slo.update(config['default_slo'])
         
         # load per-target overrides
         if 'target_slos' in config:
-            self.target_slos = config['target_slos']
+            self.target_slos = config['target_slos'] or {}
+        
+        self._invalidate()
+    
+    """get read-only slo thresholds for a host, port picks port-specific rules"""
+    def get_slo(self, host, port=None):
+        key = (host, port)
+        slo = self._cache.get(key)
+        if slo is None:
+            if self._index is None:
+                self._index = SLORuleIndex(self._default_slo, self._target_slos)
+            slo = self._cache[key] = self._index.lookup(host, port)
+        return slo
+
+
+"""read-only thresholds dict, shared between every target that resolves to the same rule"""
+class SLOThresholds(dict):
+    
+    def __init__(self, values):
+        super().__init__(values)
+        # limit matrix row, built once instead of on every evaluation
+        self.limits = tuple(_nan_if_none(self.get(key)) for key in _SLO_LIMIT_KEYS)
+        # parsed error budget settings, None when no objective is set
+        self.budget = BudgetPolicy.from_slo(self) if self.get('objective') else None
+    
+    def _read_only(self, *args, **kwargs):
+        raise TypeError("SLO thresholds are read-only, copy() them to make changes")
+    
+    __setitem__ = __delitem__ = clear = pop = popitem = setdefault = update = _read_only
+    
+    # pickle would rebuild the dict item by item through __setitem__
+    def __reduce__(self):
+        return (SLOThresholds, (dict(self),))
+
+
+"""target_slos rules compiled once into exact, domain suffix and cidr lookups"""
+class SLORuleIndex:
+    
+    """rules map a rule key to its overrides, see _parse_rule for the key forms"""
+    def __init__(self, default_slo, target_slos):
+        self.default = self._merge(default_slo, {})
+        self._exact = {}          # (host, port or None) -> thresholds
+        self._suffixes = {}       # reversed domain label trie, node: {label: child, _RULES: {port: thresholds}}
+        self._networks = {4: [None, None, None], 6: [None, None, None]}  # bit tries: [child 0, child 1, rules]
+        
+        for key, overrides in (target_slos or {}).items():
+            kind, match, port = _parse_rule(str(key))
+            thresholds = self._merge(default_slo, overrides or {})
+            
+            if kind == 'exact':
+                self._exact[(match, port)] = thresholds
+            elif kind == 'suffix':
+                node = self._suffixes
+                for label in reversed(match.split('.')):
+                    node = node.setdefault(label, {})
+                node.setdefault(_RULES, {})[port] = thresholds
+            else:
+                node = self._networks[match.version]
+                bits = int(match.network_address)
+                width = match.max_prefixlen
+                for i in range(match.prefixlen):
+                    bit = (bits >> (width - 1 - i)) & 1
+                    if node[bit] is None:
+                        node[bit] = [None, None, None]
+                    node = node[bit]
+                if node[2] is None:
+                    node[2] = {}
+                node[2][port] = thresholds
+    
+    """thresholds for one target, most specific rule wins"""
+    def lookup(self, host, port=None):
+        # precedence: exact host:port, exact host, longest wildcard suffix, longest cidr prefix, default
+        # at the same suffix or prefix a port-specific rule beats a portless one
+        host = _normalize_host(host)
+        
+        if port is not None and (host, port) in self._exact:
+            return self._exact[(host, port)]
+        if (host, None) in self._exact:
+            return self._exact[(host, None)]
+        
+        match = self._lookup_suffix(host, port)
+        if match is not None:
+            return match
+        
+        match = self._lookup_network(host, port)
+        if match is not None:
+            return match
+        
+        return self.default
+    
+    def _lookup_suffix(self, host, port):
+        labels = host.split('.')
+        node = self._suffixes
+        best = None
+        # a wildcard only matches strict subdomains, so stop one label short of the full name
+        for label in reversed(labels[1:]):
+            node = node.get(label)
+            if node is None:
+                break
+            found = _pick_port(node.get(_RULES), port)
+            if found is not None:
+                best = found
+        return best
+    
+    def _lookup_network(self, host, port):
+        try:
+            address = ipaddress.ip_address(host)
+        except ValueError:
+            # cidr rules only apply to ip literal targets
+            return None
+        
+        node = self._networks[address.version]
+        bits = int(address)
+        width = address.max_prefixlen
+        best = _pick_port(node[2], port)
+        for i in range(width):
+            node = node[(bits >> (width - 1 - i)) & 1]
+            if node is None:
+                break
+            found = _pick_port(node[2], port)
+            if found is not None:
+                best = found
+        return best
+    
+    """defaults with overrides applied, phase thresholds merge per phase instead of replacing the section"""
+    @staticmethod
+    def _merge(default_slo, overrides):
+        slo = dict(default_slo)
+        slo.update(overrides)
+        
+        phases = {name: dict(t) for name, t in (default_slo.get('phases') or {}).items()}
+        for name, thresholds in (overrides.get('phases') or {}).items():
+            phases.setdefault(name, {}).update(thresholds)
+        slo['phases'] = {name: SLOThresholds(t) for name, t in phases.items()}
+        
+        # objective merges per key so a rule can tighten just the target
+        if overrides.get('objective') and default_slo.get('objective'):
+            slo['objective'] = {**default_slo['objective'], **overrides['objective']}
+        # burn alerts mean nothing without an objective, and every report target would carry the table
+        if not slo.get('objective'):
+            slo.pop('burn_alerts', None)
+        return SLOThresholds(slo)
+
+
+# key for the rules stored on a suffix trie node, cant clash with a dns label
+_RULES = '*'
+
+
+"""split a target_slos key into (kind, match, port)"""
+def _parse_rule(key):
+    # forms: host, host:port, [v6addr], [v6addr]:port, *.domain, *.domain:port, cidr, cidr:port
+    key = key.strip()
+    
+    if '/' in key:
+        address, _, rest = key.partition('/')
+        prefix, _, port = rest.partition(':')
+        try:
+            network = ipaddress.ip_network(f"{address.strip('[]')}/{prefix}", strict=False)
+        except ValueError:
+            raise ValueError(f"Invalid CIDR rule in target_slos: {key}")
+        return 'cidr', network, _parse_rule_port(port, key)
+    
+    if key.startswith('['):
+        address, _, rest = key[1:].partition(']')
+        return 'exact', _normalize_host(address), _parse_rule_port(rest.lstrip(':'), key)
+    
+    host, port = key, ''
+    if key.count(':') == 1:
+        host, port = key.split(':')
+    
+    if host.startswith('*.'):
+        return 'suffix', _normalize_host(host[2:]), _parse_rule_port(port, key)
+    if '*' in host:
+        raise ValueError(f"Only leading '*.' wildcards are supported in target_slos: {key}")
+    return 'exact', _normalize_host(host), _parse_rule_port(port, key)
+
+
+def _parse_rule_port(port, key):
+    if not port:
+        return None
+    if not port.isdigit() or not 1 <= int(port) <= 65535:
+        raise ValueError(f"Invalid port in target_slos rule: {key}")
+    return int(port)
+
+
+"""hostnames compare case-insensitively and without a trailing dot, ip literals in canonical form"""
+def _normalize_host(host):
+    host = host.strip().lower().rstrip('.')
+    try:
+        return str(ipaddress.ip_address(host))
+    except ValueError:
+        return host
+
+
+def _pick_port(rules, port):
+    if not rules:
+        return None
+    if port is not None and port in rules:
+        return rules[port]
+    return rules.get(None)
+
+
+# duration suffixes accepted on the command line
+_DURATION_UNITS = {'s': 1, 'm': 60, 'h': 3600, 'd': 86400}
+
+
+"""parse a duration like 30s, 5m, 1h or 1d into seconds"""
+def parse_duration(text):
+    text = text.strip().lower()
+    if not text:
+        raise ValueError("Empty duration")
+    
+    unit = text[-1]
+    if unit in _DURATION_UNITS:
+        number = text[:-1]
+        scale = _DURATION_UNITS[unit]
+    else:
+        # bare number means seconds
+        number = text
+        scale = 1
+    
+    try:
+        seconds = float(number) * scale
+    except ValueError:
+        raise ValueError(f"Invalid duration: {text}")
+    
+    if seconds <= 0:
+        raise ValueError(f"Duration must be positive: {text}")
+    return seconds
+
+
+# google sre workbook multi-window alerts: long window, short window, burn rate, severity
+DEFAULT_BURN_ALERTS = (
+    {'long': '1h', 'short': '5m', 'burn_rate': 14.4, 'severity': 'page'},
+    {'long': '6h', 'short': '30m', 'burn_rate': 6.0, 'severity': 'page'},
+    {'long': '3d', 'short': '6h', 'burn_rate': 1.0, 'severity': 'ticket'},
+)
+
+# each burn-rate window is split into this many ring slots, the oldest drops out whole
+BUDGET_SLOTS = 12
+
+
+"""parsed objective and burn-rate alerts, shared by every target using the same rule"""
+class BudgetPolicy:
     
-    """get slo thresholds for specific host"""
-    def get_slo(self, host):
-        # check if this host has custom thresholds
-        if host in self.target_slos:
-            # start with defaults then apply overrides
-            slo = self.default_slo.copy()
-            slo.update(self.target_slos[host])
-            return slo
+    def __init__(self, target_pct, period, latency_ms=None, alerts=DEFAULT_BURN_ALERTS):
+        if not 0 < target_pct < 100:
+            raise ValueError(f"Objective target_pct must be between 0 and 100: {target_pct}")
+        self.target_pct = target_pct
+        self.allowed_bad = 1 - target_pct / 100  # error budget as a fraction of all events
+        self.latency_ms = latency_ms  # successful probes slower than this are bad events too
+        self.period = period          # (label, seconds) the budget is spent over
         
-        # use default thresholds
-        return self.default_slo.copy()
+        # every distinct window a target has to count over, the period first
+        windows = dict([period])
+        for alert in alerts:
+            windows.update([_window(alert['long']), _window(alert['short'])])
+        self.window_labels = list(windows)
+        self.slot_widths = tuple(seconds / BUDGET_SLOTS for seconds in windows.values())
+        
+        # (name, long window index, short window index, burn rate, severity)
+        self.alerts = tuple(
+            (f"{a['long']}/{a['short']}", self.window_labels.index(str(a['long'])),
+             self.window_labels.index(str(a['short'])), float(a['burn_rate']), a.get('severity', 'page'))
+            for a in alerts
+        )
+    
+    """build from an slo dict with an objective section"""
+    @classmethod
+    def from_slo(cls, slo):
+        objective = slo['objective']
+        return cls(
+            target_pct=float(objective['target_pct']),
+            period=_window(objective.get('period', '30d')),
+            latency_ms=objective.get('latency_ms'),
+            alerts=slo.get('burn_alerts') or DEFAULT_BURN_ALERTS,
+        )
+
+
+def _window(label):
+    return str(label), parse_duration(str(label))
+
+
+"""per-target error budget: good/bad ring counters per window and multi-window burn-rate alerts"""
+class ErrorBudget:
+    
+    # tens of thousands of these live for the whole watch, keep them small
+    __slots__ = ('policy', '_counts', '_current', '_good', '_bad', 'firing')
+    
+    def __init__(self, policy):
+        self.policy = policy
+        windows = len(policy.window_labels)
+        # one flat ring for every window: window w, slot i -> good at 2*(w*slots+i), bad right after
+        self._counts = array('I', bytes(4 * 2 * windows * BUDGET_SLOTS))
+        self._current = [None] * windows  # absolute slot number of each window's newest slot
+        # running totals so reading a window never sums its ring
+        self._good = [0] * windows
+        self._bad = [0] * windows
+        self.firing = [False] * len(policy.alerts)
+    
+    """count one probe (latency None for a failure), returns alerts that started or stopped firing"""
+    def add(self, timestamp, latency):
+        policy = self.policy
+        good = latency is not None and (policy.latency_ms is None or latency <= policy.latency_ms)
+        offset = 0 if good else 1
+        
+        for w, slot_width in enumerate(policy.slot_widths):
+            index = self._advance(w, math.floor(timestamp / slot_width))
+            self._counts[2 * (w * BUDGET_SLOTS + index) + offset] += 1
+            if good:
+                self._good[w] += 1
+            else:
+                self._bad[w] += 1
+        
+        # a good probe can only lower burn rates, so it can resolve alerts but never start one
+        if good and not any(self.firing):
+            return []
+        return self._check_alerts()
+    
+    def _check_alerts(self):
+        changes = []
+        for a, (name, long_w, short_w, burn_rate, severity) in enumerate(self.policy.alerts):
+            long_burn = self._burn(long_w)
+            short_burn = self._burn(short_w)
+            # both windows have to burn fast: long one for significance, short one so it resets quickly
+            firing = long_burn >= burn_rate and short_burn >= burn_rate
+            if firing != self.firing[a]:
+                self.firing[a] = firing
+                changes.append({'alert': name, 'severity': severity, 'firing': firing, 'burn_rate': burn_rate,
+                                'long_burn': long_burn, 'short_burn': short_burn})
+        return changes
+    
+    """move window w forward to slot, clearing slots that fell out of it, returns the ring index"""
+    def _advance(self, w, slot):
+        current = self._current[w]
+        if current == slot:
+            return slot % BUDGET_SLOTS
+        
+        base = 2 * w * BUDGET_SLOTS
+        counts = self._counts
+        if current is None or slot - current >= BUDGET_SLOTS:
+            # first event or idle for a whole window, start empty
+            if current is not None:
+                for i in range(base, base + 2 * BUDGET_SLOTS):
+                    counts[i] = 0
+                self._good[w] = self._bad[w] = 0
+        elif slot > current:
+            for expired in range(current + 1, slot + 1):
+                i = base + 2 * (expired % BUDGET_SLOTS)
+                self._good[w] -= counts[i]
+                self._bad[w] -= counts[i + 1]
+                counts[i] = counts[i + 1] = 0
+        else:
+            # clock went backwards a little, count it in the newest slot
+            slot = current
+        
+        self._current[w] = slot
+        return slot % BUDGET_SLOTS
+    
+    def _burn(self, w):
+        total = self._good[w] + self._bad[w]
+        if total == 0:
+            return 0.0
+        return (self._bad[w] / total) / self.policy.allowed_bad
+    
+    """how many times faster than allowed the budget is being spent in a window, 1.0 = exactly on budget"""
+    def burn_rate(self, label, timestamp):
+        w = self.policy.window_labels.index(label)
+        if self._current[w] is not None:
+            self._advance(w, math.floor(timestamp / self.policy.slot_widths[w]))
+        return self._burn(w)
+    
+    """burn rate per window, budget left over the period and firing alerts"""
+    def status(self, timestamp):
+        burn = {label: self.burn_rate(label, timestamp) for label in self.policy.window_labels}
+        return {
+            'objective_pct': self.policy.target_pct,
+            'burn_rates': burn,
+            # share of the period's budget still unspent, negative once it is blown
+            'budget_remaining': 1.0 - burn[self.policy.period[0]],
+            'firing': [alert[0] for alert, firing in zip(self.policy.alerts, self.firing) if firing],
+        }
 
 
 """evaluate if target meets its slo requirements"""
 def evaluate_slo(result, slo_config):
-    host = result['host']
-    stats = result['stats']
-    loss_pct = result['loss_pct']
+    # single target is just a batch of one
+    return evaluate_slo_batch([result], slo_config)[0]
+
+
+"""build the threshold matrix for a list of (host, port) targets, one row per target"""
+def slo_threshold_matrix(targets, slo_config):
+    # thresholds are resolved and cached once per distinct target by the config
+    slos = [slo_config.get_slo(host, port) for host, port in targets]
     
-    # get thresholds for this specific host
-    slo = slo_config.get_slo(host)
-    failures = []
+    # columns follow _SLO_LIMIT_KEYS, nan means the check is disabled
+    limits = np.array([slo.limits for slo in slos], dtype=np.float64).reshape(len(slos), len(_SLO_LIMIT_KEYS))
+    return limits, slos
+
+
+"""evaluate many targets at once against a precomputed threshold matrix"""
+def evaluate_slo_batch(results, slo_config):
+    limits, slos = slo_threshold_matrix([(r['host'], r.get('port')) for r in results], slo_config)
+    
+    # observed values in the same column order as the limits
+    observed = np.array(
+        [[_nan_if_none(r['stats']['p95_ms']), _nan_if_none(r['stats']['p99_ms']), r['loss_pct']]
+         for r in results],
+        dtype=np.float64,
+    ).reshape(len(results), len(_SLO_LIMIT_KEYS))
     
     # cant evaluate if all probes failed
-    if stats['p95_ms'] is None:
-        failures.append("All probes failed - no data to evaluate")
-        return {
-            'passed': False,
+    no_data = np.isnan(observed[:, 0])
+    # nan never compares greater so disabled checks never fail
+    exceeded = observed > limits
+    
+    evaluations = []
+    for i, result in enumerate(results):
+        slo = slos[i]
+        
+        if no_data[i]:
+            evaluations.append({
+                'passed': False,
+                'failures': ["All probes failed - no data to evaluate"],
+                'thresholds': slo,
+            })
+            continue
+        
+        # only build messages for the checks that actually failed
+        failures = [
+            _format_failure(column, observed[i, column], limits[i, column])
+            for column in np.flatnonzero(exceeded[i])
+        ]
+        failures += _phase_failures(result, slo)
+        
+        # slo passes only if zero failures
+        evaluations.append({
+            'passed': len(failures) == 0,
             'failures': failures,
             'thresholds': slo,
-        }
+        })
     
+    return evaluations
+
+
+# threshold keys behind each column of the limit matrix: p95, p99, loss
+_SLO_LIMIT_KEYS = ('latency_p95_ms', 'latency_p99_ms', 'max_loss_pct')
+
+
+def _nan_if_none(value):
+    return np.nan if value is None else value
+
+
+"""failure message for one column of the limit matrix"""
+def _format_failure(column, value, limit):
     # check p95 latency threshold
-    if slo['latency_p95_ms'] is not None:
-        if stats['p95_ms'] > slo['latency_p95_ms']:
-            failures.append(
-                f"p95 latency {stats['p95_ms']:.2f}ms exceeds "
-                f"threshold {slo['latency_p95_ms']:.2f}ms"
-            )
-    
+    if column == 0:
+        return f"p95 latency {value:.2f}ms exceeds threshold {limit:.2f}ms"
     # check p99 latency if its configured
-    if slo['latency_p99_ms'] is not None:
-        if stats['p99_ms'] > slo['latency_p99_ms']:
-            failures.append(
-                f"p99 latency {stats['p99_ms']:.2f}ms exceeds "
-                f"threshold {slo['latency_p99_ms']:.2f}ms"
-            )
-    
+    if column == 1:
+        return f"p99 latency {value:.2f}ms exceeds threshold {limit:.2f}ms"
     # check packet loss percentage
-    if slo['max_loss_pct'] is not None:
-        if loss_pct > slo['max_loss_pct']:
-            failures.append(
-                f"Loss {loss_pct:.1f}% exceeds "
-                f"threshold {slo['max_loss_pct']:.1f}%"
-            )
-    
-    # slo passes only if zero failures
-    return {
-        'passed': len(failures) == 0,
-        'failures': failures,
-        'thresholds': slo,
-    }
+    return f"Loss {value:.1f}% exceeds threshold {limit:.1f}%"
+
+
+"""check per-phase latency thresholds (dns, connect, tls, ttfb)"""
+def _phase_failures(result, slo):
+    failures = []
+    phase_stats = result.get('phases', {})
+    
+    for phase, thresholds in (slo.get('phases') or {}).items():
+        stats_for_phase = phase_stats.get(phase)
+        # phase not measured, e.g. tls on plain http or connect on warm connections
+        if not stats_for_phase or stats_for_phase['p95_ms'] is None:
+            continue
+        
+        for pct in ('p95', 'p99'):
+            limit = thresholds.get(f'latency_{pct}_ms')
+            value = stats_for_phase[f'{pct}_ms']
+            if limit is not None and value > limit:
+                failures.append(
+                    f"{phase} {pct} latency {value:.2f}ms exceeds "
+                    f"threshold {limit:.2f}ms"
+                )
+    
+    return failures
@@ -1,44 +1,317 @@
 """statistics calculations for pingslo"""
-import statistics
+import math
+from itertools import chain
+import struct
+from array import array
 import numpy as np
 
 
 """compute avg, p95, p99, min, max from latency measurements"""
 def compute_stats(latencies):
-    count = len(latencies)
-    
-    # handle empty list - all probes failed
-    if count == 0:
-        return {
-            'count': 0,
-            'avg_ms': None,
-            'p95_ms': None,
-            'p99_ms': None,
-            'min_ms': None,
-            'max_ms': None,
-        }
-    
-    # calcualte basic stats from successful measurements
-    avg_ms = statistics.mean(latencies)
-    min_ms = min(latencies)
-    max_ms = max(latencies)
-    
-    # percentiles - method='higher' returns actual observed value not interpolated
+    # sketches carry their own summary, no need for the raw list
+    if isinstance(latencies, LatencySketch):
+        return _sketch_stats(latencies)
+    
+    # single target is just a batch of one
+    return compute_stats_many([latencies])[0]
+
+
+"""compute stats dicts for many latency lists in one numpy pass"""
+def compute_stats_many(latency_lists):
+    values, offsets = pack_latencies(latency_lists)
+    batch = compute_stats_batch(values, offsets)
+    
+    # plain python numbers for json and formatting
+    columns = {name: batch[name].tolist() for name in _STATS_FIELDS}
+    
+    results = []
+    for i in range(len(latency_lists)):
+        # handle empty list - all probes failed
+        if columns['count'][i] == 0:
+            results.append({
+                'count': 0,
+                'avg_ms': None,
+                'p95_ms': None,
+                'p99_ms': None,
+                'min_ms': None,
+                'max_ms': None,
+            })
+            continue
+        
+        results.append({name: columns[name][i] for name in _STATS_FIELDS})
+    
+    return results
+
+
+# stats dict keys in the order compute_stats returns them
+_STATS_FIELDS = ('count', 'avg_ms', 'p95_ms', 'p99_ms', 'min_ms', 'max_ms')
+
+
+"""stats dict of one target from compute_stats_batch output, same shape as compute_stats"""
+def batch_stats_row(batch, i):
+    if batch['count'][i] == 0:
+        return {'count': 0, 'avg_ms': None, 'p95_ms': None, 'p99_ms': None, 'min_ms': None, 'max_ms': None}
+    return {name: batch[name][i].item() for name in _STATS_FIELDS}
+
+
+"""pack per-target latency lists into one ragged values + offsets layout"""
+def pack_latencies(latency_lists):
+    # target i owns values[offsets[i]:offsets[i + 1]]
+    counts = np.fromiter((len(l) for l in latency_lists), dtype=np.int64, count=len(latency_lists))
+    offsets = np.zeros(len(latency_lists) + 1, dtype=np.int64)
+    np.cumsum(counts, out=offsets[1:])
+    
+    values = np.fromiter(chain.from_iterable(latency_lists), dtype=np.float64, count=offsets[-1])
+    
+    return values, offsets
+
+
+"""compute count, avg, min, max, p95, p99 for every target at once"""
+def compute_stats_batch(values, offsets):
+    # returns a dict of arrays indexed by target, nan where a target has no samples
+    n = len(offsets) - 1
+    counts = np.diff(offsets)
+    segment = np.repeat(np.arange(n), counts)
+    
+    # sort by value within each target in one go
+    order = np.lexsort((values, segment))
+    sorted_values = values[order]
+    
+    has_data = counts > 0
+    starts = offsets[:-1]
+    last = np.maximum(counts - 1, 0)
+    
+    sums = np.bincount(segment, weights=values, minlength=n)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        avg = sums / counts
+    
+    return {
+        'count': counts,
+        'avg_ms': np.where(has_data, avg, np.nan),
+        'p95_ms': _batch_percentile(sorted_values, starts, counts, has_data, 95),
+        'p99_ms': _batch_percentile(sorted_values, starts, counts, has_data, 99),
+        'min_ms': _take_or_nan(sorted_values, starts, has_data),
+        'max_ms': _take_or_nan(sorted_values, starts + last, has_data),
+    }
+
+
+"""percentile per target with method='higher' on already sorted segments"""
+def _batch_percentile(sorted_values, starts, counts, has_data, pct):
+    # method='higher' returns actual observed value not interpolated
     # this matters for slo evaluation accuracy
-    if count == 1:
-        # edge case - only one sample so all percentiles are same
-        p95_ms = latencies[0]
-        p99_ms = latencies[0]
-    else:
-        # numpy gives us better control than statistics.quantiles
-        p95_ms = np.percentile(latencies, 95, method='higher')
-        p99_ms = np.percentile(latencies, 99, method='higher')
+    last = np.maximum(counts - 1, 0)
+    rank = np.minimum(np.ceil(last * (pct / 100)).astype(np.int64), last)
+    return _take_or_nan(sorted_values, starts + rank, has_data)
+
+
+def _take_or_nan(sorted_values, indices, has_data):
+    if len(sorted_values) == 0:
+        return np.full(len(indices), np.nan)
+    safe = np.minimum(indices, len(sorted_values) - 1)
+    return np.where(has_data, sorted_values[safe], np.nan)
+
+
+"""same stats dict as compute_stats, read from a sketch"""
+def _sketch_stats(sketch):
+    if sketch.count == 0:
+        return compute_stats([])
     
     return {
-        'count': count,
-        'avg_ms': avg_ms,
-        'p95_ms': p95_ms,
-        'p99_ms': p99_ms,
-        'min_ms': min_ms,
-        'max_ms': max_ms,
+        'count': sketch.count,
+        'avg_ms': sketch.total / sketch.count,
+        'p95_ms': sketch.percentile(95),
+        'p99_ms': sketch.percentile(99),
+        'min_ms': sketch.min,
+        'max_ms': sketch.max,
     }
+
+
+"""compute stats for each latency phase (dns, connect, tls, ttfb)"""
+def compute_phase_stats(phase_latencies):
+    # phase_latencies maps phase name -> list of successful phase times
+    phases = list(phase_latencies)
+    stats = compute_stats_many([phase_latencies[phase] for phase in phases])
+    return dict(zip(phases, stats))
+
+
+"""mergeable bounded-memory latency sketch with relative-error percentiles"""
+class LatencySketch:
+    
+    """keeps raw values up to exact_limit, then log buckets with the given relative error"""
+    def __init__(self, relative_error=0.01, exact_limit=256):
+        # error bound: once bucketed, any percentile is within relative_error of the
+        # exact method='higher' value (ddsketch style log buckets, gamma = (1+a)/(1-a))
+        # below exact_limit samples percentiles are exact
+        self.relative_error = relative_error
+        self.exact_limit = exact_limit
+        self._gamma = (1 + relative_error) / (1 - relative_error)
+        self._log_gamma = math.log(self._gamma)
+        
+        self._values = []     # raw values while small, None once bucketed
+        self._buckets = {}    # bucket index -> count
+        self._zero_count = 0  # values too small for a log bucket
+        
+        # exact running totals so avg/min/max never lose precision
+        self.count = 0
+        self.total = 0.0
+        self.min = None
+        self.max = None
+    
+    """build a sketch from a list of latencies"""
+    @classmethod
+    def from_values(cls, values, **kwargs):
+        sketch = cls(**kwargs)
+        for value in values:
+            sketch.add(value)
+        return sketch
+    
+    """add one latency in milliseconds, O(1)"""
+    def add(self, value):
+        self.count += 1
+        self.total += value
+        if self.min is None or value < self.min:
+            self.min = value
+        if self.max is None or value > self.max:
+            self.max = value
+        
+        if self._values is not None:
+            self._values.append(value)
+            if len(self._values) > self.exact_limit:
+                self._switch_to_buckets()
+        else:
+            self._add_to_bucket(value, 1)
+    
+    def _add_to_bucket(self, value, count):
+        if value <= _SKETCH_MIN_VALUE:
+            self._zero_count += count
+            return
+        index = math.ceil(math.log(value) / self._log_gamma)
+        self._buckets[index] = self._buckets.get(index, 0) + count
+    
+    def _switch_to_buckets(self):
+        values, self._values = self._values, None
+        for value in values:
+            self._add_to_bucket(value, 1)
+    
+    """fold another sketch into this one, returns self"""
+    def merge(self, other):
+        if other.relative_error != self.relative_error:
+            raise ValueError("Cannot merge sketches with different relative error")
+        if other.count == 0:
+            return self
+        
+        if self._values is not None and other._values is not None \
+                and self.count + other.count <= self.exact_limit:
+            # both still small, stay exact
+            self._values.extend(other._values)
+        else:
+            if self._values is not None:
+                self._switch_to_buckets()
+            if other._values is not None:
+                for value in other._values:
+                    self._add_to_bucket(value, 1)
+            else:
+                for index, count in other._buckets.items():
+                    self._buckets[index] = self._buckets.get(index, 0) + count
+                self._zero_count += other._zero_count
+        
+        self.count += other.count
+        self.total += other.total
+        self.min = other.min if self.min is None else min(self.min, other.min)
+        self.max = other.max if self.max is None else max(self.max, other.max)
+        return self
+    
+    """percentile with numpy method='higher' semantics, pct in 0-100"""
+    def percentile(self, pct):
+        if self.count == 0:
+            return None
+        
+        # same index numpy uses for method='higher'
+        rank = min(math.ceil((self.count - 1) * (pct / 100)), self.count - 1)
+        
+        if self._values is not None:
+            return sorted(self._values)[rank]
+        
+        # extremes are tracked exactly
+        if rank == 0:
+            return self.min
+        if rank == self.count - 1:
+            return self.max
+        
+        seen = self._zero_count
+        if rank < seen:
+            return self.min
+        for index in sorted(self._buckets):
+            seen += self._buckets[index]
+            if rank < seen:
+                # midpoint of the bucket in relative terms, clamped to observed range
+                value = 2 * self._gamma ** index / (self._gamma + 1)
+                return min(max(value, self.min), self.max)
+        return self.max
+    
+    """compact binary form for shipping between workers or windows"""
+    def to_bytes(self):
+        exact = self._values is not None
+        header = struct.pack(
+            _SKETCH_HEADER,
+            _SKETCH_VERSION,
+            exact,
+            self.relative_error,
+            self.exact_limit,
+            self.count,
+            self.total,
+            self.min if self.min is not None else math.nan,
+            self.max if self.max is not None else math.nan,
+            self._zero_count,
+        )
+        
+        if exact:
+            body = array('d', self._values)
+            return header + struct.pack('<I', len(body)) + body.tobytes()
+        
+        indices = sorted(self._buckets)
+        return (header + struct.pack('<I', len(indices))
+                + array('i', indices).tobytes()
+                + array('Q', [self._buckets[i] for i in indices]).tobytes())
+    
+    """rebuild a sketch from to_bytes output"""
+    @classmethod
+    def from_bytes(cls, data):
+        header_size = struct.calcsize(_SKETCH_HEADER)
+        (version, exact, relative_error, exact_limit, count, total,
+         min_value, max_value, zero_count) = struct.unpack_from(_SKETCH_HEADER, data)
+        if version != _SKETCH_VERSION:
+            raise ValueError(f"Unsupported sketch version: {version}")
+        
+        sketch = cls(relative_error=relative_error, exact_limit=exact_limit)
+        sketch.count = count
+        sketch.total = total
+        sketch.min = None if math.isnan(min_value) else min_value
+        sketch.max = None if math.isnan(max_value) else max_value
+        sketch._zero_count = zero_count
+        
+        (entries,) = struct.unpack_from('<I', data, header_size)
+        offset = header_size + 4
+        
+        if exact:
+            values = array('d')
+            values.frombytes(data[offset:offset + 8 * entries])
+            sketch._values = values.tolist()
+        else:
+            indices = array('i')
+            indices.frombytes(data[offset:offset + indices.itemsize * entries])
+            offset += indices.itemsize * entries
+            counts = array('Q')
+            counts.frombytes(data[offset:offset + counts.itemsize * entries])
+            sketch._values = None
+            sketch._buckets = dict(zip(indices, counts))
+        
+        return sketch
+
+
+# values at or below this (ms) go in the zero bucket instead of a log bucket
+_SKETCH_MIN_VALUE = 1e-6
+
+# version, exact flag, relative error, exact limit, count, total, min, max, zero count
+_SKETCH_HEADER = '<B?dIQdddQ'
+_SKETCH_VERSION = 1
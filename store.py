@@ -0,0 +1,57 @@
+"""compact per-sample outcome codes and a lazy result view over many targets"""
+from collections.abc import Sequence
+import numpy as np
+from stats import batch_stats_row, compute_stats_batch, pack_latencies
+
+
+# outcome of each sample, stored as one signed byte per sample
+OUTCOME_OK = 0
+OUTCOME_FAILED = 1           # timeout or error
+OUTCOME_SHORT_CIRCUITED = 2  # not probed, the target's breaker was open
+OUTCOME_CONGESTED = 3        # ok but measured while the event loop lagged, kept in the stats
+OUTCOME_EXCLUDED = 4         # ok but measured while the event loop lagged, left out of the stats
+
+# outcomes whose latency is stored
+MEASURED_OUTCOMES = (OUTCOME_OK, OUTCOME_CONGESTED)
+
+
+"""result dicts of many targets, built on access from one batched stats pass"""
+class ResultView(Sequence):
+    
+    # only the targets and a few numpy columns per metric stay in memory, not a dict per target
+    def __init__(self, targets):
+        self.targets = list(targets)
+        self._stats = compute_stats_batch(*pack_latencies([target.latencies for target in self.targets]))
+        
+        # each phase is batched across the targets that measured it, rows maps target -> batch row
+        self._phases = {}
+        phase_names = {}
+        for target in self.targets:
+            phase_names.update(dict.fromkeys(target.phase_latencies))
+        for phase in phase_names:
+            owners = [i for i, target in enumerate(self.targets) if phase in target.phase_latencies]
+            rows = np.full(len(self.targets), -1, dtype=np.int64)
+            rows[owners] = np.arange(len(owners))
+            batch = compute_stats_batch(*pack_latencies([self.targets[i].phase_latencies[phase] for i in owners]))
+            self._phases[phase] = (batch, rows)
+    
+    def __len__(self):
+        return len(self.targets)
+    
+    """result dict of target i in the TargetSamples.to_result shape"""
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self)))]
+        if index < 0:
+            index += len(self.targets)
+        target = self.targets[index]
+        
+        phase_stats = {}
+        for phase in target.phase_latencies:
+            batch, rows = self._phases[phase]
+            phase_stats[phase] = batch_stats_row(batch, rows[index])
+        return target.to_result(batch_stats_row(self._stats, index), phase_stats)
+    
+    """raw samples of target i for re-analysis: send time, outcome code and latency (nan unless ok)"""
+    def samples(self, index):
+        return self.targets[index].samples()
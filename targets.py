@@ -0,0 +1,196 @@
+"""streaming target loader with dedup, ipv6 literals, stdin/directory sources and hot reload"""
+import ipaddress
+import os
+import sys
+from collections import namedtuple
+from pathlib import Path
+
+
+# scheme is None when the target didnt say, the port decides then (443 -> https)
+Target = namedtuple('Target', ['host', 'port', 'scheme'])
+
+# schemes a target line may start with and their default ports
+_SCHEMES = {'https': 443, 'http': 80}
+
+# a line without a scheme or port is probed on this port
+DEFAULT_PORT = 443
+
+
+"""parse target string into a Target, accepts host, host:port, [v6]:port and http(s):// urls"""
+def parse_target(target_str):
+    text = target_str.strip()
+    scheme = None
+    default_port = DEFAULT_PORT
+    
+    # handle urls with protocol prefix
+    if '://' in text:
+        scheme, text = text.split('://', 1)
+        scheme = scheme.lower()
+        if scheme not in _SCHEMES:
+            raise ValueError(f"Unsupported scheme: {scheme}")
+        default_port = _SCHEMES[scheme]
+    
+    # keep only the host[:port] part, drop /path, ?query and #fragment
+    for separator in '/?#':
+        text = text.split(separator, 1)[0]
+    
+    port_str = None
+    if text.startswith('['):
+        # ipv6 literal, the port comes after the closing bracket
+        host, bracket, rest = text[1:].partition(']')
+        if not bracket:
+            raise ValueError(f"Missing ']' in IPv6 target: {target_str}")
+        if rest:
+            if not rest.startswith(':'):
+                raise ValueError(f"Invalid target format: {target_str}")
+            port_str = rest[1:]
+        _check_ipv6(host, target_str)
+    elif text.count(':') > 1:
+        # bare ipv6 literal without a port
+        host = text
+        _check_ipv6(host, target_str)
+    elif ':' in text:
+        host, port_str = text.split(':')
+    else:
+        host = text
+    
+    if port_str is not None:
+        try:
+            port = int(port_str)
+        except ValueError:
+            raise ValueError(f"Invalid port number: {port_str}")
+        # valid tcp port range
+        if not (1 <= port <= 65535):
+            raise ValueError(f"Port must be 1-65535: {port}")
+    else:
+        port = default_port
+    
+    if not host:
+        raise ValueError(f"Empty hostname in: {target_str}")
+    
+    return Target(host, port, scheme)
+
+
+def _check_ipv6(host, target_str):
+    try:
+        ipaddress.IPv6Address(host.split('%', 1)[0])
+    except ValueError:
+        raise ValueError(f"Invalid IPv6 address in: {target_str}")
+
+
+"""host, port and scheme of a target tuple, plain (host, port) tuples have no scheme"""
+def split_target(target):
+    return target[0], target[1], target[2] if len(target) > 2 else None
+
+
+"""scheme the http probe will use for a target"""
+def effective_scheme(port, scheme=None):
+    if scheme is not None:
+        return scheme
+    return 'https' if port == 443 else 'http'
+
+
+"""dedup key, the same endpoint written two ways is probed once"""
+def target_key(target):
+    host, port, scheme = split_target(target)
+    return effective_scheme(port, scheme), host.lower().rstrip('.'), port
+
+
+"""stream (source name, line number, Target or ValueError) from files, directories or '-' for stdin"""
+def iter_target_lines(sources):
+    for source in sources:
+        if source == '-':
+            yield from _parse_lines('<stdin>', sys.stdin)
+            continue
+        
+        for path in expand_source(source):
+            with open(path, 'r') as f:
+                yield from _parse_lines(str(path), f)
+
+
+def _parse_lines(name, lines):
+    for line_num, line in enumerate(lines, start=1):
+        line = line.strip()
+        
+        # skip empty lines and comments
+        if not line or line.startswith('#'):
+            continue
+        
+        try:
+            yield name, line_num, parse_target(line)
+        except ValueError as e:
+            yield name, line_num, e
+
+
+"""files behind a source: the file itself, or every visible file in a directory in name order"""
+def expand_source(source):
+    path = Path(source)
+    if path.is_dir():
+        return sorted(p for p in path.iterdir() if p.is_file() and not p.name.startswith('.'))
+    if not path.exists():
+        raise FileNotFoundError(f"File not found: {source}")
+    return [path]
+
+
+"""deduplicated targets from one or more sources, re-readable to get add/remove diffs"""
+class TargetLoader:
+    
+    def __init__(self, sources):
+        self.sources = list(sources)
+        self.targets = {}   # dedup key -> Target, in first-seen order
+        self.errors = []    # "source line N: message" from the last load
+        self.duplicates = 0
+        self._stamps = None  # file -> (mtime, size) when last read
+    
+    """read every source, returns the list of unique targets"""
+    def load(self):
+        self.targets, self.errors, self.duplicates = self._read()
+        self._stamps = self._file_stamps()
+        return list(self.targets.values())
+    
+    def _read(self):
+        targets = {}
+        errors = []
+        duplicates = 0
+        for name, line_num, parsed in iter_target_lines(self.sources):
+            if isinstance(parsed, ValueError):
+                errors.append(f"{name} line {line_num}: {parsed}")
+                continue
+            key = target_key(parsed)
+            if key in targets:
+                duplicates += 1
+            else:
+                targets[key] = parsed
+        return targets, errors, duplicates
+    
+    """stdin can only be read once, so only file sources can be watched"""
+    def watchable(self):
+        return '-' not in self.sources
+    
+    def _file_stamps(self):
+        if not self.watchable():
+            return None
+        stamps = {}
+        for source in self.sources:
+            try:
+                for path in expand_source(source):
+                    stat = path.stat()
+                    stamps[str(path)] = (stat.st_mtime_ns, stat.st_size)
+            except FileNotFoundError:
+                # a file vanishing mid edit reads as no targets from it
+                continue
+        return stamps
+    
+    """re-read the sources if any file changed, returns (added, removed) target lists"""
+    def reload(self):
+        stamps = self._file_stamps()
+        if stamps is None or stamps == self._stamps:
+            return [], []
+        
+        targets, errors, duplicates = self._read()
+        self._stamps = stamps
+        
+        added = [target for key, target in targets.items() if key not in self.targets]
+        removed = [target for key, target in self.targets.items() if key not in targets]
+        self.targets, self.errors, self.duplicates = targets, errors, duplicates
+        return added, removed
@@ -1,24 +1,28 @@
 """tcp connection time probing"""
 import asyncio
+import socket
 import time
+from events import emit
 
 
 """measure tcp connection time in milliseconds"""
-async def tcp_probe(host, port=443, timeout=5.0):
-    # start timer before connection attempt
-    start = time.perf_counter()
+async def tcp_probe(host, port=443, timeout=5.0, phases=None, resolver=None, include_dns=False):
+    # phases gets dns and connect times filled in separately
+    if phases is None:
+        phases = {}
+    phases.clear()
     
     try:
-        # asyncio.open_connection does tcp handshake (SYN, SYN-ACK, ACK)
-        # wait_for wraps it with timeout to avoid hanging forever
-        reader, writer = await asyncio.wait_for(
-            asyncio.open_connection(host, port),
+        # wait_for wraps both steps with timeout to avoid hanging forever
+        writer = await asyncio.wait_for(
+            _resolve_and_connect(host, port, phases, resolver),
             timeout=timeout
         )
         
-        # stop timer as soon as connection succeeds
-        elapsed = time.perf_counter() - start
-        elapsed_ms = elapsed * 1000
+        # connect time only, dns is measured separately unless asked for
+        elapsed_ms = phases['connect']
+        if include_dns:
+            elapsed_ms += phases['dns']
         
         # cleanup - close socket immediately since we dont need it
         writer.close()
@@ -28,8 +32,102 @@ async def tcp_probe(host, port=443, timeout=5.0):
         
     except asyncio.TimeoutError:
         # took too long, count as failure
+        emit('timeout', f"{host}:{port}", 'connect', 'TimeoutError')
         return None
     except OSError as e:
         # connection refused, network unreachable, dns failure, etc
-        print(f"  Error connecting to {host}:{port} - {e}")
+        # queued not printed, a terminal write per failure would stall the probes still in flight
+        emit('error', f"{host}:{port}", 'connect', type(e).__name__, str(e))
         return None
+
+
+"""resolve host then connect to its addresses, timing each step, returns the writer"""
+async def _resolve_and_connect(host, port, phases, resolver):
+    addr_infos = await _resolve(host, port, phases, resolver)
+    
+    # start timer before connection attempt
+    # connect to the resolved addresses in order like open_connection does
+    connect_start = time.perf_counter()
+    last_error = None
+    for family, type_, proto, _, address in addr_infos:
+        try:
+            # asyncio.open_connection does tcp handshake (SYN, SYN-ACK, ACK)
+            reader, writer = await asyncio.open_connection(address[0], address[1])
+        except OSError as e:
+            last_error = e
+            continue
+        
+        # stop timer as soon as connection succeeds
+        phases['connect'] = (time.perf_counter() - connect_start) * 1000
+        return writer
+    
+    raise last_error or OSError(f"No addresses found for {host}")
+
+
+"""name resolution on its own so it doesnt get mixed into connect time"""
+async def _resolve(host, port, phases, resolver):
+    dns_start = time.perf_counter()
+    if resolver is not None:
+        addr_infos = await resolver.resolve(host, port)
+    else:
+        loop = asyncio.get_running_loop()
+        addr_infos = await loop.getaddrinfo(host, port, type=socket.SOCK_STREAM)
+    phases['dns'] = (time.perf_counter() - dns_start) * 1000
+    return addr_infos
+
+
+"""measure tcp connection time with a bare non-blocking socket"""
+async def tcp_probe_socket(host, port=443, timeout=5.0, phases=None, resolver=None, include_dns=False):
+    # no StreamReader, StreamWriter or protocol objects, just sock_connect
+    # so there is less work per connect and less noise around the timestamps
+    if phases is None:
+        phases = {}
+    phases.clear()
+    
+    try:
+        await asyncio.wait_for(_resolve_and_sock_connect(host, port, phases, resolver), timeout=timeout)
+    except asyncio.TimeoutError:
+        # took too long, count as failure
+        emit('timeout', f"{host}:{port}", 'connect', 'TimeoutError')
+        return None
+    except OSError as e:
+        # connection refused, network unreachable, dns failure, etc
+        emit('error', f"{host}:{port}", 'connect', type(e).__name__, str(e))
+        return None
+    
+    # connect time only, dns is measured separately unless asked for
+    elapsed_ms = phases['connect']
+    if include_dns:
+        elapsed_ms += phases['dns']
+    return elapsed_ms
+
+
+"""resolve then connect a bare socket to each address until one succeeds"""
+async def _resolve_and_sock_connect(host, port, phases, resolver):
+    addr_infos = await _resolve(host, port, phases, resolver)
+    loop = asyncio.get_running_loop()
+    
+    last_error = None
+    elapsed = 0.0
+    for family, type_, proto, _, address in addr_infos:
+        sock = socket.socket(family, socket.SOCK_STREAM, proto)
+        try:
+            sock.setblocking(False)
+            # timestamps right around the handshake itself, socket setup is not counted
+            connect_start = time.perf_counter()
+            try:
+                await loop.sock_connect(sock, address)
+            finally:
+                # failed attempts still count toward connect time like the stream engine
+                elapsed += time.perf_counter() - connect_start
+        except OSError as e:
+            last_error = e
+            continue
+        finally:
+            # close right away, we only wanted the handshake
+            sock.close()
+        
+        phases['connect'] = elapsed * 1000
+        return
+    
+    raise last_error or OSError(f"No addresses found for {host}")
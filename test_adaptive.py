@@ -0,0 +1,79 @@
+"""test a target far under or far over its threshold settles after the minimum samples"""
+def test_verdict_settles_early():
+    from adaptive import AdaptivePolicy
+    from slo import SLOConfig
+    
+    config = SLOConfig()
+    config.default_slo = {**config.default_slo, 'max_loss_pct': None}
+    policy = AdaptivePolicy(config, confidence=0.95, min_samples=5, max_samples=200)
+    
+    slow = policy.tracker('slow.example.com', 443)
+    for _ in range(5):
+        slow.add(500.0, {})
+    assert slow.verdict == 'fail' and slow.done()
+    
+    # latencies far under the threshold settle a pass without ~50 samples to count out a 5% tail
+    fast = policy.tracker('fast.example.com', 443)
+    count = 0
+    while not fast.done():
+        fast.add(10.0 + count % 3, {})
+        count += 1
+    assert fast.verdict == 'pass'
+    assert count == 5
+
+
+"""test a clean target settles near the minimum under the shipped config's p95, p99 and loss thresholds"""
+def test_clean_target_settles_with_shipped_config():
+    from pathlib import Path
+    from adaptive import AdaptivePolicy
+    from slo import SLOConfig
+    
+    config = SLOConfig(Path(__file__).with_name('config.yaml'))
+    assert config.default_slo['latency_p99_ms'] is not None
+    policy = AdaptivePolicy(config, confidence=0.95, min_samples=5, max_samples=100)
+    
+    tracker = policy.tracker('clean.example.com', 443)
+    latencies = [12.0, 14.5, 11.8, 13.1, 16.2, 12.4, 12.9, 15.0, 11.5, 13.7]
+    for latency in latencies:
+        tracker.add(latency, {'connect': latency * 0.8})
+        if tracker.done():
+            break
+    assert tracker.verdict == 'pass'
+    assert tracker.attempts == policy.min_samples
+    
+    # one in five probes failing is surely over 5% loss well before the cap
+    lossy = policy.tracker('lossy.example.com', 443)
+    for i in range(100):
+        lossy.add(None if i % 5 == 0 else 12.0, {})
+        if lossy.done():
+            break
+    assert lossy.verdict == 'fail' and lossy.attempts < 100
+
+
+"""test a borderline target samples up to the cap without settling"""
+def test_borderline_hits_cap():
+    from adaptive import AdaptivePolicy
+    from slo import SLOConfig
+    
+    policy = AdaptivePolicy(SLOConfig(), min_samples=5, max_samples=50)
+    tracker = policy.tracker('example.com', 443)
+    
+    # one in twenty over the threshold sits right on the p95 limit
+    for i in range(50):
+        tracker.add(500.0 if i % 20 == 0 else 10.0, {})
+    
+    assert tracker.done()
+    assert tracker.verdict is None
+    assert tracker.summary()['samples'] == 50
+
+
+"""test wilson bounds contain the observed share and tighten with more samples"""
+def test_wilson_bounds():
+    from adaptive import wilson_bounds
+    
+    low, high = wilson_bounds(5, 100, 1.96)
+    wide_low, wide_high = wilson_bounds(1, 20, 1.96)
+    
+    assert low < 0.05 < high
+    assert wide_high - wide_low > high - low
+    assert wilson_bounds(0, 10, 1.96)[0] == 0.0
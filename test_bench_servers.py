@@ -0,0 +1,21 @@
+import asyncio
+
+
+"""test the stand-in servers: head rejection falls back to get and the delay shows in ttfb"""
+def test_bench_servers_head_reject_and_delay():
+    from bench_servers import BenchServers, ServerSpec
+    from http_probe import http_probe_with_fallback
+    
+    specs = [ServerSpec('slow', delay=0.05), ServerSpec('no_head', reject_head=True)]
+    
+    with BenchServers(specs) as servers:
+        async def run():
+            slow = await http_probe_with_fallback(f"http://127.0.0.1:{servers.ports['slow']}")
+            no_head = await http_probe_with_fallback(f"http://127.0.0.1:{servers.ports['no_head']}")
+            return slow, no_head
+        
+        (slow_ms, slow_method), (_, no_head_method) = asyncio.run(run())
+    
+    assert slow_method == 'HEAD'
+    assert slow_ms >= 50
+    assert no_head_method == 'GET'
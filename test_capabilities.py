@@ -0,0 +1,44 @@
+import asyncio
+
+
+"""test learned capabilities survive a save and load, and expire after the ttl"""
+def test_capability_cache_persists_and_expires(tmp_path):
+    import time
+    from capabilities import CapabilityCache
+    
+    path = tmp_path / 'caps.json'
+    info = {'method': 'GET', 'url': 'https://example.com/', 'scheme': 'https', 'http_version': '1.1',
+            'redirected': True}
+    
+    cache = CapabilityCache(path)
+    cache.learn('example.com:443', info)
+    cache.learn('old.example.com:443', {**info, 'learned_at': time.time() - 7200})
+    cache.save()
+    
+    reloaded = CapabilityCache(path, ttl=3600)
+    assert reloaded.get('example.com:443')['method'] == 'GET'
+    assert reloaded.get('old.example.com:443') is None
+    assert (reloaded.hits, reloaded.misses) == (1, 1)
+    
+    reloaded.invalidate('example.com:443')
+    assert reloaded.invalidations == 1
+
+
+"""test discovery learns get for a head-rejecting server and https on a non-443 port"""
+def test_run_learns_method_and_scheme():
+    from bench_servers import BenchServers, ServerSpec
+    from capabilities import CapabilityCache
+    from runner import run_probes
+    
+    specs = [ServerSpec('no_head', reject_head=True), ServerSpec('tls', kind='https')]
+    
+    with BenchServers(specs) as servers:
+        targets = [('127.0.0.1', servers.ports['no_head']), ('127.0.0.1', servers.ports['tls'])]
+        cache = CapabilityCache()
+        results = asyncio.run(run_probes(targets, num_probes=3, interval=0, mode='http', capabilities=cache))
+    
+    no_head, tls = [r['http_capability'] for r in results]
+    assert no_head['method'] == 'GET'
+    assert tls['url'].startswith('https://')
+    assert all(r['loss_pct'] == 0.0 for r in results)
+    assert cache.learned == 2
@@ -0,0 +1,132 @@
+import asyncio
+
+
+"""test an agent leaving the ring only moves the targets it owned"""
+def test_hash_ring_minimal_reassignment():
+    from distributed import HashRing
+    
+    keys = [f"10.0.0.{i}|443" for i in range(500)]
+    ring = HashRing(['a', 'b', 'c'])
+    before = {key: ring.nodes_for(key)[0] for key in keys}
+    
+    # every agent gets a fair share
+    for node in 'abc':
+        assert sum(1 for owner in before.values() if owner == node) > 100
+    
+    ring.remove('c')
+    after = {key: ring.nodes_for(key)[0] for key in keys}
+    
+    moved = [key for key in keys if before[key] != after[key]]
+    assert moved and all(before[key] == 'c' for key in moved)
+    assert ring.nodes_for(keys[0], 5) in (['a', 'b'], ['b', 'a'])
+
+
+"""test several local agents probe every target from two vantage points and the coordinator merges them"""
+def test_run_distributed_merges_agents():
+    from distributed import run_distributed, serve_agent
+    from slo import SLOConfig, evaluate_slo_batch
+    
+    async def run():
+        listener = await asyncio.start_server(lambda r, w: w.close(), '127.0.0.1', 0)
+        open_port = listener.sockets[0].getsockname()[1]
+        
+        ports = []
+        agents = [asyncio.ensure_future(serve_agent('127.0.0.1', 0, f"agent{i}", on_ready=ports.append))
+                  for i in range(3)]
+        while len(ports) < 3:
+            await asyncio.sleep(0.01)
+        
+        # a dead agent address is skipped, the live ones share its work
+        addresses = [f"127.0.0.1:{port}" for port in ports] + ['127.0.0.1:1']
+        targets = [('127.0.0.1', open_port), ('localhost', open_port), ('127.0.0.1', 1)]
+        try:
+            return await run_distributed(targets, addresses, replicas=2, num_probes=4, timeout=1.0, interval=0.0)
+        finally:
+            for agent in agents:
+                agent.cancel()
+            listener.close()
+    
+    results = asyncio.run(run())
+    
+    assert len(results) == 3
+    for result in results:
+        assert len(result['agents']) == 2
+        assert result['samples'] == 8
+        assert sum(agent['samples'] for agent in result['agents'].values()) == 8
+    
+    assert results[0]['stats']['count'] == 8
+    assert results[0]['loss_pct'] == 0.0
+    assert results[2]['loss_pct'] == 100.0
+    
+    # merged results evaluate like local ones
+    evaluations = evaluate_slo_batch(results, SLOConfig())
+    assert evaluations[0]['passed'] and not evaluations[2]['passed']
+
+
+"""test agents honor adaptive sampling and the timeout policy like a local run"""
+def test_run_distributed_adaptive():
+    from adaptive import AdaptivePolicy
+    from distributed import run_distributed, serve_agent
+    from slo import SLOConfig
+    from timeouts import TimeoutPolicy
+    
+    async def run():
+        listener = await asyncio.start_server(lambda r, w: w.close(), '127.0.0.1', 0)
+        open_port = listener.sockets[0].getsockname()[1]
+        
+        ports = []
+        agents = [asyncio.ensure_future(serve_agent('127.0.0.1', 0, f"agent{i}", on_ready=ports.append))
+                  for i in range(2)]
+        while len(ports) < 2:
+            await asyncio.sleep(0.01)
+        
+        config = SLOConfig()
+        config.target_slos = {'127.0.0.1:1': {'max_loss_pct': 50.0}}
+        adaptive = AdaptivePolicy(config, min_samples=5, max_samples=40)
+        timeouts = TimeoutPolicy(ceiling=1.0, floor=0.1, failures=3, cooldown=60.0)
+        try:
+            return await run_distributed([('127.0.0.1', open_port), ('127.0.0.1', 1)],
+                                         [f"127.0.0.1:{port}" for port in ports], replicas=2, interval=0.0,
+                                         timeout=1.0, adaptive=adaptive, timeouts=timeouts)
+        finally:
+            for agent in agents:
+                agent.cancel()
+            listener.close()
+    
+    up, down = asyncio.run(run())
+    
+    # the local listener settles at the minimum on both agents instead of the fixed 10 samples
+    assert up['sampling']['verdict'] == 'pass'
+    assert up['samples'] == 10
+    assert all(agent['sampling']['samples'] == 5 for agent in up['agents'].values())
+    
+    # a closed port fails fast, and the breaker short circuits once it counts the target down
+    assert down['sampling']['verdict'] == 'fail'
+    assert down['short_circuited'] > 0
+
+
+"""test an agent off loopback needs a token, and one with a token only takes jobs from coordinators holding it"""
+def test_agent_token():
+    import pytest
+    from distributed import AgentConnection, run_distributed, serve_agent
+    
+    with pytest.raises(ValueError):
+        asyncio.run(serve_agent('0.0.0.0', 0, 'open'))
+    
+    async def run():
+        ports = []
+        agent = asyncio.ensure_future(serve_agent('127.0.0.1', 0, 'agent', on_ready=ports.append, token='s3cret'))
+        while not ports:
+            await asyncio.sleep(0.01)
+        address = f"127.0.0.1:{ports[0]}"
+        try:
+            for token in (None, 'wrong'):
+                with pytest.raises(ConnectionError):
+                    await AgentConnection.connect(address, token=token)
+            return await run_distributed([('127.0.0.1', 1)], [address], token='s3cret', num_probes=2, timeout=1.0,
+                                         interval=0.0)
+        finally:
+            agent.cancel()
+    
+    results = asyncio.run(run())
+    assert list(results[0]['agents']) == ['agent'] and results[0]['samples'] == 2
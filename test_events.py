@@ -0,0 +1,101 @@
+import asyncio
+import io
+
+
+"""test many targets failing the same way print as one summary line, a few print one line each"""
+def test_console_sink_aggregates_errors():
+    from events import ConsoleSink, EventBus
+    
+    stream = io.StringIO()
+    bus = EventBus()
+    bus.add_sink(ConsoleSink(stream, detail_limit=3))
+    
+    for i in range(312):
+        bus.emit('error', f"10.0.0.{i}:443", 'connect', 'ConnectionRefusedError', '[Errno 111] Connection refused')
+    bus.emit('error', 'http://a.example:80', 'http', 'ClientResponseError', '503')
+    bus.emit('timeout', 'b.example:443', 'connect', 'TimeoutError')
+    asyncio.run(bus.drain())
+    
+    lines = stream.getvalue().splitlines()
+    assert len(lines) == 2
+    assert lines[0].startswith('  312 targets: ConnectionRefusedError connecting to')
+    assert lines[1] == '  Error probing http://a.example:80 - ClientResponseError: 503'
+
+
+"""test a full queue drops and counts events instead of blocking, the ndjson sink records both"""
+def test_bounded_queue_and_ndjson_sink(tmp_path):
+    import json
+    from events import EventBus, NDJSONEventSink
+    
+    path = tmp_path / 'events.ndjson'
+    bus = EventBus(maxsize=10)
+    bus.add_sink(NDJSONEventSink(path))
+    
+    for i in range(25):
+        bus.emit('timeout', f"host{i}:443", 'connect', 'TimeoutError')
+    assert bus.dropped == 15
+    asyncio.run(bus.drain())
+    bus.close()
+    
+    records = [json.loads(line) for line in path.read_text().splitlines()]
+    assert len(records) == 11
+    assert records[0]['target'] == 'host0:443' and records[0]['error'] == 'TimeoutError'
+    assert records[-1] == {'ts': records[-1]['ts'], 'kind': 'dropped', 'count': 15}
+
+
+"""test probe errors inside a pipeline reach the metrics error counters"""
+def test_pipeline_counts_errors_in_metrics():
+    from events import open_event_pipeline
+    from metrics import ProbeMetrics
+    from tcp_probe import tcp_probe
+    
+    metrics = ProbeMetrics()
+    
+    async def run():
+        async with open_event_pipeline(console=False, metrics=metrics):
+            return await tcp_probe('127.0.0.1', 1, timeout=1.0)
+    
+    assert asyncio.run(run()) is None
+    assert metrics.errors == {'ConnectionRefusedError': 1}
+    assert 'quickprobe_probe_errors_total{error="ConnectionRefusedError"} 1' in metrics.render()
+
+
+"""test leaving a pipeline waits for the write in the worker thread, batches never overlap or land after close"""
+def test_pipeline_close_waits_for_inflight_write():
+    import time
+    from events import emit, open_event_pipeline
+    
+    class SlowSink:
+        blocking = True
+        
+        def __init__(self):
+            self.targets = []
+            self.closed = False
+            self.writing = 0
+            self.overlapped = False
+            self.late = False
+        
+        def write(self, batch, dropped=0):
+            self.writing += 1
+            self.overlapped = self.overlapped or self.writing > 1
+            time.sleep(0.2)
+            self.late = self.late or self.closed
+            self.targets.extend(event.target for event in batch)
+            self.writing -= 1
+        
+        def close(self):
+            self.closed = True
+    
+    sink = SlowSink()
+    
+    async def run():
+        async with open_event_pipeline(console=False, interval=0.01) as bus:
+            bus.add_sink(sink)
+            emit('error', 'a.example:443', 'connect', 'OSError')
+            # the first batch is in the worker thread when the block ends
+            await asyncio.sleep(0.05)
+            emit('error', 'b.example:443', 'connect', 'OSError')
+    
+    asyncio.run(run())
+    assert sink.targets == ['a.example:443', 'b.example:443']
+    assert sink.closed and not sink.late and not sink.overlapped
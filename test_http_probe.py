@@ -0,0 +1,77 @@
+import asyncio
+
+
+"""test resumed handshakes after the first one are split out as their own tls phase"""
+def test_tls_session_resumption():
+    from bench_servers import BenchServers, ServerSpec
+    from http_probe import HTTPClient, http_probe
+    
+    with BenchServers([ServerSpec('tls', kind='https')]) as servers:
+        url = f"https://127.0.0.1:{servers.ports['tls']}"
+        
+        async def run():
+            async with HTTPClient(tls_resume=True) as client:
+                phases = []
+                for _ in range(3):
+                    sample = {}
+                    assert await http_probe(url, 5.0, 'HEAD', client, 'cold', sample) is not None
+                    phases.append(sample)
+                return client.tls_stats(), phases
+        
+        stats, phases = asyncio.run(run())
+    
+    assert stats['full'] == 1 and stats['resumed'] == 2
+    assert 'tls_full' in phases[0]
+    assert all(p['tls_resumed'] == p['tls'] for p in phases[1:])
+
+
+"""test cold probes open a connection every sample while warm probes reuse the first one"""
+def test_connection_pool_reuse():
+    from bench_servers import BenchServers, ServerSpec
+    from http_probe import HTTPClient, http_probe
+    
+    with BenchServers([ServerSpec('web')]) as servers:
+        url = f"http://127.0.0.1:{servers.ports['web']}"
+        
+        async def run(connection):
+            async with HTTPClient() as client:
+                for _ in range(3):
+                    assert await http_probe(url, 5.0, 'HEAD', client, connection) is not None
+                return client.pool_stats()
+        
+        cold = asyncio.run(run('cold'))
+        warm = asyncio.run(run('warm'))
+    
+    assert cold == {'hits': 0, 'misses': 3, 'hit_rate': 0.0}
+    assert warm['hits'] == 2 and warm['misses'] == 1
+
+
+"""test a target that accepts connections but never answers costs one timeout per sample"""
+def test_blackholed_http_costs_one_timeout():
+    from runner import run_probes
+    
+    async def run():
+        held = []
+        
+        async def blackhole(reader, writer):
+            held.append(writer)
+            await reader.read()
+        
+        server = await asyncio.start_server(blackhole, '127.0.0.1', 0)
+        port = server.sockets[0].getsockname()[1]
+        loop = asyncio.get_running_loop()
+        start = loop.time()
+        try:
+            # no learned capability, so every sample goes through discovery with head, get and scheme retry
+            results = await run_probes([('127.0.0.1', port)], num_probes=3, timeout=0.3, interval=0.0,
+                                       mode='http')
+        finally:
+            for writer in held:
+                writer.close()
+            server.close()
+        return results, loop.time() - start
+    
+    results, elapsed = asyncio.run(run())
+    
+    assert results[0]['loss_pct'] == 100.0
+    assert elapsed < 3 * 0.3 + 0.4
@@ -0,0 +1,23 @@
+"""test histogram buckets are cumulative and loss/slo come from recorded samples"""
+def test_metrics_render():
+    from metrics import ProbeMetrics
+    
+    metrics = ProbeMetrics()
+    metrics.add_target(0, 'example.com', 443)
+    for latency in [2.0, 20.0, 200.0]:
+        metrics.observe(0, latency)
+    metrics.observe(0, None)
+    metrics.set_slo(0, False, '5m')
+    
+    text = metrics.render()
+    
+    assert 'quickprobe_probe_latency_seconds_bucket{target="example.com:443",le="0.0025"} 1' in text
+    assert 'quickprobe_probe_latency_seconds_bucket{target="example.com:443",le="0.25"} 3' in text
+    assert 'quickprobe_probe_latency_seconds_count{target="example.com:443"} 3' in text
+    assert 'quickprobe_loss_ratio{target="example.com:443"} 0.25' in text
+    assert 'quickprobe_slo_passed{target="example.com:443",window="5m"} 0' in text
+    assert 'quickprobe_probes_total 4' in text
+    
+    openmetrics = metrics.render(openmetrics=True)
+    assert '# TYPE quickprobe_probes counter' in openmetrics
+    assert openmetrics.endswith('# EOF\n')
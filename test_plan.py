@@ -0,0 +1,34 @@
+"""test a plan is reused while its inputs are unchanged and rebuilt once a target file changes"""
+def test_plan_cache_reuse_and_invalidation(tmp_path):
+    import os
+    from plan import PlanCache
+    from slo import SLOConfig
+    from targets import TargetLoader
+    
+    targets_path = tmp_path / 'targets.txt'
+    targets_path.write_text("a.example\nb.example:8443\nbad line ::\na.example\n")
+    config_path = tmp_path / 'config.yaml'
+    config_path.write_text("default_slo:\n  latency_p95_ms: 250\n")
+    sources = [str(targets_path)]
+    
+    loader = TargetLoader(sources)
+    loader.load()
+    plan = PlanCache(tmp_path / 'plan.pickle')
+    assert plan.load(sources, str(config_path)) is None
+    plan.save(sources, str(config_path), loader, SLOConfig(str(config_path)))
+    
+    cached_loader, slo_config = plan.load(sources, str(config_path))
+    assert list(cached_loader.targets.values()) == list(loader.targets.values())
+    assert cached_loader.duplicates == 1
+    assert len(cached_loader.errors) == 1 and cached_loader.errors == loader.errors
+    assert slo_config.get_slo('a.example', 443)['latency_p95_ms'] == 250
+    
+    # a different config path is a different plan
+    assert plan.load(sources, None) is None
+    
+    # touched with the same content, as after a fresh checkout, still counts as unchanged
+    os.utime(targets_path, ns=(0, 0))
+    assert plan.load(sources, str(config_path)) is not None
+    
+    targets_path.write_text("c.example\n")
+    assert plan.load(sources, str(config_path)) is None
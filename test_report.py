@@ -0,0 +1,44 @@
+"""test the ndjson summary comes from the header and footer lines"""
+def test_ndjson_report_summary(tmp_path):
+    from report import NDJSONReportWriter, read_report_summary
+    
+    path = tmp_path / 'report.ndjson'
+    result = {'host': 'example.com', 'port': 443, 'stats': {}, 'loss_pct': 0.0}
+    with NDJSONReportWriter(path, {'mode': 'tcp'}) as writer:
+        writer.write_target(result, {'passed': True, 'thresholds': {}, 'failures': []})
+        writer.write_target(result, {'passed': False, 'thresholds': {}, 'failures': ['x']})
+    
+    metadata, summary = read_report_summary(str(path))
+    
+    assert metadata['config'] == {'mode': 'tcp'}
+    assert summary == {'total_targets': 2, 'slo_passed': 1, 'slo_failed': 1}
+
+
+"""test raw samples round trip through the memory-mapped npz columns"""
+def test_columnar_samples_round_trip(tmp_path):
+    from report import ColumnarSampleWriter, load_raw_samples
+    from runner import TargetSamples
+    
+    first = TargetSamples('a.example', 443)
+    first.add(10.0, {'connect': 10.0})
+    first.add(None, {})
+    second = TargetSamples('b.example', 80)
+    second.add(5.0, {'connect': 4.0, 'dns': 1.0})
+    
+    path = str(tmp_path / 'samples.npz')
+    writer = ColumnarSampleWriter(path)
+    writer.add(1, first)
+    writer.add(0, second)
+    writer.close()
+    
+    data = load_raw_samples(path)
+    
+    assert list(data['index']) == [1, 0]
+    assert list(data['host']) == ['a.example', 'b.example']
+    assert list(data['failures']) == [1, 0]
+    assert list(data['latency_ms']) == [10.0, 5.0]
+    assert list(data['offsets']) == [0, 1, 2]
+    assert list(data['outcome']) == [0, 1, 0]
+    assert list(data['sample_offsets']) == [0, 2, 3]
+    assert len(data['sent_at']) == 3
+    assert list(data['phase_dns_offsets']) == [0, 0, 1]
@@ -0,0 +1,60 @@
+import asyncio
+
+
+"""test repeated lookups are served from cache"""
+def test_dns_cache_hits():
+    from resolver import DNSCache
+    
+    async def run():
+        cache = DNSCache(ttl=60)
+        first = await cache.resolve('localhost', 80)
+        second = await cache.resolve('localhost', 80)
+        return cache, first, second
+    
+    cache, first, second = asyncio.run(run())
+    
+    assert first == second
+    assert cache.misses == 1
+    assert cache.hits == 1
+
+
+"""test concurrent lookups for the same name share one query"""
+def test_dns_cache_dedups_inflight():
+    from resolver import DNSCache
+    
+    lookups = []
+    
+    async def run():
+        cache = DNSCache(ttl=60)
+        real_lookup = cache._do_lookup
+        
+        async def counting_lookup(key):
+            lookups.append(key)
+            return await real_lookup(key)
+        
+        cache._do_lookup = counting_lookup
+        await asyncio.gather(*[cache.resolve('localhost', 80) for _ in range(10)])
+        return cache
+    
+    cache = asyncio.run(run())
+    
+    # every caller missed but only one query went out
+    assert cache.misses == 10
+    assert len(lookups) == 1
+
+
+"""test expired entries are served stale while refreshing"""
+def test_dns_cache_stale_while_revalidate():
+    from resolver import DNSCache
+    
+    async def run():
+        cache = DNSCache(ttl=0, stale_ttl=60)
+        await cache.resolve('localhost', 80)
+        await cache.resolve('localhost', 80)
+        await cache.close()
+        return cache
+    
+    cache = asyncio.run(run())
+    
+    assert cache.misses == 1
+    assert cache.stale_hits == 1
@@ -0,0 +1,242 @@
+import asyncio
+
+
+"""test in-flight cap holds across all jobs and every sample runs"""
+def test_scheduler_in_flight_cap():
+    from scheduler import ProbeJob, ProbeScheduler
+    
+    peak = []
+    counts = {}
+    
+    async def run():
+        scheduler = ProbeScheduler(max_in_flight=3)
+        
+        def make_probe(key):
+            async def probe():
+                peak.append(scheduler.in_flight)
+                await asyncio.sleep(0.01)
+                return key
+            return probe
+        
+        def on_result(key):
+            counts[key] = counts.get(key, 0) + 1
+        
+        for key in range(10):
+            scheduler.add(ProbeJob(key, make_probe(key), 4, 0.0, on_result))
+        await scheduler.run()
+    
+    asyncio.run(run())
+    
+    assert max(peak) <= 3
+    assert counts == {key: 4 for key in range(10)}
+
+
+"""test targets wait out their interval without holding a slot"""
+def test_scheduler_interleaves_targets():
+    from scheduler import ProbeJob, ProbeScheduler
+    
+    async def run():
+        # one slot, 5 targets x 3 samples with 0.1s interval
+        # a per-target semaphore would need 5 x 2 x 0.1 = 1s of sleeping
+        scheduler = ProbeScheduler(max_in_flight=1)
+        
+        async def probe():
+            return None
+        
+        for key in range(5):
+            scheduler.add(ProbeJob(key, probe, 3, 0.1))
+        
+        loop = asyncio.get_running_loop()
+        start = loop.time()
+        await scheduler.run()
+        return loop.time() - start
+    
+    elapsed = asyncio.run(run())
+    
+    assert elapsed < 0.5
+
+
+"""test a group cap limits one destination while other destinations keep their slots"""
+def test_scheduler_group_cap():
+    from scheduler import ProbeJob, ProbeScheduler
+    
+    running = {}
+    peaks = {}
+    
+    async def run():
+        scheduler = ProbeScheduler(max_in_flight=20, group_limit=2)
+        
+        def make_probe(group):
+            async def probe():
+                running[group] = running.get(group, 0) + 1
+                peaks[group] = max(peaks.get(group, 0), running[group])
+                await asyncio.sleep(0.01)
+                running[group] -= 1
+            return probe
+        
+        # ten vhosts behind one address, two targets on their own addresses
+        for key in range(10):
+            scheduler.add(ProbeJob(key, make_probe('lb'), 3, 0.0, group=('10.0.0.1', 443)))
+        for key in (10, 11):
+            scheduler.add(ProbeJob(key, make_probe(key), 3, 0.0, group=(f'10.0.0.{key}', 443)))
+        await scheduler.run()
+        return scheduler.completed
+    
+    assert asyncio.run(run()) == 36
+    assert peaks['lb'] == 2
+    assert peaks[10] == 1 and peaks[11] == 1
+
+
+"""test coalesced tcp targets share one connect per sample, each still gets every sample but no dns phase"""
+def test_coalesced_tcp_probes():
+    from runner import run_probes
+    
+    connects = []
+    
+    async def run():
+        server = await asyncio.start_server(lambda r, w: (connects.append(1), w.close()), '127.0.0.1', 0)
+        port = server.sockets[0].getsockname()[1]
+        try:
+            targets = [('127.0.0.1', port), ('localhost', port), ('127.0.0.1', 1)]
+            return await run_probes(targets, num_probes=3, interval=0.0, timeout=1.0, coalesce=True,
+                                    destination_limit=1)
+        finally:
+            server.close()
+    
+    results = list(asyncio.run(run()))
+    
+    assert [result['samples'] for result in results] == [3, 3, 3]
+    assert results[0]['loss_pct'] == 0.0 and results[2]['loss_pct'] == 100.0
+    # localhost may resolve to ::1 first, then it is its own destination
+    assert len(connects) in (3, 6)
+    assert results[0]['stats']['avg_ms'] == results[1]['stats']['avg_ms'] or len(connects) == 6
+    # the shared connect's ip lookup is not passed off as any hostname's dns time
+    assert 'connect' in results[0]['phases'] and 'dns' not in results[0]['phases']
+
+
+"""test the controller doubles while probes wait for slots, halves on lag and cuts once per drain"""
+def test_concurrency_controller_aimd():
+    from concurrency import ConcurrencyController
+    from scheduler import ProbeScheduler
+    
+    async def run():
+        scheduler = ProbeScheduler(max_in_flight=5)
+        controller = ConcurrencyController(ceiling=64, lag_budget=0.005)
+        controller.attach(scheduler, 4)
+        
+        limits = []
+        for lag in (0.0, 0.0, 0.0):
+            scheduler.slot_waits += 1
+            controller.update(lag)
+            limits.append(scheduler.max_in_flight)
+        
+        # no probe waited for a slot, nothing to grow for
+        controller.update(0.0)
+        limits.append(scheduler.max_in_flight)
+        
+        scheduler.in_flight = 32
+        controller.update(0.02)
+        controller.update(0.02)  # still draining the probes started above the new limit
+        limits.append(scheduler.max_in_flight)
+        
+        scheduler.in_flight = 10
+        scheduler.slot_waits += 1
+        controller.update(0.0)
+        limits.append(scheduler.max_in_flight)
+        return limits, controller
+    
+    limits, controller = asyncio.run(run())
+    
+    # slow start, then additive increase past the threshold the backoff set
+    assert limits == [8, 16, 32, 32, 16, 17]
+    assert controller.backoffs == 1 and controller.epoch == 2
+
+
+"""test samples taken while the loop is blocked are flagged and can be kept out of the stats"""
+def test_congested_samples_flagged():
+    import time
+    from concurrency import ConcurrencyController
+    from runner import run_probes
+    from store import OUTCOME_CONGESTED, OUTCOME_EXCLUDED
+    
+    async def run(exclude):
+        server = await asyncio.start_server(lambda r, w: w.close(), '127.0.0.1', 0)
+        port = server.sockets[0].getsockname()[1]
+        
+        async def hog():
+            # blocks the loop like a burst of slow callbacks would
+            while True:
+                await asyncio.sleep(0.01)
+                time.sleep(0.02)
+        
+        task = asyncio.ensure_future(hog())
+        try:
+            controller = ConcurrencyController(ceiling=8, tick=0.01, exclude=exclude)
+            results = await run_probes([('127.0.0.1', port)], num_probes=5, interval=0.01, timeout=1.0,
+                                       concurrency=controller)
+            return results, controller
+        finally:
+            task.cancel()
+            server.close()
+    
+    results, controller = asyncio.run(run(False))
+    assert results[0]['congested_samples'] > 0 and results[0]['samples'] == 5
+    assert OUTCOME_CONGESTED in results.samples(0)['outcome']
+    assert controller.backoffs > 0
+    
+    results, _ = asyncio.run(run(True))
+    congested = results[0]['congested_samples']
+    assert congested > 0 and results[0]['samples'] == 5 - congested
+    assert list(results.samples(0)['outcome']).count(OUTCOME_EXCLUDED) == congested
+
+
+"""test a probe that raises costs one failed sample and its job keeps sampling"""
+def test_scheduler_probe_error_is_failed_sample():
+    from scheduler import ProbeJob, ProbeScheduler
+    
+    results = []
+    calls = []
+    
+    async def run():
+        scheduler = ProbeScheduler(max_in_flight=2)
+        
+        async def probe():
+            calls.append(1)
+            if len(calls) == 2:
+                raise RuntimeError("probe bug")
+            return 1.0
+        
+        scheduler.add(ProbeJob('a', probe, 4, 0.0, results.append, failed='failed'))
+        await scheduler.run()
+        return scheduler.completed
+    
+    assert asyncio.run(run()) == 4
+    assert results == [1.0, 'failed', 1.0, 1.0]
+
+
+"""test a job removed while it waits for a slot never runs and gives its slot back"""
+def test_scheduler_removed_while_waiting_for_slot():
+    from scheduler import ProbeJob, ProbeScheduler
+    
+    calls = []
+    
+    async def run():
+        scheduler = ProbeScheduler(max_in_flight=1)
+        
+        def make_probe(key):
+            async def probe():
+                calls.append(key)
+                if key == 'a':
+                    # b is due and waiting for the only slot by now
+                    await asyncio.sleep(0.05)
+                    scheduler.remove('b')
+                return key
+            return probe
+        
+        scheduler.add(ProbeJob('a', make_probe('a'), 2, 0.0))
+        scheduler.add(ProbeJob('b', make_probe('b'), 2, 0.0), delay=0.01)
+        await asyncio.wait_for(scheduler.run(), timeout=2.0)
+        return scheduler._slots_used
+    
+    assert asyncio.run(run()) == 0
+    assert calls == ['a', 'a']
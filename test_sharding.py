@@ -0,0 +1,55 @@
+import asyncio
+
+
+"""test global limits split into shares that add up to the total, workers past the total get nothing"""
+def test_split_limit():
+    from sharding import split_limit
+    
+    assert split_limit(10, 3) == [4, 3, 3]
+    assert split_limit(9, 3) == [3, 3, 3]
+    assert split_limit(2, 5) == [1, 1, 0, 0, 0]
+    for total, workers in ((100, 7), (5, 5), (3, 8), (1, 1)):
+        assert sum(split_limit(total, workers)) == total
+
+
+"""test two worker processes report the same targets, in the same order, as one local run"""
+def test_sharded_run_matches_local():
+    from runner import run_probes
+    from sharding import run_probes_sharded
+    
+    async def run():
+        listener = await asyncio.start_server(lambda r, w: w.close(), '127.0.0.1', 0)
+        open_port = listener.sockets[0].getsockname()[1]
+        targets = [('127.0.0.1', open_port), ('127.0.0.1', 1), ('localhost', open_port)]
+        options = dict(num_probes=3, timeout=1.0, interval=0.0, max_concurrent=4)
+        try:
+            local = await run_probes(targets, **options)
+            # more workers than the cap allows is clamped so every worker keeps a slot
+            sharded = await run_probes_sharded(targets, workers=8, **options)
+        finally:
+            listener.close()
+        return local, sharded
+    
+    local, sharded = asyncio.run(run())
+    assert [(r['host'], r['port']) for r in sharded] == [(r['host'], r['port']) for r in local]
+    for a, b in zip(local, sharded):
+        assert a['samples'] == b['samples'] == 3
+        assert a['loss_pct'] == b['loss_pct']
+        assert a['stats']['count'] == b['stats']['count']
+    assert sharded[0]['loss_pct'] == 0.0 and sharded[1]['loss_pct'] == 100.0
+
+
+"""test a worker that dies without reporting fails the run instead of hanging it"""
+def test_collect_dead_worker():
+    import queue
+    import pytest
+    from sharding import _collect
+    
+    class DeadProcess:
+        exitcode = -9
+        
+        def is_alive(self):
+            return False
+    
+    with pytest.raises(RuntimeError, match='Worker 0 exited unexpectedly'):
+        asyncio.run(_collect(queue.Queue(), [DeadProcess()], [None], 'tcp'))
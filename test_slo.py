@@ -0,0 +1,107 @@
+"""test batch evaluation agrees with the per-target checks"""
+def test_evaluate_slo_batch():
+    from slo import SLOConfig, evaluate_slo_batch
+    from stats import compute_stats
+    
+    config = SLOConfig()
+    config.target_slos = {'slow.example.com': {'latency_p95_ms': 500.0}}
+    results = [
+        {'host': 'fast.example.com', 'port': 443, 'stats': compute_stats([10, 20]), 'loss_pct': 0.0},
+        {'host': 'fast.example.com', 'port': 443, 'stats': compute_stats([10, 200]), 'loss_pct': 10.0},
+        {'host': 'slow.example.com', 'port': 443, 'stats': compute_stats([300]), 'loss_pct': 0.0},
+        {'host': 'dead.example.com', 'port': 443, 'stats': compute_stats([]), 'loss_pct': 100.0},
+    ]
+    
+    evaluations = evaluate_slo_batch(results, config)
+    
+    assert [e['passed'] for e in evaluations] == [True, False, True, False]
+    assert evaluations[1]['failures'] == [
+        "p95 latency 200.00ms exceeds threshold 100.00ms",
+        "Loss 10.0% exceeds threshold 5.0%",
+    ]
+    assert evaluations[2]['thresholds']['latency_p95_ms'] == 500.0
+    assert evaluations[3]['failures'] == ["All probes failed - no data to evaluate"]
+
+
+"""test rule precedence: exact, then longest wildcard suffix, then longest cidr, port rules first"""
+def test_slo_rule_precedence():
+    from slo import SLOConfig
+    
+    config = SLOConfig()
+    config.target_slos = {
+        'api.example.com': {'latency_p95_ms': 1},
+        'api.example.com:8443': {'latency_p95_ms': 2},
+        '*.example.com': {'latency_p95_ms': 3},
+        '*.internal.example.com': {'latency_p95_ms': 4},
+        '*.internal.example.com:443': {'latency_p95_ms': 5},
+        '10.0.0.0/8': {'latency_p95_ms': 6},
+        '10.20.0.0/16': {'latency_p95_ms': 7, 'phases': {'tls': {'latency_p95_ms': 8}}},
+    }
+    
+    def p95(host, port=None):
+        return config.get_slo(host, port)['latency_p95_ms']
+    
+    assert p95('api.example.com', 443) == 1
+    assert p95('API.example.com', 8443) == 2
+    assert p95('web.example.com') == 3
+    assert p95('example.com') == 100.0
+    assert p95('db.internal.example.com', 5432) == 4
+    assert p95('db.internal.example.com', 443) == 5
+    assert p95('10.1.2.3') == 6
+    assert p95('10.20.2.3') == 7
+    assert p95('11.0.0.1') == 100.0
+    
+    # cached and read-only
+    slo = config.get_slo('10.20.2.3')
+    assert slo is config.get_slo('10.20.2.3')
+    assert slo['phases']['tls'] == {'latency_p95_ms': 8}
+    try:
+        slo['latency_p95_ms'] = 0
+        assert False, "thresholds should be read-only"
+    except TypeError:
+        pass
+
+
+"""test ring counters expire old events and burn alerts need both windows burning"""
+def test_error_budget_burn_rate():
+    from slo import BudgetPolicy, ErrorBudget
+    
+    policy = BudgetPolicy(99.0, ('1h', 3600), alerts=[{'long': '1h', 'short': '5m', 'burn_rate': 10}])
+    budget = ErrorBudget(policy)
+    
+    # 1% bad is exactly on budget
+    for i in range(990):
+        assert budget.add(i, 10.0) == []
+    for i in range(10):
+        budget.add(990 + i, None)
+    assert abs(budget.burn_rate('1h', 1000) - 1.0) < 1e-9
+    
+    # a burst of failures fires once both windows burn 10x faster than allowed
+    changes = []
+    for i in range(200):
+        changes += budget.add(1000 + i, None)
+    assert [c['firing'] for c in changes] == [True]
+    
+    # once the short window has only good probes again the alert resolves
+    changes = []
+    for i in range(400):
+        changes += budget.add(1300 + i, 10.0)
+    assert [c['firing'] for c in changes] == [False]
+    
+    # after a whole hour with nothing bad the long window has forgotten the burst
+    budget.add(5000, 10.0)
+    assert budget.burn_rate('1h', 5000) == 0.0
+
+
+"""test burn alerts only show up in thresholds that have an objective"""
+def test_burn_alerts_only_with_objective():
+    from slo import DEFAULT_BURN_ALERTS, SLOConfig
+    
+    config = SLOConfig()
+    config.default_slo = {**config.default_slo, 'burn_alerts': DEFAULT_BURN_ALERTS}
+    config.target_slos = {'api.example.com': {'objective': {'target_pct': 99.9, 'period': '30d'}}}
+    
+    assert 'burn_alerts' not in config.get_slo('other.example.com', 443)
+    budgeted = config.get_slo('api.example.com', 443)
+    assert budgeted['burn_alerts'] == DEFAULT_BURN_ALERTS
+    assert budgeted.budget is not None
@@ -50,3 +50,64 @@ def test_compute_stats_single_value():
     assert result['p95_ms'] == 42.5
     assert result['p99_ms'] == 42.5
     assert result['count'] == 1
+
+
+"""test per-phase stats are computed independently"""
+def test_compute_phase_stats():
+    from stats import compute_phase_stats
+    
+    result = compute_phase_stats({'dns': [1.0, 2.0, 3.0], 'connect': [10.0]})
+    
+    assert result['dns']['avg_ms'] == 2.0
+    assert result['dns']['p95_ms'] == 3.0
+    assert result['connect']['count'] == 1
+    assert result['connect']['p99_ms'] == 10.0
+
+
+"""test sketch percentiles match numpy method='higher' on small inputs"""
+def test_latency_sketch_exact_small():
+    import numpy as np
+    from stats import LatencySketch, compute_stats
+    
+    latencies = [15.0] * 95 + [200.0] * 5
+    sketch = LatencySketch.from_values(latencies)
+    
+    assert compute_stats(sketch) == compute_stats(latencies)
+    assert sketch.percentile(99) == np.percentile(latencies, 99, method='higher')
+
+
+"""test bucketed sketch stays within its error bound and survives merge and serialization"""
+def test_latency_sketch_error_bound_and_merge():
+    import random
+    import numpy as np
+    from stats import LatencySketch
+    
+    rng = random.Random(7)
+    latencies = [rng.lognormvariate(3, 1) for _ in range(20000)]
+    
+    first = LatencySketch.from_values(latencies[:10000])
+    second = LatencySketch.from_values(latencies[10000:])
+    merged = LatencySketch.from_bytes(first.merge(second).to_bytes())
+    
+    assert merged.count == 20000
+    for pct in (95, 99):
+        exact = np.percentile(latencies, pct, method='higher')
+        assert abs(merged.percentile(pct) - exact) / exact <= merged.relative_error
+
+
+"""test batch stats match per-target stats, including empty targets"""
+def test_compute_stats_many_matches_single():
+    import numpy as np
+    from stats import compute_stats_many
+    
+    lists = [[10, 20, 30, 40, 50], [], [15.0] * 95 + [200.0] * 5, [42.5]]
+    results = compute_stats_many(lists)
+    
+    assert results[1]['count'] == 0
+    assert results[1]['p95_ms'] is None
+    for latencies, result in zip(lists, results):
+        if latencies:
+            assert result['p95_ms'] == np.percentile(latencies, 95, method='higher')
+            assert result['p99_ms'] == np.percentile(latencies, 99, method='higher')
+            assert result['min_ms'] == min(latencies)
+            assert result['max_ms'] == max(latencies)
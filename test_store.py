@@ -0,0 +1,51 @@
+"""test the lazy view gives the same dicts as building each result on its own"""
+def test_result_view_matches_to_result():
+    from runner import TargetSamples, build_results
+    
+    first = TargetSamples('a.example', 443)
+    for value in (10.0, 12.0, 30.0):
+        first.add(value, {'connect': value - 1, 'dns': 1.0})
+    first.add(None, {})
+    second = TargetSamples('b.example', 80)
+    second.add(None, {})
+    third = TargetSamples('c.example', 443)
+    third.add(5.0, {'connect': 5.0})
+    
+    targets = [first, second, third]
+    view = build_results(targets)
+    
+    assert len(view) == 3
+    assert list(view) == [target.to_result() for target in targets]
+    assert view[-1] == third.to_result()
+    assert view[1]['stats']['count'] == 0 and view[1]['loss_pct'] == 100.0
+
+
+"""test raw samples keep send time and outcome of every sample, failures included"""
+def test_target_samples_keep_raw_samples():
+    import asyncio
+    import math
+    from runner import ProbeContext, TargetSamples, probe_once
+    from store import OUTCOME_FAILED, OUTCOME_OK, OUTCOME_SHORT_CIRCUITED
+    from timeouts import TimeoutPolicy
+    
+    target = TargetSamples('a.example', 443)
+    target.add(10.0, {})
+    target.add(None, {})
+    target.add(20.0, {})
+    
+    samples = target.samples()
+    assert list(samples['outcome']) == [OUTCOME_OK, OUTCOME_FAILED, OUTCOME_OK]
+    assert samples['latency_ms'][0] == 10.0 and math.isnan(samples['latency_ms'][1])
+    assert samples['latency_ms'][2] == 20.0
+    assert list(samples['sent_at']) == sorted(samples['sent_at'])
+    
+    async def run():
+        ctx = ProbeContext(timeouts=TimeoutPolicy(failures=1, cooldown=60.0))
+        down = TargetSamples('127.0.0.1', 1)
+        for _ in range(3):
+            result, phases = await probe_once(ctx, down)
+            down.add(result, phases)
+        return down
+    
+    down = asyncio.run(run())
+    assert list(down.samples()['outcome']) == [OUTCOME_FAILED, OUTCOME_SHORT_CIRCUITED, OUTCOME_SHORT_CIRCUITED]
@@ -0,0 +1,47 @@
+"""test ipv6 literals, urls and plain hosts parse to host, port and scheme"""
+def test_parse_target_formats():
+    from targets import parse_target
+    
+    assert parse_target('example.com') == ('example.com', 443, None)
+    assert parse_target('http://example.com/health') == ('example.com', 80, 'http')
+    assert parse_target('example.com:8080') == ('example.com', 8080, None)
+    assert parse_target('[2001:db8::1]:8443') == ('2001:db8::1', 8443, None)
+    assert parse_target('https://[::1]/') == ('::1', 443, 'https')
+    assert parse_target('2001:db8::1') == ('2001:db8::1', 443, None)
+
+
+"""test the same endpoint written several ways is loaded once"""
+def test_loader_dedups(tmp_path):
+    from targets import TargetLoader
+    
+    (tmp_path / 'a.txt').write_text('example.com\nhttps://EXAMPLE.com:443/x\nbad:port\n')
+    (tmp_path / 'b.txt').write_text('# comment\nexample.com:443\nother.com:80\n')
+    
+    loader = TargetLoader([str(tmp_path)])
+    targets = loader.load()
+    
+    assert [(t.host, t.port) for t in targets] == [('example.com', 443), ('other.com', 80)]
+    assert loader.duplicates == 2
+    assert len(loader.errors) == 1
+
+
+"""test reload only reports targets that were added or removed"""
+def test_loader_reload_diff(tmp_path):
+    import os
+    from targets import TargetLoader
+    
+    path = tmp_path / 'targets.txt'
+    path.write_text('a.com\nb.com\n')
+    
+    loader = TargetLoader([str(path)])
+    loader.load()
+    assert loader.reload() == ([], [])
+    
+    path.write_text('b.com\nc.com\n')
+    # bump the mtime in case both writes land in the same tick
+    stat = path.stat()
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+    added, removed = loader.reload()
+    
+    assert [t.host for t in added] == ['c.com']
+    assert [t.host for t in removed] == ['a.com']
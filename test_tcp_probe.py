@@ -0,0 +1,54 @@
+import asyncio
+import socket
+
+
+"""test the socket engine times a loopback connect, fails refused and slow connects, and always closes its socket"""
+def test_tcp_probe_socket(monkeypatch):
+    import tcp_probe
+    from tcp_probe import tcp_probe as stream_probe, tcp_probe_socket
+    
+    # listening before the socket class is swapped, so only the probe's own sockets are tracked
+    listener = socket.socket()
+    listener.bind(('127.0.0.1', 0))
+    listener.listen(16)
+    port = listener.getsockname()[1]
+    
+    created = []
+    
+    class TrackedSocket(socket.socket):
+        def __init__(self, *args, **kwargs):
+            super().__init__(*args, **kwargs)
+            created.append(self)
+    
+    monkeypatch.setattr(tcp_probe.socket, 'socket', TrackedSocket)
+    
+    async def hang(sock, address):
+        await asyncio.sleep(10)
+    
+    async def run():
+        phases, stream_phases = {}, {}
+        ok = await tcp_probe_socket('127.0.0.1', port, timeout=1.0, phases=phases)
+        await stream_probe('127.0.0.1', port, timeout=1.0, phases=stream_phases)
+        with_dns = await tcp_probe_socket('127.0.0.1', port, timeout=1.0, phases={}, include_dns=True)
+        refused = await tcp_probe_socket('127.0.0.1', 1, timeout=1.0)
+        
+        # a handshake that never completes is cut off by the timeout
+        asyncio.get_running_loop().sock_connect = hang
+        timed_out = await tcp_probe_socket('127.0.0.1', port, timeout=0.2)
+        return ok, phases, stream_phases, with_dns, refused, timed_out
+    
+    try:
+        ok, phases, stream_phases, with_dns, refused, timed_out = asyncio.run(run())
+    finally:
+        listener.close()
+    
+    assert ok is not None and ok > 0
+    assert set(phases) == set(stream_phases) == {'dns', 'connect'}
+    assert ok == phases['connect']
+    assert with_dns is not None
+    assert refused is None and timed_out is None
+    
+    probe_sockets = [sock for sock in created if sock.family == socket.AF_INET]
+    # four from the socket engine, the stream probe's connection is closed too
+    assert len(probe_sockets) >= 4
+    assert all(sock.fileno() == -1 for sock in probe_sockets)
@@ -0,0 +1,65 @@
+"""test the timeout follows smoothed latency within the floor and ceiling"""
+def test_adaptive_timeout_bounds():
+    from timeouts import TimeoutPolicy
+    
+    health = TimeoutPolicy(ceiling=5.0, floor=0.2).new_target()
+    
+    # no samples yet, the configured timeout applies
+    assert health.timeout() == 5.0
+    
+    for _ in range(20):
+        health.record(10.0)
+    assert health.timeout() == 0.2
+    
+    for _ in range(20):
+        health.record(900.0)
+    assert 0.9 < health.timeout() < 5.0
+    
+    # timeouts back off up to the ceiling
+    for _ in range(10):
+        health.record(None)
+    assert health.timeout() == 5.0
+
+
+"""test the breaker opens after consecutive failures, lets recovery probes through and closes on success"""
+def test_circuit_breaker():
+    from timeouts import TimeoutPolicy
+    
+    health = TimeoutPolicy(failures=3, cooldown=10.0).new_target()
+    
+    for _ in range(3):
+        assert health.allow(now=0.0)
+        health.record(None, now=0.0)
+    assert health.is_down()
+    
+    assert not health.allow(now=5.0)
+    assert health.allow(now=10.0)
+    health.record(None, now=10.0)
+    # recovery probes back off while the target stays down
+    assert not health.allow(now=25.0)
+    assert health.allow(now=30.0)
+    
+    health.record(12.0, now=30.0)
+    assert not health.is_down()
+    assert health.allow(now=30.0)
+
+
+"""test short-circuited samples of a down target still count as loss"""
+def test_down_target_counts_as_loss():
+    import asyncio
+    from runner import ProbeContext, TargetSamples, probe_once
+    from timeouts import TimeoutPolicy
+    
+    async def run():
+        ctx = ProbeContext(timeouts=TimeoutPolicy(failures=2, cooldown=60.0))
+        target = TargetSamples('127.0.0.1', 1)
+        for _ in range(6):
+            result, phases = await probe_once(ctx, target)
+            target.add(result, phases)
+        return target.to_result()
+    
+    result = asyncio.run(run())
+    
+    assert result['samples'] == 6
+    assert result['short_circuited'] == 4
+    assert result['loss_pct'] == 100.0
@@ -0,0 +1,82 @@
+"""test samples older than the window are evicted"""
+def test_sliding_window_evicts_by_time():
+    from watch import SlidingWindow
+    
+    window = SlidingWindow(duration=10)
+    window.add(0.0, 5.0)
+    window.add(5.0, None)
+    window.add(12.0, 7.0)
+    
+    result = window.to_result('example.com', 443)
+    
+    assert len(window) == 2
+    assert result['stats']['count'] == 1
+    assert result['loss_pct'] == 50.0
+
+
+"""test window memory is bounded by slots not sample count"""
+def test_sliding_window_bounded():
+    from watch import SlidingWindow
+    
+    window = SlidingWindow(duration=60, slots=12)
+    for i in range(100000):
+        window.add(i * 0.01, 10.0 + (i % 50))
+    
+    # only the last 60-65s of samples remain, held in at most 13 slot sketches
+    assert len(window._slots) <= 13
+    assert 6000 <= len(window) <= 6500
+
+
+"""test only slo state changes are reported"""
+def test_target_watch_reports_changes_only():
+    from slo import SLOConfig
+    from watch import TargetWatch
+    
+    watch = TargetWatch('example.com', 443, {'1m': 60}, min_samples=2)
+    config = SLOConfig()
+    
+    changes = []
+    for t, latency in enumerate([10.0, 10.0, 10.0, 500.0, 500.0, 500.0]):
+        changes += watch.add(float(t), latency, config)
+    
+    states = [(previous, evaluation['passed']) for _, previous, evaluation in changes]
+    assert states == [(None, True), (True, False)]
+
+
+"""test the cached merge of closed slots matches the window after slots roll over and drop out"""
+def test_sliding_window_cached_merge():
+    import math
+    from stats import LatencySketch, compute_stats
+    from watch import SlidingWindow
+    
+    window = SlidingWindow(duration=12, slots=12)
+    kept = []
+    for i in range(400):
+        t = i * 0.1
+        latency = None if i % 7 == 0 else float(i % 90)
+        window.add(t, latency)
+        kept.append((t, latency))
+        result = window.to_result('example.com', 443)
+    
+    # the window still holds every sample of slots that ended after the window start
+    recent = [latency for t, latency in kept if math.floor(t) + 1 > 39.9 - 12]
+    expected = compute_stats(LatencySketch.from_values([l for l in recent if l is not None]))
+    assert result['stats'] == expected
+    assert len(window) == len(recent)
+
+
+"""test a window is judged at most once a second between slot rollovers"""
+def test_target_watch_throttles_evaluation(monkeypatch):
+    import watch as watch_module
+    from slo import SLOConfig
+    
+    calls = []
+    real = watch_module.evaluate_slo
+    monkeypatch.setattr(watch_module, 'evaluate_slo', lambda *args: calls.append(1) or real(*args))
+    
+    watch = watch_module.TargetWatch('example.com', 443, {'1h': 3600}, min_samples=1)
+    for i in range(1000):
+        watch.add(i * 0.005, 10.0, SLOConfig())
+    
+    # 5s of samples in one 300s slot
+    assert len(calls) == 5
@@ -0,0 +1,94 @@
+"""adaptive per-target timeouts and a circuit breaker for targets that stopped answering"""
+import time
+
+
+# rfc 6298 gains for the smoothed latency and its variance
+_ALPHA = 1 / 8
+_BETA = 1 / 4
+# timeout is the smoothed latency plus this many deviations
+_K = 4
+
+
+"""settings shared by every target of a run, hands out one TargetHealth per target"""
+class TimeoutPolicy:
+    
+    """ceiling is the configured --timeout, failures 0 disables the breaker"""
+    def __init__(self, ceiling=5.0, floor=1.0, adaptive=True, failures=0, cooldown=30.0, max_cooldown=300.0):
+        if floor > ceiling:
+            raise ValueError(f"Timeout floor {floor}s is above the timeout {ceiling}s")
+        self.ceiling = ceiling
+        self.floor = floor
+        self.adaptive = adaptive          # False keeps the fixed timeout, breaker only
+        self.failures = failures          # consecutive failures that mark a target down
+        self.cooldown = cooldown          # seconds between recovery probes of a down target
+        self.max_cooldown = max_cooldown  # recovery probes back off up to this
+    
+    def new_target(self):
+        return TargetHealth(self)
+
+
+"""rto estimate and breaker state of one target"""
+class TargetHealth:
+    
+    __slots__ = ('policy', 'srtt', 'rttvar', 'backoff', 'consecutive_failures', 'down_since', 'retry_at',
+                 'cooldown')
+    
+    def __init__(self, policy):
+        self.policy = policy
+        self.srtt = None     # smoothed latency in seconds, None until the first success
+        self.rttvar = None
+        self.backoff = 1     # doubles on each timeout like tcp, reset by a success
+        self.consecutive_failures = 0
+        self.down_since = None  # monotonic time the breaker opened, None while closed
+        self.retry_at = 0.0     # next time a down target gets a real probe
+        self.cooldown = policy.cooldown
+    
+    """timeout in seconds for the next probe"""
+    def timeout(self):
+        policy = self.policy
+        if not policy.adaptive or self.srtt is None:
+            return policy.ceiling
+        rto = (self.srtt + _K * self.rttvar) * self.backoff
+        return min(policy.ceiling, max(policy.floor, rto))
+    
+    """whether the next sample should really probe, False while down and not yet due a recovery probe"""
+    def allow(self, now=None):
+        if self.down_since is None:
+            return True
+        now = time.monotonic() if now is None else now
+        if now >= self.retry_at:
+            # half open, let one probe through, the next one waits twice as long
+            self.cooldown = min(self.cooldown * 2, self.policy.max_cooldown)
+            self.retry_at = now + self.cooldown
+            return True
+        return False
+    
+    """record a real probe, latency in ms or None when it failed"""
+    def record(self, latency_ms, now=None):
+        if latency_ms is None:
+            self.backoff = min(self.backoff * 2, 64)
+            self.consecutive_failures += 1
+            threshold = self.policy.failures
+            if threshold and self.down_since is None and self.consecutive_failures >= threshold:
+                now = time.monotonic() if now is None else now
+                self.down_since = now
+                self.retry_at = now + self.cooldown
+            return
+        
+        sample = latency_ms / 1000
+        if self.srtt is None:
+            self.srtt = sample
+            self.rttvar = sample / 2
+        else:
+            self.rttvar = (1 - _BETA) * self.rttvar + _BETA * abs(self.srtt - sample)
+            self.srtt = (1 - _ALPHA) * self.srtt + _ALPHA * sample
+        
+        # any answer closes the breaker and resets the backoffs
+        self.backoff = 1
+        self.consecutive_failures = 0
+        self.down_since = None
+        self.cooldown = self.policy.cooldown
+    
+    """True while the breaker is open"""
+    def is_down(self):
+        return self.down_since is not None
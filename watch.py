@@ -0,0 +1,255 @@
+"""continuous watch mode with sliding-window slo evaluation"""
+import asyncio
+import itertools
+import math
+import time
+from collections import deque
+from datetime import datetime
+from runner import FAILED_SAMPLE, TargetSamples, open_probe_context, probe_once
+from scheduler import ProbeJob, ProbeScheduler
+from slo import ErrorBudget, evaluate_slo, parse_duration
+from stats import LatencySketch, compute_stats
+from targets import split_target, target_key
+
+
+# each window is split into this many sub-window sketches, the oldest drops out whole
+WINDOW_SLOTS = 12
+
+# seconds between slo evaluations of one window while its slots stay the same
+EVALUATE_INTERVAL = 1.0
+
+"""time-bounded window of recent samples for one target"""
+class SlidingWindow:
+    
+    """duration in seconds, split into slots so memory is bounded by sketch size not sample count"""
+    def __init__(self, duration, slots=WINDOW_SLOTS):
+        self.duration = duration
+        self.slot_width = duration / slots
+        # [slot start, sketch of successful latencies, failure count]
+        # the window covers between duration and duration + one slot of samples
+        self._slots = deque()
+        self._count = 0
+        # merged sketch and failures of every slot but the newest, rebuilt only when the slots change
+        self._closed = None
+    
+    """add a sample, latency is None for a failed probe, True when a slot opened or dropped out"""
+    def add(self, timestamp, latency):
+        slot_start = math.floor(timestamp / self.slot_width) * self.slot_width
+        rolled = not self._slots or self._slots[-1][0] != slot_start
+        if rolled:
+            self._slots.append([slot_start, LatencySketch(), 0])
+        
+        slot = self._slots[-1]
+        if latency is None:
+            slot[2] += 1
+        else:
+            slot[1].add(latency)
+        self._count += 1
+        
+        rolled = self._evict(timestamp) or rolled
+        if rolled:
+            self._closed = None
+        return rolled
+    
+    """drop slots that ended before the window start, True when any did"""
+    def _evict(self, now):
+        cutoff = now - self.duration
+        evicted = False
+        while self._slots and self._slots[0][0] + self.slot_width <= cutoff:
+            _, sketch, failures = self._slots.popleft()
+            self._count -= sketch.count + failures
+            evicted = True
+        return evicted
+    
+    def __len__(self):
+        return self._count
+    
+    """build a result dict in the shape evaluate_slo expects"""
+    def to_result(self, host, port):
+        if self._closed is None:
+            closed = LatencySketch()
+            failures = 0
+            for _, sketch, slot_failures in itertools.islice(self._slots, len(self._slots) - 1):
+                closed.merge(sketch)
+                failures += slot_failures
+            self._closed = (closed, failures)
+        
+        # two merges a call instead of one per slot
+        closed, failures = self._closed
+        merged = LatencySketch().merge(closed)
+        if self._slots:
+            _, sketch, slot_failures = self._slots[-1]
+            merged.merge(sketch)
+            failures += slot_failures
+        total = merged.count + failures
+        
+        return {
+            'host': host,
+            'port': port,
+            'stats': compute_stats(merged),
+            'loss_pct': (failures / total) * 100 if total else 0.0,
+        }
+
+
+"""per-target set of sliding windows and their last slo state"""
+class TargetWatch:
+    
+    def __init__(self, host, port, windows, min_samples=5, budget_policy=None):
+        self.host = host
+        self.port = port
+        self.min_samples = min_samples  # dont judge a window on too few samples
+        # error budget burn-rate tracking, only when the target's slo has an objective
+        self.budget = ErrorBudget(budget_policy) if budget_policy is not None else None
+        
+        # window label -> SlidingWindow, label -> last pass/fail (None until judged)
+        self.windows = {label: SlidingWindow(duration) for label, duration in windows.items()}
+        self.states = {label: None for label in windows}
+        self._evaluated = {label: None for label in windows}  # timestamp of the last evaluation
+    
+    """add a sample to every window and return the windows whose slo state changed"""
+    def add(self, timestamp, latency, slo_config):
+        changes = []
+        
+        for label, window in self.windows.items():
+            rolled = window.add(timestamp, latency)
+            if len(window) < self.min_samples:
+                continue
+            # stats and slo checks run when a slot rolls over or once a second, not on every sample
+            last = self._evaluated[label]
+            if not rolled and last is not None and timestamp - last < EVALUATE_INTERVAL:
+                continue
+            self._evaluated[label] = timestamp
+            
+            evaluation = evaluate_slo(window.to_result(self.host, self.port), slo_config)
+            previous = self.states[label]
+            if evaluation['passed'] != previous:
+                self.states[label] = evaluation['passed']
+                changes.append((label, previous, evaluation))
+        
+        return changes
+    
+    """count a sample against the error budget and return burn-rate alerts that changed"""
+    def add_budget(self, timestamp, latency):
+        if self.budget is None:
+            return []
+        return self.budget.add(timestamp, latency)
+
+
+"""print one state change line, e.g. PASS -> FAIL with reasons"""
+def print_state_change(watch, label, previous, evaluation):
+    timestamp = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+    target = f"{watch.host}:{watch.port}"
+    before = {None: 'NEW', True: 'PASS', False: 'FAIL'}[previous]
+    after = 'PASS' if evaluation['passed'] else 'FAIL'
+    
+    print(f"[{timestamp}] {target:<30} [{label}] {before} -> {after}")
+    for failure in evaluation['failures']:
+        print(f"  ! {failure}")
+
+
+"""print one burn-rate alert starting or stopping"""
+def print_burn_alert(watch, change):
+    timestamp = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+    target = f"{watch.host}:{watch.port}"
+    state = 'FIRING' if change['firing'] else 'RESOLVED'
+    
+    print(f"[{timestamp}] {target:<30} [burn {change['alert']}] {state} ({change['severity']}): "
+          f"burn rate {change['long_burn']:.1f}x / {change['short_burn']:.1f}x, threshold {change['burn_rate']:g}x")
+
+
+"""probe targets continuously and report slo state changes per window"""
+async def watch_targets(targets, slo_config, windows, interval=1.0, timeout=5.0, max_concurrent=5, mode='tcp',
+                        pool_size=100, connection='cold', dns_ttl=60.0, include_dns=False, rate=None,
+                        min_samples=5, on_change=print_state_change, tcp_engine='stream', metrics=None,
+                        on_alert=print_burn_alert, loader=None, reload_interval=10.0, timeouts=None,
+                        capabilities=None, tls_resume=False):
+    # loader is an optional TargetLoader, its files are re-read for target changes while watching
+    print(f"Watching {len(targets)} target(s) in {mode.upper()} mode "
+          f"(windows: {', '.join(windows)}, interval {interval}s). Press Ctrl+C to stop.\n")
+    
+    scheduler = ProbeScheduler(max_in_flight=max_concurrent, rate=rate)
+    
+    if metrics is not None:
+        metrics.attach(scheduler=scheduler)
+    
+    async with open_probe_context(mode, timeout, pool_size, connection, dns_ttl, include_dns, tcp_engine,
+                                  metrics, timeouts, capabilities, tls_resume) as ctx:
+        keys = itertools.count()
+        jobs = {}  # target dedup key -> scheduler job key
+        
+        def add_target(entry):
+            host, port, scheme = split_target(entry)
+            budget_policy = slo_config.get_slo(host, port).budget
+            watch = TargetWatch(host, port, windows, min_samples, budget_policy)
+            key = next(keys)
+            jobs[target_key(entry)] = key
+            scheduler.add(_make_watch_job(key, ctx, watch, interval, slo_config, on_change, on_alert, scheme))
+        
+        def remove_target(entry):
+            key = jobs.pop(target_key(entry), None)
+            if key is not None:
+                scheduler.remove(key)
+                if metrics is not None:
+                    metrics.remove_target(key)
+        
+        for entry in targets:
+            add_target(entry)
+        
+        reloader = None
+        if loader is not None and loader.watchable() and reload_interval:
+            reloader = asyncio.ensure_future(_reload_targets(loader, reload_interval, add_target, remove_target))
+        
+        try:
+            # jobs never run out of samples and reloads may add more, so this runs until cancelled
+            await scheduler.run(until_empty=False)
+        finally:
+            if reloader is not None:
+                reloader.cancel()
+
+
+"""poll the target files and apply added/removed targets, unchanged ones keep their windows"""
+async def _reload_targets(loader, reload_interval, add_target, remove_target):
+    loop = asyncio.get_running_loop()
+    while True:
+        await asyncio.sleep(reload_interval)
+        
+        # reading 100k lines would stall probes, so parse off the event loop
+        try:
+            added, removed = await loop.run_in_executor(None, loader.reload)
+        except OSError as e:
+            print(f"Warning: Could not reload targets - {e}")
+            continue
+        if not added and not removed:
+            continue
+        
+        for entry in removed:
+            remove_target(entry)
+        for entry in added:
+            add_target(entry)
+        print(f"Reloaded targets: {len(added)} added, {len(removed)} removed, "
+              f"{len(loader.targets)} total")
+
+
+"""scheduler job sampling one target forever and feeding its windows"""
+def _make_watch_job(key, ctx, watch, interval, slo_config, on_change, on_alert=print_burn_alert, scheme=None):
+    # TargetSamples only carries url and connection state here, samples go to the windows
+    target = TargetSamples(watch.host, watch.port, ctx.mode, scheme)
+    if ctx.metrics is not None:
+        ctx.metrics.add_target(key, watch.host, watch.port)
+    
+    async def probe():
+        return await probe_once(ctx, target)
+    
+    def on_result(sample):
+        result, phases = sample
+        now = time.monotonic()
+        if ctx.metrics is not None:
+            ctx.metrics.observe(key, result)
+        for label, previous, evaluation in watch.add(now, result, slo_config):
+            if ctx.metrics is not None:
+                ctx.metrics.set_slo(key, evaluation['passed'], label)
+            on_change(watch, label, previous, evaluation)
+        for change in watch.add_budget(now, result):
+            on_alert(watch, change)
+    
+    return ProbeJob(key, probe, None, interval, on_result, failed=FAILED_SAMPLE, name=f"{watch.host}:{watch.port}")